@@ -1,5 +1,7 @@
 from downloader.bunkr import BunkrDownloader
+from downloader.core.bandwidth_limiter import shared_limiter
 from downloader.coomerfans import CoomerfansDownloader
+from downloader.core.size_filter import SizeFilter
 from downloader.downloader import Downloader
 from downloader.erome import EromeDownloader
 from downloader.jpg5 import Jpg5Downloader
@@ -23,6 +25,23 @@ class DownloaderFactory:
 
     def _apply_naming_mode(self, downloader):
         downloader.file_naming_mode = self._get_settings().get("file_naming_mode", 0)
+        return self._apply_download_options(downloader)
+
+    def _apply_download_options(self, downloader, settings=None):
+        settings = settings if settings is not None else self._get_settings()
+        downloader.download_engine = settings.get("download_engine", "threads")
+        downloader.segment_count = int(settings.get("segment_count", 4) or 1)
+        downloader.segment_threshold_bytes = int(float(settings.get("segment_threshold_mb", 100) or 100) * 1024 * 1024)
+        downloader.multi_mirror_downloads = bool(settings.get("multi_mirror_downloads", False))
+        downloader.recheck_dead_media = bool(settings.get("recheck_dead_media", False))
+        downloader.download_order = settings.get("download_order", "small_first")
+        downloader.part_max_age_days = float(settings.get("part_max_age_days", 7) or 0)
+        downloader.preflight_sizing = bool(settings.get("preflight_sizing", False))
+        downloader.disk_reserve_mb = float(settings.get("disk_reserve_mb", 500) or 0)
+        downloader.size_filter = SizeFilter.from_settings(settings)
+        downloader.pause_changed_callback = self.frontend.set_download_paused
+        downloader.set_http_backend(settings.get("http_backend", "requests"))
+        shared_limiter.set_rate(float(settings.get("bandwidth_limit_mb", 0) or 0) * 1024 * 1024)
         return downloader
 
     def create_erome_downloader(self, is_profile_download=False):
@@ -97,10 +116,10 @@ class DownloaderFactory:
             rate_limit_interval=float(settings.get("rate_limit_interval", 0.0) or 0.0),
         )
         downloader.file_naming_mode = settings.get("file_naming_mode", 0)
-        return downloader
+        return self._apply_download_options(downloader, settings)
 
     def create_jpg5_downloader(self, url):
-        return Jpg5Downloader(
+        downloader = Jpg5Downloader(
             url=url,
             carpeta_destino=self.frontend.get_download_folder(),
             log_callback=self.frontend.log,
@@ -108,6 +127,7 @@ class DownloaderFactory:
             max_workers=self.frontend.get_max_downloads(),
             **self._retry_settings(),
         )
+        return self._apply_download_options(downloader)
 
     def create_coomerfans_downloader(self, is_profile_download=False, settings=None):
         settings = settings or {}
@@ -132,4 +152,4 @@ class DownloaderFactory:
             rate_limit_interval=float(settings.get("rate_limit_interval", 0.0) or 0.0),
         )
         downloader.file_naming_mode = settings.get("file_naming_mode", 0)
-        return downloader
\ No newline at end of file
+        return self._apply_download_options(downloader, settings)
\ No newline at end of file
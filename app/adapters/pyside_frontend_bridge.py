@@ -21,6 +21,9 @@ class PySideFrontendBridge(FrontendBridge):
     def update_global_progress(self, completed_files, total_files):
         self.app.update_global_progress(completed_files, total_files)
 
+    def set_download_paused(self, paused: bool):
+        self.app.set_download_paused_safe(paused)
+
     def get_download_folder(self) -> str:
         return self.app.download_folder
 
@@ -29,7 +29,12 @@ class MainController:
             only_this_url=bool(self.app.only_this_url_check.get()),
         )
 
-    def start_download(self):
+    def start_download(self, failed_only=False):
+        """
+        Downloads the URL in the input box. failed_only=True reruns just
+        the files the last download of that URL could not get, from its
+        job journal, without asking the site for the file list again.
+        """
         request = self.build_request_from_ui()
 
         if not request.download_folder:
@@ -261,6 +266,8 @@ class MainController:
             return
 
         if download_thread:
+            if self.app.active_downloader is not None:
+                self.app.active_downloader.retry_failed_only = failed_only
             download_thread.start()
             self.app.download_thread = download_thread
 
@@ -300,6 +307,9 @@ class MainController:
             )
         return download_info
 
+    def retry_failed_download(self):
+        self.start_download(failed_only=True)
+
     def cancel_download(self):
         if self.app.active_downloader:
             try:
@@ -311,4 +321,21 @@ class MainController:
         else:
             self.app.add_log_message_safe(self.app.tr("NO_ACTIVE_DOWNLOAD_TO_CANCEL"))
 
-        self.app.enable_widgets()
\ No newline at end of file
+        self.app.enable_widgets()
+
+    def pause_download(self):
+        downloader = self.app.active_downloader
+        if not downloader or not hasattr(downloader, "request_pause"):
+            self.app.add_log_message_safe(self.app.tr("NO_ACTIVE_DOWNLOAD_TO_PAUSE"))
+            return
+
+        downloader.request_pause()
+        self.app.set_download_paused(True)
+
+    def resume_download(self):
+        downloader = self.app.active_downloader
+        if not downloader or not hasattr(downloader, "request_resume"):
+            return
+
+        downloader.request_resume()
+        self.app.set_download_paused(False)
\ No newline at end of file
@@ -18,6 +18,10 @@ class FrontendBridge(ABC):
     def update_global_progress(self, completed_files, total_files):
         pass
 
+    @abstractmethod
+    def set_download_paused(self, paused: bool):
+        pass
+
     @abstractmethod
     def get_download_folder(self) -> str:
         pass
@@ -1,3 +1,9 @@
+from downloader.core.bandwidth_limiter import shared_limiter
+from downloader.core.http_transport import available_backends
+from downloader.core.job_scheduler import DOWNLOAD_ORDERS
+from downloader.core.size_filter import SizeFilter, parse_size_range
+
+
 class DownloadSettingsService:
     NAMING_MODE_LABEL_TO_VALUE = {
         "Use File ID (default)": 0,
@@ -13,9 +19,24 @@ class DownloadSettingsService:
         3: "Post Date/Time + Post Name",
     }
 
+    DOWNLOAD_ENGINES = ["threads", "asyncio"]
+    SEGMENT_COUNT_OPTIONS = [str(i) for i in range(1, 9)]
+
     def get_naming_options(self):
         return list(self.NAMING_MODE_LABEL_TO_VALUE.keys())
 
+    def get_download_engine_options(self):
+        return list(self.DOWNLOAD_ENGINES)
+
+    def get_segment_count_options(self):
+        return list(self.SEGMENT_COUNT_OPTIONS)
+
+    def get_download_order_options(self):
+        return list(DOWNLOAD_ORDERS)
+
+    def get_http_backend_options(self):
+        return available_backends()
+
     def get_naming_label_from_setting(self, value):
         if isinstance(value, int):
             return self.NAMING_MODE_VALUE_TO_LABEL.get(value, self.NAMING_MODE_VALUE_TO_LABEL[0])
@@ -39,11 +60,41 @@ class DownloadSettingsService:
         max_retries_value,
         retry_interval_value,
         file_naming_mode_label,
+        download_engine_value="threads",
+        segment_count_value=4,
+        segment_threshold_mb_value=100,
+        multi_mirror_value=False,
+        recheck_dead_media_value=False,
+        http_backend_value="requests",
+        bandwidth_limit_mb_value=0,
+        download_order_value="small_first",
+        part_max_age_days_value=7,
+        preflight_sizing_value=False,
+        disk_reserve_mb_value=500,
+        size_range_images_value="",
+        size_range_videos_value="",
+        size_range_compressed_value="",
     ):
         max_downloads = int(max_downloads_value)
         max_retries = int(max_retries_value)
         retry_interval = float(retry_interval_value)
         numeric_mode = self.NAMING_MODE_LABEL_TO_VALUE.get(file_naming_mode_label, 0)
+        download_engine = download_engine_value if download_engine_value in self.DOWNLOAD_ENGINES else "threads"
+        segment_count = max(1, int(segment_count_value))
+        segment_threshold_mb = max(1.0, float(segment_threshold_mb_value))
+        http_backend = http_backend_value if http_backend_value in available_backends() else "requests"
+        bandwidth_limit_mb = max(0.0, float(bandwidth_limit_mb_value or 0))
+        download_order = download_order_value if download_order_value in DOWNLOAD_ORDERS else "small_first"
+        part_max_age_days = max(0.0, float(part_max_age_days_value or 0))
+        disk_reserve_mb = max(0.0, float(disk_reserve_mb_value or 0))
+        size_ranges = {
+            "size_range_images": (size_range_images_value or "").strip(),
+            "size_range_videos": (size_range_videos_value or "").strip(),
+            "size_range_compressed": (size_range_compressed_value or "").strip(),
+        }
+        # Raises ValueError, like the numeric fields, when a range does not parse
+        for size_range in size_ranges.values():
+            parse_size_range(size_range)
 
         return {
             "max_downloads": max_downloads,
@@ -51,6 +102,18 @@ class DownloadSettingsService:
             "max_retries": max_retries,
             "retry_interval": retry_interval,
             "file_naming_mode": numeric_mode,
+            "download_engine": download_engine,
+            "segment_count": segment_count,
+            "segment_threshold_mb": segment_threshold_mb,
+            "multi_mirror_downloads": bool(multi_mirror_value),
+            "recheck_dead_media": bool(recheck_dead_media_value),
+            "http_backend": http_backend,
+            "bandwidth_limit_mb": bandwidth_limit_mb,
+            "download_order": download_order,
+            "part_max_age_days": part_max_age_days,
+            "preflight_sizing": bool(preflight_sizing_value),
+            "disk_reserve_mb": disk_reserve_mb,
+            **size_ranges,
         }
 
     def apply_to_settings(self, settings: dict, parsed_values: dict):
@@ -59,8 +122,26 @@ class DownloadSettingsService:
         settings["max_retries"] = parsed_values["max_retries"]
         settings["retry_interval"] = parsed_values["retry_interval"]
         settings["file_naming_mode"] = parsed_values["file_naming_mode"]
+        settings["download_engine"] = parsed_values["download_engine"]
+        settings["segment_count"] = parsed_values["segment_count"]
+        settings["segment_threshold_mb"] = parsed_values["segment_threshold_mb"]
+        settings["multi_mirror_downloads"] = parsed_values["multi_mirror_downloads"]
+        settings["recheck_dead_media"] = parsed_values["recheck_dead_media"]
+        settings["http_backend"] = parsed_values["http_backend"]
+        settings["bandwidth_limit_mb"] = parsed_values["bandwidth_limit_mb"]
+        settings["download_order"] = parsed_values["download_order"]
+        settings["part_max_age_days"] = parsed_values["part_max_age_days"]
+        settings["preflight_sizing"] = parsed_values["preflight_sizing"]
+        settings["disk_reserve_mb"] = parsed_values["disk_reserve_mb"]
+        settings["size_range_images"] = parsed_values["size_range_images"]
+        settings["size_range_videos"] = parsed_values["size_range_videos"]
+        settings["size_range_compressed"] = parsed_values["size_range_compressed"]
         return settings
 
+    def apply_bandwidth_limit(self, parsed_values: dict):
+        # Shared by every downloader, running ones included
+        shared_limiter.set_rate(parsed_values["bandwidth_limit_mb"] * 1024 * 1024)
+
     def apply_to_downloader(self, downloader, parsed_values: dict):
         if not downloader:
             return
@@ -72,4 +153,18 @@ class DownloadSettingsService:
 
         downloader.max_retries = parsed_values["max_retries"]
         downloader.retry_interval = parsed_values["retry_interval"]
-        downloader.file_naming_mode = parsed_values["file_naming_mode"]
\ No newline at end of file
+        downloader.file_naming_mode = parsed_values["file_naming_mode"]
+        # Takes effect for the next batch of jobs; a running batch keeps
+        # the engine it started on.
+        downloader.download_engine = parsed_values["download_engine"]
+        downloader.segment_count = parsed_values["segment_count"]
+        downloader.segment_threshold_bytes = int(parsed_values["segment_threshold_mb"] * 1024 * 1024)
+        downloader.multi_mirror_downloads = parsed_values["multi_mirror_downloads"]
+        downloader.recheck_dead_media = parsed_values["recheck_dead_media"]
+        downloader.download_order = parsed_values["download_order"]
+        downloader.part_max_age_days = parsed_values["part_max_age_days"]
+        downloader.preflight_sizing = parsed_values["preflight_sizing"]
+        downloader.disk_reserve_mb = parsed_values["disk_reserve_mb"]
+        downloader.size_filter = SizeFilter.from_settings(parsed_values)
+        if hasattr(downloader, "set_http_backend"):
+            downloader.set_http_backend(parsed_values["http_backend"])
\ No newline at end of file
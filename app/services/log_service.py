@@ -62,31 +62,37 @@ class LogService:
         completed_files = 0
         skipped_files = []
         failed_files = []
+        size_skip_reasons = {}
 
         if active_downloader:
             total_files = getattr(active_downloader, "total_files", 0)
             completed_files = getattr(active_downloader, "completed_files", 0)
             skipped_files = getattr(active_downloader, "skipped_files", [])
             failed_files = getattr(active_downloader, "failed_files", [])
+            size_skip_reasons = getattr(active_downloader, "size_skip_reasons", {})
 
         total_images = completed_files if download_images_enabled else 0
         total_videos = completed_files if download_videos_enabled else 0
         duration = datetime.datetime.now() - download_start_time if download_start_time else "N/A"
 
-        skipped_files_summary = "\n".join(skipped_files)
-        failed_files_summary = "\n".join(failed_files)
-
         summary = (
             f"Total de archivos descargados: {total_files}\n"
             f"Total de imágenes descargadas: {total_images}\n"
             f"Total de videos descargados: {total_videos}\n"
             f"Tiempo total de descarga: {duration}\n\n"
-            f"Archivos saltados:\n{skipped_files_summary}\n\n"
-            f"Archivos fallidos:\n{failed_files_summary}\n\n"
         )
 
         with open(log_file_path, "w", encoding="utf-8") as file:
             file.write(summary)
+            # Written line by line: on long runs these lists can be huge
+            file.write("Archivos saltados:\n")
+            file.writelines(f"{name}\n" for name in skipped_files)
+            if size_skip_reasons:
+                file.write("\nSaltados por tamaño:\n")
+                file.writelines(f"{reason}: {count}\n" for reason, count in size_skip_reasons.items())
+            file.write("\nArchivos fallidos:\n")
+            file.writelines(f"{name}\n" for name in failed_files)
+            file.write("\n")
             file.write("\n--- LOGS COMPLETOS ---\n")
             file.write("\n".join(self.all_logs))
 
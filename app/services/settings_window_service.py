@@ -10,6 +10,20 @@ class SettingsWindowService:
         "max_retries": 3,
         "retry_interval": 2.0,
         "file_naming_mode": 0,
+        "download_engine": "threads",
+        "segment_count": 4,
+        "segment_threshold_mb": 100,
+        "multi_mirror_downloads": False,
+        "recheck_dead_media": False,
+        "http_backend": "requests",
+        "bandwidth_limit_mb": 0.0,
+        "download_order": "small_first",
+        "part_max_age_days": 7,
+        "preflight_sizing": False,
+        "disk_reserve_mb": 500,
+        "size_range_images": "",
+        "size_range_videos": "",
+        "size_range_compressed": "",
     }
 
     def __init__(self, config_path, on_settings_changed=None):
@@ -8,6 +8,7 @@ from PySide6.QtWidgets import (
     QLabel,
     QPushButton,
     QComboBox,
+    QCheckBox,
     QLineEdit,
     QMessageBox,
     QTreeWidget,
@@ -182,6 +183,79 @@ class SettingsDialog(QDialog):
         self.file_naming_label = QLabel(self.translate("SETTINGS_FILE_NAMING_MODE"))
         layout.addRow(self.file_naming_label, self.file_naming_combo)
 
+        self.download_engine_combo = QComboBox()
+        self.download_engine_combo.addItems(self.download_settings_service.get_download_engine_options())
+        self.download_engine_combo.setCurrentText(self.settings.get("download_engine", "threads"))
+        self.download_engine_combo.setToolTip(self.translate("SETTINGS_DOWNLOAD_ENGINE_TOOLTIP"))
+        self.download_engine_label = QLabel(self.translate("SETTINGS_DOWNLOAD_ENGINE"))
+        layout.addRow(self.download_engine_label, self.download_engine_combo)
+
+        self.download_order_combo = QComboBox()
+        self.download_order_combo.addItems(self.download_settings_service.get_download_order_options())
+        self.download_order_combo.setCurrentText(self.settings.get("download_order", "small_first"))
+        self.download_order_combo.setToolTip(self.translate("SETTINGS_DOWNLOAD_ORDER_TOOLTIP"))
+        self.download_order_label = QLabel(self.translate("SETTINGS_DOWNLOAD_ORDER"))
+        layout.addRow(self.download_order_label, self.download_order_combo)
+
+        self.segment_count_combo = QComboBox()
+        self.segment_count_combo.addItems(self.download_settings_service.get_segment_count_options())
+        self.segment_count_combo.setCurrentText(str(self.settings.get("segment_count", 4)))
+        self.segment_count_combo.setToolTip(self.translate("SETTINGS_SEGMENT_COUNT_TOOLTIP"))
+        self.segment_count_label = QLabel(self.translate("SETTINGS_SEGMENT_COUNT"))
+        layout.addRow(self.segment_count_label, self.segment_count_combo)
+
+        self.segment_threshold_edit = QLineEdit(str(self.settings.get("segment_threshold_mb", 100)))
+        self.segment_threshold_label = QLabel(self.translate("SETTINGS_SEGMENT_THRESHOLD_MB"))
+        layout.addRow(self.segment_threshold_label, self.segment_threshold_edit)
+
+        self.multi_mirror_checkbox = QCheckBox(self.translate("SETTINGS_MULTI_MIRROR"))
+        self.multi_mirror_checkbox.setChecked(bool(self.settings.get("multi_mirror_downloads", False)))
+        self.multi_mirror_checkbox.setToolTip(self.translate("SETTINGS_MULTI_MIRROR_TOOLTIP"))
+        layout.addRow("", self.multi_mirror_checkbox)
+
+        self.recheck_dead_media_checkbox = QCheckBox(self.translate("SETTINGS_RECHECK_DEAD_MEDIA"))
+        self.recheck_dead_media_checkbox.setChecked(bool(self.settings.get("recheck_dead_media", False)))
+        self.recheck_dead_media_checkbox.setToolTip(self.translate("SETTINGS_RECHECK_DEAD_MEDIA_TOOLTIP"))
+        layout.addRow("", self.recheck_dead_media_checkbox)
+
+        self.http_backend_combo = QComboBox()
+        self.http_backend_combo.addItems(self.download_settings_service.get_http_backend_options())
+        self.http_backend_combo.setCurrentText(self.settings.get("http_backend", "requests"))
+        self.http_backend_combo.setToolTip(self.translate("SETTINGS_HTTP_BACKEND_TOOLTIP"))
+        self.http_backend_label = QLabel(self.translate("SETTINGS_HTTP_BACKEND"))
+        layout.addRow(self.http_backend_label, self.http_backend_combo)
+
+        self.bandwidth_limit_edit = QLineEdit(str(self.settings.get("bandwidth_limit_mb", 0.0)))
+        self.bandwidth_limit_edit.setToolTip(self.translate("SETTINGS_BANDWIDTH_LIMIT_TOOLTIP"))
+        self.bandwidth_limit_label = QLabel(self.translate("SETTINGS_BANDWIDTH_LIMIT_MB"))
+        layout.addRow(self.bandwidth_limit_label, self.bandwidth_limit_edit)
+
+        self.part_max_age_edit = QLineEdit(str(self.settings.get("part_max_age_days", 7)))
+        self.part_max_age_edit.setToolTip(self.translate("SETTINGS_PART_MAX_AGE_TOOLTIP"))
+        self.part_max_age_label = QLabel(self.translate("SETTINGS_PART_MAX_AGE_DAYS"))
+        layout.addRow(self.part_max_age_label, self.part_max_age_edit)
+
+        self.preflight_sizing_checkbox = QCheckBox(self.translate("SETTINGS_PREFLIGHT_SIZING"))
+        self.preflight_sizing_checkbox.setChecked(bool(self.settings.get("preflight_sizing", False)))
+        self.preflight_sizing_checkbox.setToolTip(self.translate("SETTINGS_PREFLIGHT_SIZING_TOOLTIP"))
+        layout.addRow("", self.preflight_sizing_checkbox)
+
+        self.disk_reserve_edit = QLineEdit(str(self.settings.get("disk_reserve_mb", 500)))
+        self.disk_reserve_edit.setToolTip(self.translate("SETTINGS_DISK_RESERVE_TOOLTIP"))
+        self.disk_reserve_label = QLabel(self.translate("SETTINGS_DISK_RESERVE_MB"))
+        layout.addRow(self.disk_reserve_label, self.disk_reserve_edit)
+
+        self.size_range_edits = {}
+        self.size_range_labels = {}
+        for media_class in ("images", "videos", "compressed"):
+            edit = QLineEdit(str(self.settings.get(f"size_range_{media_class}", "")))
+            edit.setPlaceholderText("50K-500M")
+            edit.setToolTip(self.translate("SETTINGS_SIZE_RANGE_TOOLTIP"))
+            label = QLabel(self.translate(f"SETTINGS_SIZE_RANGE_{media_class.upper()}"))
+            layout.addRow(label, edit)
+            self.size_range_edits[media_class] = edit
+            self.size_range_labels[media_class] = label
+
         self.apply_downloads_button = QPushButton(self.translate("SETTINGS_APPLY_DOWNLOAD_SETTINGS"))
         self.apply_downloads_button.clicked.connect(self._apply_download_settings)
         layout.addRow("", self.apply_downloads_button)
@@ -703,6 +777,20 @@ class SettingsDialog(QDialog):
                 max_retries_value=self.max_retries_combo.currentText(),
                 retry_interval_value=self.retry_interval_edit.text(),
                 file_naming_mode_label=self.file_naming_combo.currentText(),
+                download_engine_value=self.download_engine_combo.currentText(),
+                segment_count_value=self.segment_count_combo.currentText(),
+                segment_threshold_mb_value=self.segment_threshold_edit.text(),
+                multi_mirror_value=self.multi_mirror_checkbox.isChecked(),
+                recheck_dead_media_value=self.recheck_dead_media_checkbox.isChecked(),
+                http_backend_value=self.http_backend_combo.currentText(),
+                bandwidth_limit_mb_value=self.bandwidth_limit_edit.text(),
+                download_order_value=self.download_order_combo.currentText(),
+                part_max_age_days_value=self.part_max_age_edit.text(),
+                preflight_sizing_value=self.preflight_sizing_checkbox.isChecked(),
+                disk_reserve_mb_value=self.disk_reserve_edit.text(),
+                size_range_images_value=self.size_range_edits["images"].text(),
+                size_range_videos_value=self.size_range_edits["videos"].text(),
+                size_range_compressed_value=self.size_range_edits["compressed"].text(),
             )
 
             self.settings = self.download_settings_service.apply_to_settings(
@@ -711,6 +799,7 @@ class SettingsDialog(QDialog):
             )
             self.settings_service.save_settings(self.settings)
             self.download_settings_service.apply_to_downloader(self.downloader, parsed_values)
+            self.download_settings_service.apply_bandwidth_limit(parsed_values)
 
             if self.parent_window is not None:
                 if hasattr(self.parent_window, "settings"):
@@ -815,6 +904,30 @@ class SettingsDialog(QDialog):
         self.max_retries_label.setText(self.translate("SETTINGS_MAX_RETRIES"))
         self.retry_interval_label.setText(self.translate("SETTINGS_RETRY_INTERVAL_SECONDS"))
         self.file_naming_label.setText(self.translate("SETTINGS_FILE_NAMING_MODE"))
+        self.download_engine_label.setText(self.translate("SETTINGS_DOWNLOAD_ENGINE"))
+        self.download_engine_combo.setToolTip(self.translate("SETTINGS_DOWNLOAD_ENGINE_TOOLTIP"))
+        self.download_order_label.setText(self.translate("SETTINGS_DOWNLOAD_ORDER"))
+        self.download_order_combo.setToolTip(self.translate("SETTINGS_DOWNLOAD_ORDER_TOOLTIP"))
+        self.segment_count_label.setText(self.translate("SETTINGS_SEGMENT_COUNT"))
+        self.segment_count_combo.setToolTip(self.translate("SETTINGS_SEGMENT_COUNT_TOOLTIP"))
+        self.segment_threshold_label.setText(self.translate("SETTINGS_SEGMENT_THRESHOLD_MB"))
+        self.multi_mirror_checkbox.setText(self.translate("SETTINGS_MULTI_MIRROR"))
+        self.multi_mirror_checkbox.setToolTip(self.translate("SETTINGS_MULTI_MIRROR_TOOLTIP"))
+        self.recheck_dead_media_checkbox.setText(self.translate("SETTINGS_RECHECK_DEAD_MEDIA"))
+        self.recheck_dead_media_checkbox.setToolTip(self.translate("SETTINGS_RECHECK_DEAD_MEDIA_TOOLTIP"))
+        self.http_backend_label.setText(self.translate("SETTINGS_HTTP_BACKEND"))
+        self.http_backend_combo.setToolTip(self.translate("SETTINGS_HTTP_BACKEND_TOOLTIP"))
+        self.bandwidth_limit_label.setText(self.translate("SETTINGS_BANDWIDTH_LIMIT_MB"))
+        self.bandwidth_limit_edit.setToolTip(self.translate("SETTINGS_BANDWIDTH_LIMIT_TOOLTIP"))
+        self.part_max_age_label.setText(self.translate("SETTINGS_PART_MAX_AGE_DAYS"))
+        self.part_max_age_edit.setToolTip(self.translate("SETTINGS_PART_MAX_AGE_TOOLTIP"))
+        self.preflight_sizing_checkbox.setText(self.translate("SETTINGS_PREFLIGHT_SIZING"))
+        self.preflight_sizing_checkbox.setToolTip(self.translate("SETTINGS_PREFLIGHT_SIZING_TOOLTIP"))
+        self.disk_reserve_label.setText(self.translate("SETTINGS_DISK_RESERVE_MB"))
+        self.disk_reserve_edit.setToolTip(self.translate("SETTINGS_DISK_RESERVE_TOOLTIP"))
+        for media_class, edit in self.size_range_edits.items():
+            self.size_range_labels[media_class].setText(self.translate(f"SETTINGS_SIZE_RANGE_{media_class.upper()}"))
+            edit.setToolTip(self.translate("SETTINGS_SIZE_RANGE_TOOLTIP"))
 
         self.apply_language_button.setText(self.translate("SETTINGS_APPLY_LANGUAGE"))
         self.apply_downloads_button.setText(self.translate("SETTINGS_APPLY_DOWNLOAD_SETTINGS"))
@@ -67,6 +67,7 @@ class QtSignals(QObject):
     footer_total_size = Signal(str)
     clear_logs = Signal()
     show_error_box = Signal(str, str)
+    download_paused = Signal(bool)
 
 
 class PySideMainWindow(QMainWindow):
@@ -120,6 +121,7 @@ class PySideMainWindow(QMainWindow):
         self.signals.footer_total_size.connect(self.footer_set_total_size)
         self.signals.clear_logs.connect(self._clear_logs)
         self.signals.show_error_box.connect(self._show_error_dialog)
+        self.signals.download_paused.connect(self.set_download_paused)
 
         self._build_ui()
         self._bind_events()
@@ -285,7 +287,10 @@ class PySideMainWindow(QMainWindow):
     def _bind_events(self):
         self.download_panel.browse_button.clicked.connect(self.select_folder)
         self.download_panel.download_button.clicked.connect(self.start_download)
+        self.download_panel.retry_failed_button.clicked.connect(self.retry_failed_download)
         self.download_panel.cancel_button.clicked.connect(self.cancel_download)
+        self.download_panel.pause_button.clicked.connect(self.pause_download)
+        self.download_panel.resume_button.clicked.connect(self.resume_download)
         self.download_panel.folder_label.linkActivated.connect(lambda _: self.open_download_folder())
         self.download_panel.folder_label.mousePressEvent = lambda event: self.open_download_folder()
 
@@ -429,6 +434,13 @@ class PySideMainWindow(QMainWindow):
                 for item in self._active_progress.values()
             )
 
+        # With the pre-flight size pass the totals cover the whole run, not only the files in flight
+        run_total_bytes = getattr(self.active_downloader, "run_total_bytes", 0) or 0
+        if run_total_bytes > 0:
+            total_downloaded_bytes += getattr(self.active_downloader, "run_landed_bytes", 0) or 0
+            total_bytes = max(run_total_bytes, total_downloaded_bytes)
+            total_remaining_bytes = total_bytes - total_downloaded_bytes
+
         # Suavizado de velocidad para evitar saltos bruscos en archivos pequeños
         if total_speed > 0:
             if self._smoothed_total_speed <= 0:
@@ -502,9 +514,18 @@ class PySideMainWindow(QMainWindow):
     def start_download(self):
         self.main_controller.start_download()
 
+    def retry_failed_download(self):
+        self.main_controller.retry_failed_download()
+
     def cancel_download(self):
         self.main_controller.cancel_download()
 
+    def pause_download(self):
+        self.main_controller.pause_download()
+
+    def resume_download(self):
+        self.main_controller.resume_download()
+
     def closeEvent(self, event):
         # The download threads are daemons: closing the window kills them
         # mid-write, so warn while one is still running or still cancelling.
@@ -580,9 +601,19 @@ class PySideMainWindow(QMainWindow):
 
     def _set_download_enabled(self, enabled: bool):
         self.download_panel.download_button.setEnabled(enabled)
+        self.download_panel.retry_failed_button.setEnabled(enabled)
 
     def _set_cancel_enabled(self, enabled: bool):
         self.download_panel.cancel_button.setEnabled(enabled)
+        # A download starts running and ends unpaused
+        self.set_download_paused(False, active=enabled)
+
+    def set_download_paused(self, paused: bool, active: bool = True):
+        self.download_panel.pause_button.setEnabled(active and not paused)
+        self.download_panel.resume_button.setEnabled(active and paused)
+
+    def set_download_paused_safe(self, paused: bool):
+        self.signals.download_paused.emit(paused)
 
     def _apply_global_progress(self, current: int, total: int):
         if total > 0:
@@ -68,6 +68,18 @@ class DownloadPanel(QWidget):
         self.download_button = QPushButton(self.tr("DOWNLOAD_PANEL_DOWNLOAD"))
         buttons_row.addWidget(self.download_button)
 
+        self.retry_failed_button = QPushButton(self.tr("DOWNLOAD_PANEL_RETRY_FAILED"))
+        self.retry_failed_button.setToolTip(self.tr("DOWNLOAD_PANEL_RETRY_FAILED_TOOLTIP"))
+        buttons_row.addWidget(self.retry_failed_button)
+
+        self.pause_button = QPushButton(self.tr("DOWNLOAD_PANEL_PAUSE_DOWNLOAD"))
+        self.pause_button.setEnabled(False)
+        buttons_row.addWidget(self.pause_button)
+
+        self.resume_button = QPushButton(self.tr("DOWNLOAD_PANEL_RESUME_DOWNLOAD"))
+        self.resume_button.setEnabled(False)
+        buttons_row.addWidget(self.resume_button)
+
         self.cancel_button = QPushButton(self.tr("DOWNLOAD_PANEL_CANCEL_DOWNLOAD"))
         self.cancel_button.setEnabled(False)
         buttons_row.addWidget(self.cancel_button)
@@ -86,4 +98,8 @@ class DownloadPanel(QWidget):
         self.only_this_url_check.setToolTip(self.tr("DOWNLOAD_PANEL_ONLY_THIS_URL_TOOLTIP"))
         self.autoscroll_log_check.setText(self.tr("DOWNLOAD_PANEL_AUTOSCROLL_LOG"))
         self.download_button.setText(self.tr("DOWNLOAD_PANEL_DOWNLOAD"))
+        self.retry_failed_button.setText(self.tr("DOWNLOAD_PANEL_RETRY_FAILED"))
+        self.retry_failed_button.setToolTip(self.tr("DOWNLOAD_PANEL_RETRY_FAILED_TOOLTIP"))
+        self.pause_button.setText(self.tr("DOWNLOAD_PANEL_PAUSE_DOWNLOAD"))
+        self.resume_button.setText(self.tr("DOWNLOAD_PANEL_RESUME_DOWNLOAD"))
         self.cancel_button.setText(self.tr("DOWNLOAD_PANEL_CANCEL_DOWNLOAD"))
\ No newline at end of file
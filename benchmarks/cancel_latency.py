@@ -0,0 +1,144 @@
+"""
+Time from request_cancel() to an idle downloader, under slow hosts.
+
+A local HTTP server simulates the hosts that used to hold a cancel up
+for minutes:
+
+  headers   accepts the request and never answers (a read blocked on
+            the response headers until the 120 s read timeout)
+  trickle   answers, then sends a few bytes every half second (a body
+            read that stays just alive)
+  backoff   answers 503 with a long Retry-After (retries waiting in
+            the backoff heap)
+  mixed     all of the above at once
+
+Each scenario starts a coomer/kemono Downloader on a batch of such
+files, cancels it once every worker is busy, and measures how long
+_run_media_jobs and shutdown_executor take to return, which is when
+the UI gets its buttons back. Exits with status 1 when a scenario
+takes longer than --limit seconds; tests/test_cancel_latency.py holds
+every backend to the same bound.
+
+    python benchmarks/cancel_latency.py --files 12 --workers 6 --rounds 3
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader.downloader import Downloader  # noqa: E402
+
+SCENARIOS = ("headers", "trickle", "backoff", "mixed")
+STOP = threading.Event()
+
+
+class SlowHostHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        kind = self.path.strip("/").split("/", 1)[0]
+        try:
+            if kind == "headers":
+                while not STOP.wait(0.1):
+                    pass
+            elif kind == "trickle":
+                self.send_response(200)
+                self.send_header("Content-Length", str(512 * 1024 * 1024))
+                self.send_header("Content-Type", "video/mp4")
+                self.end_headers()
+                while not STOP.wait(0.5):
+                    self.wfile.write(b"\0" * 1024)
+                    self.wfile.flush()
+            else:
+                self.send_response(503)
+                self.send_header("Retry-After", "120")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHostHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def jobs_for(scenario, port, files):
+    kinds = SCENARIOS[:3] if scenario == "mixed" else (scenario,)
+    return [
+        {
+            "media_url": f"http://127.0.0.1:{port}/{kinds[i % len(kinds)]}/{scenario}_{i}.mp4",
+            "user_id": "bench",
+            "post_id": str(i),
+        }
+        for i in range(files)
+    ]
+
+
+def measure(scenario, port, files, workers, warmup):
+    downloader = Downloader(
+        os.path.join(os.getcwd(), "downloads"),
+        max_workers=workers,
+        rate_limit_interval=0,
+    )
+    # Every job's host is 127.0.0.1; let them all run at once
+    downloader.per_domain_limit = workers
+
+    runner = threading.Thread(
+        target=lambda: (downloader._run_media_jobs(jobs_for(scenario, port, files)), downloader.shutdown_executor()),
+        daemon=True,
+    )
+    runner.start()
+    time.sleep(warmup)
+
+    started = time.perf_counter()
+    downloader.request_cancel()
+    runner.join(timeout=300)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--warmup", type=float, default=1.5, help="seconds to let the run start before cancelling")
+    parser.add_argument("--limit", type=float, default=1.0, help="slowest acceptable time to idle, in seconds")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append")
+    args = parser.parse_args()
+
+    # The downloader keeps its database under the working directory
+    os.chdir(tempfile.mkdtemp(prefix="cancel_latency_"))
+    server = start_server()
+    port = server.server_address[1]
+
+    slowest = 0.0
+    try:
+        print(f"{'scenario':<10} {'best':>8} {'worst':>8}")
+        for scenario in args.scenario or SCENARIOS:
+            times = [measure(scenario, port, args.files, args.workers, args.warmup) for _ in range(args.rounds)]
+            slowest = max(slowest, max(times))
+            print(f"{scenario:<10} {min(times):>7.2f}s {max(times):>7.2f}s")
+    finally:
+        STOP.set()
+        server.shutdown()
+
+    if slowest > args.limit:
+        print(f"slowest cancel took {slowest:.2f}s, over the {args.limit:.2f}s limit")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
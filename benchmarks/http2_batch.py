@@ -0,0 +1,150 @@
+"""
+Files per second for a batch of small media files, per HTTP backend.
+
+Fetches the same URLs once through every available backend (requests
+over HTTP/1.1, http2 when httpx and h2 are installed) with the same
+worker count and the per-host limits the downloaders would apply, and
+reads each body to the end without writing it to disk.
+
+    python benchmarks/http2_batch.py --profile coomer.st/onlyfans/<user> --limit 500
+    python benchmarks/http2_batch.py --urls urls.txt --workers 10
+
+--profile lists the first --limit image URLs of a Coomer/Kemono profile
+through its API; --urls reads one URL per line.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader.core.http_transport import HttpTransport, available_backends  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp")
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Accept": "text/css",
+}
+
+# Per-host limits of the coomer/kemono downloader: connections, or streams over HTTP/2
+HOST_LIMITS = {False: 6, True: 16}
+
+
+def profile_image_urls(profile, limit):
+    site, service, user = profile.strip("/").split("/")[:3]
+    transport = HttpTransport()
+    headers = dict(HEADERS, Referer=f"https://{site}/")
+    urls = []
+    offset = 0
+    while len(urls) < limit:
+        api_url = f"https://{site}/api/v1/{service}/user/{quote_plus(user)}/posts?o={offset}"
+        response = transport.get(api_url, headers=headers, timeout=(10, 60))
+        if response.status_code == 400:
+            break
+        response.raise_for_status()
+        posts = response.json()
+        if isinstance(posts, dict):
+            posts = posts.get("data") or []
+        if not posts:
+            break
+
+        for post in posts:
+            files = [post.get("file") or {}] + list(post.get("attachments") or [])
+            for item in files:
+                path = item.get("path")
+                if path and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+                    urls.append(f"https://{site}/{path.lstrip('/')}")
+        offset += 50
+
+    transport.close()
+    return list(dict.fromkeys(urls))[:limit]
+
+
+def run(backend, urls, workers, timeout):
+    transport = HttpTransport(backend, pool_size=workers)
+    limits = {}
+    limits_lock = threading.Lock()
+    errors = []
+    total_bytes = [0]
+
+    def host_slot(url):
+        host = urlparse(url).netloc
+        with limits_lock:
+            if host not in limits:
+                limits[host] = threading.Semaphore(HOST_LIMITS[transport.multiplexed])
+            return limits[host]
+
+    def fetch(url):
+        size = 0
+        try:
+            with host_slot(url):
+                response = transport.get(url, headers=HEADERS, stream=True, timeout=timeout)
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+            response.close()
+        except Exception as e:
+            errors.append((url, e))
+        with limits_lock:
+            total_bytes[0] += size
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+    transport.close()
+
+    done = len(urls) - len(errors)
+    return {
+        "backend": backend,
+        "files": done,
+        "errors": len(errors),
+        "seconds": elapsed,
+        "files_per_second": done / elapsed if elapsed else 0.0,
+        "mb_per_second": total_bytes[0] / elapsed / (1024 * 1024) if elapsed else 0.0,
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--profile", help="site/service/user, e.g. coomer.st/onlyfans/name")
+    source.add_argument("--urls", help="file with one media URL per line")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=1, help="runs per backend, alternating backends")
+    args = parser.parse_args()
+
+    if args.profile:
+        urls = profile_image_urls(args.profile, args.limit)
+    else:
+        with open(args.urls, encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip()][: args.limit]
+    if not urls:
+        sys.exit("No URLs to fetch")
+
+    backends = available_backends()
+    if "http2" not in backends:
+        print("http2 backend unavailable (pip install httpx[http2]); measuring requests only")
+
+    print(f"{len(urls)} files, {args.workers} workers")
+    for round_index in range(args.rounds):
+        for backend in backends:
+            result = run(backend, urls, args.workers, timeout=(10, 120))
+            print(
+                f"[{round_index + 1}] {result['backend']:<9} {result['files']:>5} files  "
+                f"{result['errors']:>3} errors  {result['seconds']:7.2f} s  "
+                f"{result['files_per_second']:7.1f} files/s  {result['mb_per_second']:7.2f} MB/s"
+            )
+            if result["first_error"]:
+                print("    first error: %s: %s" % result["first_error"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+CPU time per GB of the streamed receive path.
+
+Serves a large body from a local HTTP server (in its own process) and
+downloads it through requests with:
+
+  iter_content  the previous loop: iter_content(chunk_size=1 MB) and
+                f.write of every new bytes object
+  readinto      BodyReader reading into one reused buffer, with the
+                .tmp file preallocated
+
+Each client runs in a fresh process and reports its throughput, its
+user+system CPU seconds per GB (where the per-chunk allocation and
+copying shows up) and its peak RSS.
+
+    python benchmarks/receive_path.py --size-mb 2048 --rounds 3
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BLOCK = os.urandom(1024 * 1024)
+
+
+class BodyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        size = int(self.path.rsplit("/", 1)[-1])
+        self.send_response(200)
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        view = memoryview(BLOCK)
+        sent = 0
+        while sent < size:
+            part = view[: min(len(BLOCK), size - sent)]
+            self.wfile.write(part)
+            sent += len(part)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BodyHandler)
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+def client(variant, url, sink):
+    import requests
+
+    from downloader.core.body_reader import BodyReader, preallocate
+
+    session = requests.Session()
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    response = session.get(url, stream=True)
+    total_size = int(response.headers["content-length"])
+    received = 0
+
+    with open(sink, "wb") as f:
+        if variant == "iter_content":
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+                received += len(chunk)
+        else:
+            preallocate(f, total_size)
+            for chunk in BodyReader(response).chunks():
+                f.write(chunk)
+                received += len(chunk)
+
+    elapsed = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    gigabytes = received / 1024**3
+    print(
+        json.dumps(
+            {
+                "variant": variant,
+                "bytes": received,
+                "seconds": elapsed,
+                "cpu_per_gb": (after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime) / gigabytes,
+                "max_rss_mb": after.ru_maxrss / 1024,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--sink", default=None, help="file to write to (default: a temp file, removed after)")
+    parser.add_argument("--client", nargs=3, metavar=("VARIANT", "URL", "SINK"), help=argparse.SUPPRESS)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+        return
+    if args.client:
+        client(*args.client)
+        return
+
+    server = subprocess.Popen([sys.executable, __file__, "--serve"], stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(server.stdout.readline())
+        url = f"http://127.0.0.1:{port}/{args.size_mb * 1024 * 1024}"
+        sink = args.sink or os.path.join(tempfile.gettempdir(), "receive_path_benchmark.tmp")
+
+        results = {}
+        for _ in range(args.rounds):
+            for variant in ("iter_content", "readinto"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--client", variant, url, sink],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                results.setdefault(variant, []).append(json.loads(output))
+
+        print(f"{args.size_mb} MB body, median of {args.rounds} runs")
+        for variant, runs in results.items():
+            median = lambda key: sorted(run[key] for run in runs)[len(runs) // 2]  # noqa: E731
+            print(
+                f"{variant:<13} {args.size_mb / 1024 / median('seconds'):6.2f} GB/s  "
+                f"{median('cpu_per_gb'):6.2f} CPU s/GB  "
+                f"{median('max_rss_mb'):6.1f} MB max RSS"
+            )
+    finally:
+        server.terminate()
+        if not args.sink:
+            try:
+                os.remove(os.path.join(tempfile.gettempdir(), "receive_path_benchmark.tmp"))
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,11 @@ from bs4 import BeautifulSoup
 class SimpCityAdapter:
     site_name = "simpcity"
 
-    def __init__(self, cookies_path="resources/config/cookies/simpcity.json", log_callback=None, tr=None):
+    def __init__(self, cookies_path="resources/config/cookies/simpcity.json", log_callback=None, tr=None, should_cancel=None):
         self.cookies_path = cookies_path
         self.log_callback = log_callback
         self.tr = tr if tr else (lambda x, **kwargs: x.format(**kwargs) if kwargs else x)
+        self.should_cancel = should_cancel
 
         try:
             import cloudscraper
@@ -46,6 +47,9 @@ class SimpCityAdapter:
         if self.log_callback:
             self.log_callback(self.site_name, message)
 
+    def _cancelled(self):
+        return callable(self.should_cancel) and self.should_cancel()
+
     def sanitize_folder_name(self, name):
         return re.sub(r'[<>:"/\\|?*]', "_", name)
 
@@ -85,6 +89,8 @@ class SimpCityAdapter:
         folder_name = None
 
         while current_url and current_url not in visited:
+            if self._cancelled():
+                break
             visited.add(current_url)
 
             soup = self.fetch_page(current_url)
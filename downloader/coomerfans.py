@@ -1,5 +1,4 @@
-from concurrent.futures import as_completed
-
+from downloader.core.bandwidth_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
 from downloader.core.base_api_downloader import BaseApiDownloader
 from downloader.adapters.coomerfans_adapter import CoomerfansAdapter
 
@@ -69,33 +68,29 @@ class CoomerfansDownloader(BaseApiDownloader):
         if self.is_profile_download and self.enable_widgets_callback:
             self.enable_widgets_callback()
 
-    def _download_entries(self, media_entries, default_user_id=None):
-        self.total_files = len(media_entries)
-        self.completed_files = 0
-        futures = []
+    def _entry_jobs(self, media_entries, default_user_id=None):
+        jobs = []
 
         for entry in media_entries:
             media_url = entry["media_url"]
             user_id = entry.get("user_id") or default_user_id or "coomerfans"
 
-            kwargs = dict(
-                user_id=user_id,
-                post_id=entry.get("post_id"),
-                post_name=entry.get("title"),
-                post_time=entry.get("published"),
-                download_id=media_url,
+            jobs.append(
+                dict(
+                    media_url=media_url,
+                    user_id=user_id,
+                    post_id=entry.get("post_id"),
+                    post_name=entry.get("title"),
+                    post_time=entry.get("published"),
+                    download_id=media_url,
+                )
             )
+        return jobs
 
-            future = self.executor.submit(self.process_media_element, media_url, **kwargs)
-            futures.append(future)
-
-        self.futures = futures
-
-        for future in as_completed(futures):
-            if self.cancel_requested.is_set():
-                self.log("COOMERFANS_CANCELLING_REMAINING_DOWNLOADS")
-                break
-            future.result()
+    def _download_journaled(self, url, resolve):
+        priority = PRIORITY_BACKGROUND if self.is_profile_download else PRIORITY_INTERACTIVE
+        if self._run_journaled(url, resolve, priority=priority) is False:
+            self.log("COOMERFANS_CANCELLING_REMAINING_DOWNLOADS")
 
     def process_post_page(self, page_url, base_folder, download_images=True, download_videos=True):
         try:
@@ -103,14 +98,20 @@ class CoomerfansDownloader(BaseApiDownloader):
                 return
 
             self.log("COOMERFANS_PROCESSING_POST_URL", page_url=page_url)
-            resolved = self.adapter._resolve_post(
-                page_url,
-                download_images=download_images,
-                download_videos=download_videos,
-            )
+            resolved = {}
+
+            def resolve():
+                resolved.update(
+                    self.adapter._resolve_post(
+                        page_url,
+                        download_images=download_images,
+                        download_videos=download_videos,
+                    )
+                )
+                return self._entry_jobs(resolved["media"], default_user_id=resolved.get("folder_name"))
 
-            self._download_entries(resolved["media"], default_user_id=resolved.get("folder_name"))
-            self.log("COOMERFANS_POST_DOWNLOAD_COMPLETE", folder_name=resolved["folder_name"])
+            self._download_journaled(page_url, resolve)
+            self.log("COOMERFANS_POST_DOWNLOAD_COMPLETE", folder_name=resolved.get("folder_name", page_url))
 
         except Exception as e:
             self.log("COOMERFANS_ERROR_ACCESSING_PAGE", page_url=page_url, status_code=str(e))
@@ -123,14 +124,20 @@ class CoomerfansDownloader(BaseApiDownloader):
                 return
 
             self.log("COOMERFANS_PROCESSING_PROFILE_URL", url=url)
-            resolved = self.adapter._resolve_profile(
-                url,
-                download_images=download_images,
-                download_videos=download_videos,
-            )
-
-            self._download_entries(resolved["media"], default_user_id=resolved.get("folder_name"))
-            self.log("COOMERFANS_PROFILE_DOWNLOAD_COMPLETE", username=resolved["folder_name"])
+            resolved = {}
+
+            def resolve():
+                resolved.update(
+                    self.adapter._resolve_profile(
+                        url,
+                        download_images=download_images,
+                        download_videos=download_videos,
+                    )
+                )
+                return self._entry_jobs(resolved["media"], default_user_id=resolved.get("folder_name"))
+
+            self._download_journaled(url, resolve)
+            self.log("COOMERFANS_PROFILE_DOWNLOAD_COMPLETE", username=resolved.get("folder_name", url))
 
         except Exception as e:
             self.log("COOMERFANS_ERROR_ACCESSING_PAGE", page_url=url, status_code=str(e))
@@ -0,0 +1,629 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+from downloader.core.part_file import CHECKPOINT_SECONDS, PART_SUFFIX, PartState, resumable_part
+from downloader.core.stall_watchdog import TransferWatch
+
+try:
+    import aiohttp
+except ImportError:  # optional: only the asyncio engine needs it
+    aiohttp = None
+
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class AsyncDownloadEngine:
+    """
+    Runs a downloader's media jobs on a single asyncio event loop, so
+    hundreds of transfers can be in flight without one OS thread per file.
+
+    The engine borrows everything except the transfer itself from the
+    downloader it wraps: target paths, the download cache, per-domain
+    limits, retry delays, cooldown state, subdomain probing and the
+    .part -> final rename, so both engines behave the same from the outside.
+    Requires aiohttp; `available` is False when it is not installed.
+
+    The transfer is the engine's own: every file comes over one
+    connection (no segmented or multi-mirror downloads) and is written
+    through the engine's disk threads, not the downloader's BodyReader
+    and DiskWriterPool. run() logs this when splitting is configured.
+    """
+
+    def __init__(self, downloader, max_in_flight=256, disk_workers=4, chunk_size=1048576):
+        self.downloader = downloader
+        self.max_in_flight = max_in_flight
+        self.disk_workers = disk_workers
+        self.chunk_size = chunk_size
+        self.domain_last_request = defaultdict(float)
+        # media URL -> future of its final path (None if it failed), for duplicate jobs
+        self.flights = {}
+        self.disk_executor = None
+
+    @property
+    def available(self):
+        return aiohttp is not None
+
+    def run(self, jobs):
+        if not self.available:
+            raise RuntimeError("The asyncio engine requires the 'aiohttp' package.")
+
+        downloader = self.downloader
+        if int(getattr(downloader, "segment_count", 1) or 1) > 1 or getattr(downloader, "multi_mirror_downloads", False):
+            downloader.log("ASYNC_ENGINE_NO_SEGMENTS")
+
+        self.disk_executor = ThreadPoolExecutor(max_workers=self.disk_workers)
+        try:
+            asyncio.run(self._run_all(jobs))
+        finally:
+            self.disk_executor.shutdown(wait=True)
+
+    async def _run_all(self, jobs):
+        connect_timeout, read_timeout = self.downloader.request_timeout
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=0, ttl_dns_cache=300)
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            # Tasks are created as earlier ones finish, so a huge job list
+            # never turns into as many tasks at once
+            jobs = iter(jobs)
+            pending = {}
+            while True:
+                while len(pending) < self.max_in_flight:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pending[asyncio.create_task(self._run_job(session, in_flight, job))] = job["media_url"]
+                if not pending:
+                    return
+
+                if self.downloader.cancel_requested.is_set():
+                    for task in pending:
+                        task.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    return
+
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=0.5,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    media_url = pending.pop(task)
+                    if not task.cancelled() and task.exception() is not None:
+                        self.downloader.log("MEDIA_JOB_FAILED", media_url=media_url, error=task.exception())
+                        with self.downloader.file_lock:
+                            self.downloader.failed_files.append(media_url)
+
+    async def _in_disk_thread(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.disk_executor, func, *args)
+
+    @asynccontextmanager
+    async def _domain_gate(self, domain):
+        # Shares the downloader's adaptive per-host slots with the threads
+        slot = self.downloader.domain_locks[domain]
+        await slot.acquire_async()
+        try:
+            yield
+        finally:
+            slot.release()
+
+    async def _wait_for_domain_cooldown(self, domain):
+        # The downloader's circuit breaker is shared with the threads
+        breaker = getattr(self.downloader, "host_breaker", None)
+        while True:
+            if self.downloader.cancel_requested.is_set():
+                return False
+            wait = breaker.acquire(domain) if breaker is not None else 0.0
+            if wait <= 0:
+                return True
+            await asyncio.sleep(min(wait, 0.5))
+
+    def _mark_domain(self, domain, status_code=None, failed=False):
+        if status_code is None and not failed:
+            mark = getattr(self.downloader, "_mark_domain_success", None)
+            if mark:
+                mark(domain)
+        else:
+            mark = getattr(self.downloader, "_mark_domain_error", None)
+            if mark:
+                mark(domain, status_code)
+
+    async def _open(self, session, url, headers):
+        domain = urlparse(url).netloc
+        async with self._domain_gate(domain):
+            elapsed_time = time.time() - self.domain_last_request[domain]
+            if elapsed_time < self.downloader.rate_limit_interval:
+                await asyncio.sleep(self.downloader.rate_limit_interval - elapsed_time)
+
+            self.domain_last_request[domain] = time.time()
+            response = await session.get(url, headers=headers, allow_redirects=True)
+            if response.status < 400:
+                # The body keeps the slot until _stream_body has read it
+                self.downloader._hold_transfer(response, domain)
+            return response
+
+    async def _request(self, session, url, headers=None, max_retries=None):
+        """Async counterpart of the downloader's safe_request."""
+        downloader = self.downloader
+        headers = headers or downloader.headers
+        max_retries = downloader.max_retries if max_retries is None else max_retries
+        try:
+            max_retries = max(int(max_retries), 0)
+        except (TypeError, ValueError):
+            max_retries = 0
+
+        route = getattr(downloader, "_route_to_known_node", None)
+        if route is not None:
+            url = route(url)
+        affinity = getattr(downloader, "node_affinity", None)
+
+        domain = urlparse(url).netloc
+
+        for attempt in range(max_retries + 1):
+            if downloader.cancel_requested.is_set():
+                return None
+
+            if not await self._wait_for_domain_cooldown(domain):
+                return None
+
+            active_domain = domain
+            try:
+                response = await self._open(session, url, headers)
+                sc = response.status
+
+                if sc in (403, 404) and ("coomer" in domain or "kemono" in domain):
+                    if affinity is not None:
+                        affinity.record_miss(str(response.url))
+                    response.release()
+                    self._mark_domain(domain, sc)
+                    if downloader.update_progress_callback:
+                        downloader.update_progress_callback(0, 0, status=f"{sc} - probing subdomains")
+
+                    alt_url = await asyncio.to_thread(downloader._resolve_subdomain, url)
+                    if alt_url == url:
+                        if downloader.update_progress_callback:
+                            downloader.update_progress_callback(0, 0, status="Exhausted subdomains")
+                        mark_media_dead = getattr(downloader, "_mark_media_dead", None)
+                        if mark_media_dead is not None:
+                            mark_media_dead(url, sc)
+                        return None
+
+                    alt_domain = active_domain = urlparse(alt_url).netloc
+                    if downloader.update_progress_callback:
+                        downloader.update_progress_callback(0, 0, status=f"Subdomain found: {alt_domain}")
+                    if not await self._wait_for_domain_cooldown(alt_domain):
+                        return None
+
+                    response = await self._open(session, alt_url, headers)
+                    response.raise_for_status()
+                    self._mark_domain(alt_domain)
+                    if affinity is not None:
+                        affinity.record_success(str(response.url))
+                    return response
+
+                response.raise_for_status()
+                self._mark_domain(domain)
+                if affinity is not None:
+                    affinity.record_success(str(response.url))
+                return response
+
+            except asyncio.TimeoutError:
+                self._mark_domain(active_domain, failed=True)
+                downloader.log(
+                    "READ_TIMEOUT_RETRY",
+                    attempt=attempt + 1,
+                    total=max_retries + 1,
+                    timeout=downloader.request_timeout[1],
+                )
+                if attempt < max_retries and not await self._backoff(downloader._compute_retry_delay(attempt)):
+                    return None
+
+            except aiohttp.ClientResponseError as e:
+                self._mark_domain(active_domain, e.status)
+                if e.status in RETRYABLE_STATUS_CODES:
+                    downloader.log(
+                        "HTTP_RETRY_REQUEST",
+                        attempt=attempt + 1,
+                        total=max_retries + 1,
+                        status_code=e.status,
+                        url=url,
+                    )
+                    if attempt < max_retries and not await self._backoff(self._retry_delay(domain, attempt, e)):
+                        return None
+                elif e.status in (403, 404):
+                    if attempt == max_retries:
+                        downloader.log("FINAL_FAILURE_ACCESSING_URL", url=url, status_code=e.status)
+                else:
+                    self._log_access_error(url, attempt, max_retries, e)
+                    if attempt < max_retries and not await self._backoff(downloader._compute_retry_delay(attempt)):
+                        return None
+
+            except aiohttp.ClientError as e:
+                self._mark_domain(active_domain, failed=True)
+                self._log_access_error(url, attempt, max_retries, e)
+                if attempt < max_retries and not await self._backoff(downloader._compute_retry_delay(attempt)):
+                    return None
+
+        return None
+
+    def _retry_delay(self, domain, attempt, error):
+        retry_delay_for = getattr(self.downloader, "_retry_delay_for", None)
+        if retry_delay_for is None:
+            return self.downloader._compute_retry_delay(attempt)
+        return retry_delay_for(domain, attempt, error)
+
+    async def _backoff(self, delay):
+        """Waits before a retry; False when the retry budget is spent or the run is cancelled."""
+        spend_retry = getattr(self.downloader, "_spend_retry", None)
+        if spend_retry is not None and not spend_retry():
+            return False
+
+        deadline = time.time() + delay
+        while True:
+            if self.downloader.cancel_requested.is_set():
+                return False
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(remaining, 0.5))
+
+    async def _wait_while_paused(self):
+        """Returns False if the run was cancelled while paused."""
+        while self.downloader.pause_gate.paused:
+            if self.downloader.cancel_requested.is_set():
+                return False
+            await asyncio.sleep(0.25)
+        return True
+
+    async def _claim_disk_space(self, path, media_url):
+        """Like the downloader's _claim_disk_space, but waits without holding a thread."""
+        downloader = self.downloader
+        size = downloader.known_sizes.get(media_url, 0)
+        claim = downloader._try_claim_disk_space(path, size)
+        while claim is None:
+            if downloader.cancel_requested.is_set():
+                return None
+            await asyncio.sleep(0.5)
+            claim = downloader._try_claim_disk_space(path, size)
+        return claim
+
+    def _log_access_error(self, url, attempt, max_retries, error):
+        url_display = url if len(url) <= 60 else url[:60] + "..."
+        self.downloader.log(
+            "ERROR_ACCESSING_URL",
+            attempt=attempt + 1,
+            total=max_retries + 1,
+            url=url_display,
+            error=error,
+        )
+
+    async def _run_job(self, session, in_flight, job):
+        async with in_flight:
+            await self._process_media_element(session, **job)
+
+    async def _process_media_element(
+        self,
+        session,
+        media_url,
+        user_id=None,
+        post_id=None,
+        post_name=None,
+        post_time=None,
+        download_id=None,
+        target_folder=None,
+        forced_filename=None,
+    ):
+        downloader = self.downloader
+        if downloader.cancel_requested.is_set() or not await self._wait_while_paused():
+            return
+
+        final_path = downloader._prepare_media_target(
+            media_url,
+            user_id=user_id,
+            post_id=post_id,
+            post_name=post_name,
+            post_time=post_time,
+            target_folder=target_folder,
+            forced_filename=forced_filename,
+        )
+        if final_path is None:
+            return
+
+        part_path = final_path + PART_SUFFIX
+
+        if media_url in downloader.download_cache:
+            downloader.log("FILE_ALREADY_IN_DB_SKIPPING", media_url=media_url)
+            with downloader.file_lock:
+                downloader.skipped_files.append(final_path)
+            return
+
+        skip_known_dead = getattr(downloader, "_skip_known_dead", None)
+        if skip_known_dead is not None and skip_known_dead(media_url, final_path):
+            return
+
+        if downloader._skip_by_size(media_url, final_path, downloader.known_sizes.get(media_url, 0)):
+            return
+
+        flight = self.flights.get(media_url)
+        if flight is not None:
+            downloader.log("FILE_ALREADY_IN_PROGRESS_WAITING", media_url=media_url)
+            source_path = await asyncio.shield(flight)
+            if source_path is None:
+                # The other job failed: try again in this one
+                await self._process_media_element(
+                    session,
+                    media_url,
+                    user_id=user_id,
+                    post_id=post_id,
+                    post_name=post_name,
+                    post_time=post_time,
+                    download_id=download_id,
+                    target_folder=os.path.dirname(final_path),
+                    forced_filename=os.path.basename(final_path),
+                )
+                return
+            await self._in_disk_thread(downloader._share_download, source_path, final_path, media_url)
+            return
+
+        flight = asyncio.get_running_loop().create_future()
+        self.flights[media_url] = flight
+        landed_path = None
+        space_claim = None
+        try:
+            space_claim = await self._claim_disk_space(final_path, media_url)
+            if space_claim is None:
+                downloader.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
+                return
+
+            downloader.log("STARTING_DOWNLOAD_FROM", media_url=media_url)
+
+            # A .part file an earlier run left behind continues where it stopped
+            part = resumable_part(part_path, media_url)
+            request_headers = None
+            if part is not None:
+                request_headers = downloader.headers.copy()
+                request_headers.update(part.resume_headers())
+
+            response = await self._request(session, media_url, headers=request_headers)
+            if part is not None and response is not None and not part.continues(response.status, response.headers):
+                part = None
+                if response.status == 206:
+                    # A range that does not continue the part; fetch the whole file instead
+                    downloader._end_transfer(response)
+                    response.release()
+                    response = await self._request(session, media_url)
+
+            if response is None:
+                downloader.log(
+                    "FAILED_TO_DOWNLOAD_AFTER_ATTEMPTS",
+                    media_url=media_url,
+                    total=downloader.max_retries + 1,
+                )
+                with downloader.file_lock:
+                    downloader.failed_files.append(media_url)
+                return
+
+            if part is not None:
+                # 206: the server still has the same file, continue the .part
+                downloader.log("RESUMING_PART_FILE", media_url=media_url, downloaded_size=part.written)
+                total_size = part.size
+            else:
+                # 200: new file, or it changed since the .part was written
+                total_size = int(response.headers.get("content-length", 0) or 0)
+                part = PartState.from_headers(media_url, total_size, response.headers)
+            offset = part.written
+            # Rejected on the headers alone, before any of the body is read
+            if downloader._skip_by_size(media_url, final_path, total_size):
+                response.release()
+                return
+            downloader.disk_guard.adjust(space_claim, total_size - offset)
+            progress = {
+                "downloaded": offset,
+                "start_time": time.time(),
+                "last_emit_time": 0.0,
+                # Sidecar kept up to date while the body comes in, when a later run could resume
+                "part": part if total_size and part.validator else None,
+                "checkpoint_at": time.time(),
+            }
+
+            try:
+                await self._transfer(session, response, media_url, part_path, total_size, download_id, progress)
+                downloader._record_transfer(
+                    str(response.url), progress["downloaded"] - offset, time.time() - progress["start_time"]
+                )
+                PartState.remove(part_path)
+                await self._in_disk_thread(
+                    downloader._finalize_download,
+                    part_path,
+                    final_path,
+                    media_url,
+                    total_size,
+                    user_id,
+                    post_id,
+                )
+                landed_path = final_path
+
+            except asyncio.CancelledError:
+                self._keep_part(part_path, progress)
+                downloader.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
+                raise
+
+            except Exception:
+                self._keep_part(part_path, progress)
+                if downloader.cancel_requested.is_set():
+                    downloader.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
+                    return
+
+                downloader.log(
+                    "FAILED_TO_DOWNLOAD_AFTER_ATTEMPTS",
+                    media_url=media_url,
+                    total=downloader.max_retries + 1,
+                )
+                with downloader.file_lock:
+                    downloader.failed_files.append(media_url)
+
+        finally:
+            downloader.disk_guard.release(space_claim)
+            del self.flights[media_url]
+            flight.set_result(landed_path)
+
+    async def _transfer(self, session, response, media_url, part_path, total_size, download_id, progress):
+        """
+        Streams the body into part_path from byte progress["downloaded"]
+        on, resuming with Range requests after short reads exactly like
+        the threaded engine.
+        """
+        downloader = self.downloader
+        stalled_url = await self._stream_body(response, part_path, total_size, download_id, progress)
+
+        resume_url = media_url
+        zero_progress_rounds = 0
+        while total_size and progress["downloaded"] < total_size:
+            if not await self._wait_while_paused():
+                raise Exception("CANCELLATION_REQUESTED")
+
+            switch_node = getattr(downloader, "_switch_stalled_node", None)
+            if stalled_url and switch_node is not None:
+                resume_url = await asyncio.to_thread(switch_node, stalled_url, total_size) or resume_url
+            stalled_url = None
+
+            resume_headers = downloader.headers.copy()
+            resume_headers["Range"] = f"bytes={progress['downloaded']}-"
+            downloader.log(
+                "RESUMING_DOWNLOAD_AT_BYTE",
+                downloaded_size=progress["downloaded"],
+                media_url=media_url,
+            )
+
+            part_response = await self._request(session, resume_url, headers=resume_headers)
+            if part_response is None:
+                raise Exception("RESUMPTION_FAILED_AFTER_RETRIES")
+
+            if part_response.status == 200:
+                # Server ignored the Range header and sent the full file again
+                progress["downloaded"] = 0
+
+            bytes_before_round = progress["downloaded"]
+            stalled_url = await self._stream_body(part_response, part_path, total_size, download_id, progress)
+
+            if progress["downloaded"] == bytes_before_round:
+                zero_progress_rounds += 1
+                if zero_progress_rounds >= 3:
+                    raise Exception("RESUME_NO_PROGRESS")
+            else:
+                zero_progress_rounds = 0
+
+        if total_size > 0 and progress["downloaded"] != total_size:
+            raise Exception(
+                downloader._translate_text(
+                    "FINAL_SIZE_MISMATCH",
+                    expected=total_size,
+                    actual=progress["downloaded"],
+                )
+            )
+
+        downloader._emit_progress_update(
+            downloaded_size=progress["downloaded"],
+            total_size=total_size,
+            download_id=download_id,
+            file_path=part_path,
+            start_time=progress["start_time"],
+            last_emit_time=progress["last_emit_time"],
+            force=True,
+        )
+
+    async def _stream_body(self, response, part_path, total_size, download_id, progress):
+        """
+        Writes response's body to part_path from byte progress["downloaded"]
+        on; returns its URL if it was dropped for stalling. Returns early
+        when the run is paused.
+        """
+        downloader = self.downloader
+        watchdog = getattr(downloader, "stall_watchdog", None)
+        watch = TransferWatch(response)
+        f = await self._in_disk_thread(self._open_at, part_path, progress["downloaded"])
+        try:
+            with downloader._transfer_slot(response):
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    if downloader.cancel_requested.is_set():
+                        raise asyncio.CancelledError()
+                    if not chunk:
+                        continue
+
+                    await self._in_disk_thread(f.write, chunk)
+                    if downloader.bandwidth_limiter.enabled:
+                        # consume() blocks, so it waits in a thread instead of on the loop
+                        await asyncio.to_thread(downloader._throttle, len(chunk))
+                    watch.add(len(chunk))
+                    progress["downloaded"] += len(chunk)
+                    if progress["part"] is not None and time.time() - progress["checkpoint_at"] >= CHECKPOINT_SECONDS:
+                        progress["checkpoint_at"] = time.time()
+                        await self._in_disk_thread(self._checkpoint_part, f, part_path, progress["part"], progress["downloaded"])
+                    progress["last_emit_time"] = downloader._emit_progress_update(
+                        downloaded_size=progress["downloaded"],
+                        total_size=total_size,
+                        download_id=download_id,
+                        file_path=part_path,
+                        start_time=progress["start_time"],
+                        last_emit_time=progress["last_emit_time"],
+                    )
+
+                    if watchdog is not None and watchdog.poll(watch):
+                        downloader._on_transfer_stalled(response, watch, str(response.url))
+                        return str(response.url)
+
+                    if downloader.pause_gate.paused:
+                        if total_size:
+                            # The caller continues from here with a Range request
+                            response.close()
+                            return None
+                        # Unknown size: no Range to resume with, hold the stream
+                        if not await self._wait_while_paused():
+                            raise asyncio.CancelledError()
+        except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            # Short read: the caller resumes from the bytes already on disk
+            pass
+        finally:
+            response.release()
+            await self._in_disk_thread(f.close)
+        return None
+
+    @staticmethod
+    def _open_at(path, offset):
+        # Positioned at offset with anything after it dropped (a part may run past its sidecar)
+        if not offset or not os.path.exists(path):
+            return open(path, "wb")
+        f = open(path, "r+b")
+        f.seek(offset)
+        f.truncate()
+        return f
+
+    def _checkpoint_part(self, f, part_path, part, written):
+        # Runs in a disk thread, after the writes it records
+        f.flush()
+        if self.downloader.disk_writer.fsync:
+            os.fsync(f.fileno())
+        part.record(part_path, written)
+
+    def _keep_part(self, part_path, progress):
+        # Same rule as the threaded engine: keep what a later run can resume
+        if progress["part"] is not None and progress["downloaded"] > 0 and os.path.exists(part_path):
+            progress["part"].record(part_path, progress["downloaded"])
+            return
+        self._discard_part(part_path)
+        PartState.remove(part_path)
+
+    def _discard_part(self, part_path):
+        if os.path.exists(part_path):
+            try:
+                os.remove(part_path)
+            except Exception:
+                pass
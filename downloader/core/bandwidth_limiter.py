@@ -0,0 +1,106 @@
+import heapq
+import itertools
+import threading
+import time
+
+from downloader.core.body_reader import MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, TARGET_READ_SECONDS
+
+# Bandwidth weights: under a cap, a transfer gets a share of the
+# bandwidth proportional to its weight
+PRIORITY_BACKGROUND = 1.0
+PRIORITY_NORMAL = 2.0
+PRIORITY_INTERACTIVE = 4.0
+
+
+class BandwidthLimiter:
+    """
+    Token bucket capping the bytes per second received by every transfer
+    that shares it. Readers call consume() after each chunk; it returns
+    once the bucket has covered the chunk, so the socket is simply read
+    less often and TCP slows the sender down.
+
+    While the bucket is empty, waiting transfers are served in order of
+    a virtual finish time (size / weight after the last grant), so over
+    time each one gets a share of the cap proportional to its weight.
+    set_rate() takes effect immediately for transfers already waiting;
+    a rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate=0, burst_seconds=0.5):
+        self.burst_seconds = burst_seconds
+        self.condition = threading.Condition()
+        self.rate = 0.0
+        self.tokens = 0.0
+        self.updated_at = time.monotonic()
+        self.virtual_time = 0.0
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.set_rate(rate)
+
+    def set_rate(self, bytes_per_second):
+        with self.condition:
+            self._refill(time.monotonic())
+            self.rate = max(float(bytes_per_second or 0), 0.0)
+            self.tokens = min(self.tokens, self._burst())
+            self.condition.notify_all()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def max_chunk_size(self):
+        """Largest read worth doing under the cap, so one chunk is not a long burst."""
+        rate = self.rate
+        if rate <= 0:
+            return MAX_CHUNK_SIZE
+        return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, int(rate * TARGET_READ_SECONDS)))
+
+    def _burst(self):
+        return max(self.rate * self.burst_seconds, MIN_CHUNK_SIZE)
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self._burst(), self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def consume(self, size, weight=PRIORITY_NORMAL, should_cancel=None):
+        """
+        Blocks until size bytes fit under the cap. Returns False when
+        should_cancel() turned true while waiting, True otherwise.
+        """
+        if size <= 0 or self.rate <= 0:
+            return True
+
+        with self.condition:
+            tag = self.virtual_time + size / max(weight, 1e-3)
+            waiter = (tag, next(self.sequence))
+            heapq.heappush(self.waiters, waiter)
+            try:
+                while True:
+                    if self.rate <= 0:
+                        return True
+
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self.waiters[0] is waiter and self.tokens >= 0:
+                        # May overdraw: a large chunk is paid back before the next grant
+                        self.tokens -= size
+                        self.virtual_time = max(self.virtual_time, tag)
+                        return True
+
+                    if callable(should_cancel) and should_cancel():
+                        return False
+
+                    # Short waits keep rate changes and cancellation responsive
+                    timeout = 0.25
+                    if self.waiters[0] is waiter:
+                        timeout = min(timeout, -self.tokens / self.rate)
+                    self.condition.wait(max(timeout, 0.001))
+            finally:
+                self.waiters.remove(waiter)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()
+
+
+# Shared by every downloader, so the cap holds for the whole application
+shared_limiter = BandwidthLimiter()
@@ -0,0 +1,182 @@
+import http.client
+import os
+import ssl
+import time
+
+import requests
+from urllib3.response import HTTPResponse
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+# A read returns once its chunk is full, so the chunk follows the link
+# speed: about a quarter second of data per read keeps the per-chunk
+# overhead low on fast links while a slow but healthy link still shows
+# steady progress to the UI and the stall watchdog
+TARGET_READ_SECONDS = 0.25
+
+
+def preallocate(f, size):
+    """
+    Reserves size bytes for the open file f up front, so a large .part file
+    is not extended (and fragmented) a chunk at a time. The file takes its
+    final length at once, so writers must seek instead of appending.
+    Returns True when the blocks were allocated, False when the file was
+    only extended (no posix_fallocate, or the filesystem refused it).
+    """
+    if size <= 0:
+        return False
+
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return True
+        except OSError:
+            pass
+
+    f.seek(0, os.SEEK_END)
+    if f.tell() < size:
+        f.truncate(size)
+    return False
+
+
+class BodyReader:
+    """
+    Reads a streamed response body into reusable buffers.
+
+    For requests responses whose body is not content-encoded, the socket
+    is read straight into the buffer through the http.client response
+    under urllib3's, which does the Content-Length and chunked framing
+    itself, so no bytes object is allocated or copied per chunk. The
+    chunk size adapts to this transfer's measured throughput, between
+    min_chunk_size and max_chunk_size. Other responses (compressed bodies,
+    other transports) fall back to iter_content, in chunks the length of
+    the buffer they are copied into.
+
+    With a buffer pool (acquire(size) / recycle(view)) every chunk gets a
+    buffer of its own from the pool and the consumer takes ownership of
+    it, e.g. to hand it to a disk writer; without one a single buffer is
+    reused and each chunk is only valid until the next is requested.
+    """
+
+    def __init__(self, response, min_chunk_size=MIN_CHUNK_SIZE, max_chunk_size=MAX_CHUNK_SIZE, buffers=None):
+        self.response = response
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max(max_chunk_size, min_chunk_size)
+        self.chunk_size = min_chunk_size
+        self.buffers = buffers
+        self.buffer = None
+        self.raw = self._direct_raw(response)
+        self.fp = self.raw._fp if self.raw is not None else None
+
+    @staticmethod
+    def _direct_raw(response):
+        raw = getattr(response, "raw", None)
+        if not isinstance(raw, HTTPResponse) or not isinstance(getattr(raw, "_fp", None), http.client.HTTPResponse):
+            return None
+
+        # requests leaves decoding to iter_content, so the socket holds compressed bytes
+        encoding = response.headers.get("content-encoding", "identity").strip().lower()
+        if encoding not in ("", "identity"):
+            return None
+
+        # Bytes urllib3 already read would be skipped by reading the socket
+        if raw.tell():
+            return None
+        return raw
+
+    @property
+    def direct(self):
+        return self.raw is not None
+
+    def chunks(self, limit=None):
+        """Yields the body as memoryviews; limit caps the bytes read."""
+        if self.raw is None:
+            yield from self._iter_content(limit)
+            return
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+            view = self._buffer(size)
+
+            started = time.perf_counter()
+            try:
+                received = self._readinto(view)
+            except BaseException:
+                self._recycle(view)
+                raise
+            if not received:
+                self._recycle(view)
+                return
+            self._adapt(received, time.perf_counter() - started)
+
+            if remaining is not None:
+                remaining -= received
+            yield view[:received]
+
+    def _buffer(self, size):
+        if self.buffers is not None:
+            return self.buffers.acquire(size)
+        if self.buffer is None or len(self.buffer) < size:
+            self.buffer = memoryview(bytearray(size))
+        return self.buffer[:size]
+
+    def _recycle(self, view):
+        if self.buffers is not None:
+            self.buffers.recycle(view)
+
+    def _iter_content(self, limit):
+        # The first buffer's full length sets the chunk size, so every
+        # chunk fills one buffer and hands the consumer the same kind of
+        # buffer as the direct path
+        view = self._buffer(self.chunk_size)
+        chunk_size = len(view.obj)
+        self._recycle(view)
+
+        remaining = limit
+        for chunk in self.response.iter_content(chunk_size=chunk_size):
+            if remaining is not None:
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+            # A decoded chunk can come out longer than asked for
+            for start in range(0, len(chunk), chunk_size):
+                piece = chunk[start:start + chunk_size]
+                view = self._buffer(len(piece))
+                view[:] = piece
+                yield view
+            if remaining is not None and remaining <= 0:
+                return
+
+    def _readinto(self, view):
+        # Same error mapping as requests' iter_content. http.client closes
+        # its side once the body is complete; the connection then goes
+        # back to urllib3's pool, as iter_content would leave it
+        fp = self.fp
+        try:
+            received = fp.readinto(view)
+        except TimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        except ssl.SSLError as e:
+            raise requests.exceptions.SSLError(e)
+        except (http.client.HTTPException, OSError) as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+
+        if self.raw.length_remaining is not None:
+            self.raw.length_remaining -= received
+        if not received and fp.length:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Connection closed with {fp.length} bytes of the body left"
+            )
+        if fp.isclosed():
+            self.raw.release_conn()
+        return received
+
+    def _adapt(self, received, seconds):
+        if received < self.chunk_size:
+            # Short read: end of body, or data that was already buffered
+            return
+        target = int(received / max(seconds, 1e-6) * TARGET_READ_SECONDS)
+        target = max(self.min_chunk_size, min(self.max_chunk_size, target))
+        # Grow gradually, shrink at once when the link slows down
+        self.chunk_size = min(target, self.chunk_size * 2) // self.min_chunk_size * self.min_chunk_size
@@ -0,0 +1,287 @@
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+
+class HostCircuitBreaker:
+    """
+    Per-host circuit breaker (closed, open, half-open).
+
+    A host that fails failure_threshold times within failure_window
+    seconds (429/5xx, timeouts, refused connections) is opened: nothing
+    is sent to it for open_seconds, doubled on every consecutive trip up
+    to max_open_seconds. Once that expires the breaker goes half-open and
+    lets exactly one probe request through; its success closes the
+    breaker, its failure opens it again for longer. A Retry-After from
+    the server opens the breaker for the time it asks for.
+
+    Open breakers are written to downloads.db, so a run started right
+    after a 429 storm still waits out the remaining time. Any storage
+    failure silently disables persistence.
+
+    on_change(domain, state, seconds) is called on every transition;
+    state "restored" means a breaker loaded from a previous run was hit.
+    More callbacks can be attached with add_listener; bound methods are
+    held weakly, so a finished downloader is not kept alive by them.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    COLUMNS = ["domain", "state", "open_until", "trips", "updated_at"]
+
+    def __init__(
+        self,
+        db_path="resources/config/downloads.db",
+        table="host_breakers",
+        failure_threshold=4,
+        failure_window=10.0,
+        open_seconds=8.0,
+        max_open_seconds=300.0,
+        probe_timeout=60.0,
+        max_age_seconds=24 * 3600,
+        on_change=None,
+    ):
+        self.db_path = db_path
+        self.table = table
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_timeout = probe_timeout
+        self.on_change = on_change
+        self.listeners = []
+
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cols = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")]
+                if cols and cols != self.COLUMNS:
+                    conn.execute(f"DROP TABLE {self.table}")
+
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    "domain TEXT PRIMARY KEY, state TEXT, open_until REAL, trips INTEGER, updated_at REAL)"
+                )
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE updated_at < ?",
+                    (time.time() - max_age_seconds,),
+                )
+                conn.commit()
+
+                for domain, _, open_until, trips, _ in conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM {self.table}"
+                ):
+                    # A half-open breaker saved mid-probe is reopened; its
+                    # probe goes out as soon as open_until has passed
+                    host = self._new_host()
+                    host.update(state=self.OPEN, open_until=open_until, trips=trips, announced=False)
+                    self.hosts[domain] = host
+            finally:
+                conn.close()
+            self.available = True
+        except Exception:
+            self.available = False
+
+    @staticmethod
+    def _new_host():
+        return {
+            "state": HostCircuitBreaker.CLOSED,
+            "failures": 0,
+            "last_failure": 0.0,
+            "open_until": 0.0,
+            "trips": 0,
+            "probe_until": 0.0,
+            "announced": True,
+        }
+
+    def _host(self, domain):
+        host = self.hosts.get(domain)
+        if host is None:
+            host = self._new_host()
+            self.hosts[domain] = host
+        return host
+
+    @staticmethod
+    def _ref(callback):
+        if hasattr(callback, "__self__"):
+            return weakref.WeakMethod(callback)
+        return lambda: callback
+
+    def add_listener(self, callback):
+        """Also calls callback(domain, state, seconds) on every transition."""
+        with self.lock:
+            self.listeners.append(self._ref(callback))
+
+    def remove_listener(self, callback):
+        with self.lock:
+            self.listeners = [ref for ref in self.listeners if ref() not in (None, callback)]
+
+    def _notify(self, domain, state, seconds=0.0):
+        with self.lock:
+            callbacks = [ref() for ref in self.listeners]
+        callbacks = [self.on_change] + callbacks
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(domain, state, seconds)
+            except Exception:
+                pass
+
+    def acquire(self, domain):
+        """
+        Returns 0 when a request to domain may be sent now (in half-open
+        state the caller becomes the single probe), otherwise the number
+        of seconds to wait before asking again.
+        """
+        now = time.time()
+        event = None
+        with self.lock:
+            host = self._host(domain)
+
+            if host["state"] == self.OPEN:
+                remaining = host["open_until"] - now
+                if remaining > 0:
+                    if not host["announced"]:
+                        host["announced"] = True
+                        event = ("restored", remaining)
+                    wait = remaining
+                else:
+                    host["state"] = self.HALF_OPEN
+                    host["probe_until"] = 0.0
+                    event = (self.HALF_OPEN, 0.0)
+
+            if host["state"] == self.HALF_OPEN:
+                if host["probe_until"] > now:
+                    wait = min(host["probe_until"] - now, 0.25)
+                else:
+                    # Also taken over when a probe never reported back
+                    host["probe_until"] = now + self.probe_timeout
+                    wait = 0.0
+            elif host["state"] == self.CLOSED:
+                wait = 0.0
+
+        if event:
+            self._notify(domain, *event)
+        return wait
+
+    def record_success(self, domain, reset=True):
+        """
+        Counts a request the host answered. reset=False is for answers
+        that prove the host is up without being a success (403, 404):
+        they close a half-open breaker but keep the failure count.
+        """
+        with self.lock:
+            host = self._host(domain)
+            if host["state"] == self.OPEN:
+                # Late answer to a request sent before the breaker opened
+                return
+            closing = host["state"] == self.HALF_OPEN
+            if not closing and not reset:
+                return
+            host.update(state=self.CLOSED, failures=0, last_failure=0.0, trips=0, probe_until=0.0)
+
+        if closing:
+            self._delete(domain)
+            self._notify(domain, self.CLOSED)
+
+    def record_failure(self, domain):
+        """Counts a failed request; returns True when this failure opened the breaker."""
+        now = time.time()
+        with self.lock:
+            host = self._host(domain)
+
+            if host["state"] == self.OPEN:
+                return False
+
+            if host["state"] == self.CLOSED:
+                if now - host["last_failure"] > self.failure_window:
+                    host["failures"] = 0
+                host["failures"] += 1
+                host["last_failure"] = now
+                if host["failures"] < self.failure_threshold:
+                    return False
+
+            seconds = self._open(host, now)
+            row = self._row(domain, host, now)
+
+        self._save(row)
+        self._notify(domain, self.OPEN, seconds)
+        return True
+
+    def hold(self, domain, seconds):
+        """Keeps domain closed off for `seconds`, as asked by a Retry-After header."""
+        now = time.time()
+        with self.lock:
+            host = self._host(domain)
+            if host["state"] == self.OPEN and host["open_until"] >= now + seconds - 1.0:
+                return
+            host.update(state=self.OPEN, open_until=now + seconds, probe_until=0.0, announced=True)
+            row = self._row(domain, host, now)
+
+        self._save(row)
+        self._notify(domain, self.OPEN, seconds)
+
+    def _open(self, host, now):
+        host["trips"] += 1
+        seconds = min(self.open_seconds * (2 ** (host["trips"] - 1)), self.max_open_seconds)
+        host.update(state=self.OPEN, open_until=now + seconds, failures=0, probe_until=0.0, announced=True)
+        return seconds
+
+    @staticmethod
+    def _row(domain, host, now):
+        return (domain, host["state"], host["open_until"], host["trips"], now)
+
+    def state(self, domain):
+        with self.lock:
+            host = self.hosts.get(domain)
+            return host["state"] if host else self.CLOSED
+
+    def _save(self, row):
+        self._execute(
+            f"INSERT OR REPLACE INTO {self.table} ({', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            row,
+        )
+
+    def _delete(self, domain):
+        self._execute(f"DELETE FROM {self.table} WHERE domain = ?", (domain,))
+
+    def _execute(self, sql, params):
+        if not self.available:
+            return
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute(sql, params)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            pass
+
+
+_shared_breakers = {}
+_shared_lock = threading.Lock()
+
+
+def shared_breaker(db_path="resources/config/downloads.db"):
+    """
+    The breaker every downloader writing to db_path goes through, loaded
+    from it on first use, so a host opened by one run is closed off for
+    the others too.
+    """
+    key = os.path.abspath(db_path)
+    with _shared_lock:
+        breaker = _shared_breakers.get(key)
+        if breaker is None:
+            breaker = HostCircuitBreaker(db_path)
+            _shared_breakers[key] = breaker
+        return breaker
@@ -0,0 +1,89 @@
+import os
+import shutil
+import threading
+from collections import defaultdict
+
+
+class DiskClaim:
+    """Bytes a running transfer still has to write to a volume."""
+
+    __slots__ = ("device", "size")
+
+    def __init__(self, device, size):
+        self.device = device
+        self.size = size
+
+
+class DiskSpaceGuard:
+    """
+    Admission control for new files. Before a transfer starts it claims
+    the bytes it is expected to write; the claim is refused while the
+    free space of the target volume, less what the transfers already
+    running there have claimed, would drop below the caller's reserve.
+    Running transfers are never stopped, so the disk fills up to about
+    the reserve and no further. Shared by every downloader, since they
+    write to the same disks.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.claimed = defaultdict(int)
+
+    @staticmethod
+    def _existing_folder(path):
+        folder = path if os.path.isdir(path) else os.path.dirname(path)
+        while folder and not os.path.isdir(folder):
+            parent = os.path.dirname(folder)
+            if parent == folder:
+                break
+            folder = parent
+        return folder or "."
+
+    def free_bytes(self, path):
+        """Free space on the volume holding path, or None if it cannot be read."""
+        try:
+            return shutil.disk_usage(self._existing_folder(path)).free
+        except OSError:
+            return None
+
+    def try_claim(self, path, size, reserve_bytes):
+        """
+        DiskClaim for size more bytes under path, or None if writing them
+        would leave less than reserve_bytes free. When the free space
+        cannot be read the claim is granted: the guard never blocks a
+        download it knows nothing about.
+        """
+        size = max(int(size or 0), 0)
+        folder = self._existing_folder(path)
+        try:
+            device = os.stat(folder).st_dev
+            free = shutil.disk_usage(folder).free
+        except OSError:
+            return DiskClaim(None, 0)
+
+        with self.lock:
+            if reserve_bytes > 0 and free - self.claimed.get(device, 0) - size < reserve_bytes:
+                return None
+            self.claimed[device] += size
+        return DiskClaim(device, size)
+
+    def adjust(self, claim, size):
+        """Changes a granted claim to size, once the transfer knows the real size of its file."""
+        if claim is None or claim.device is None:
+            return
+        size = max(int(size or 0), 0)
+        with self.lock:
+            self.claimed[claim.device] += size - claim.size
+            claim.size = size
+
+    def release(self, claim):
+        if claim is None or claim.device is None:
+            return
+        with self.lock:
+            self.claimed[claim.device] -= claim.size
+            if self.claimed[claim.device] <= 0:
+                del self.claimed[claim.device]
+            claim.size = 0
+
+
+shared_disk_guard = DiskSpaceGuard()
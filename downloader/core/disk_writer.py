@@ -0,0 +1,455 @@
+import os
+import queue
+import threading
+import time
+
+from downloader.core.body_reader import MIN_CHUNK_SIZE, preallocate
+
+
+class BufferPool:
+    """
+    Receive buffers shared by every transfer, plus the budget for data
+    queued to the disk writers. reserve() is called when a network thread
+    hands data over and blocks while max_bytes are already waiting to be
+    written, so that wait (accumulated in wait_seconds) is exactly the
+    network being held back by the disk. Written buffers come back
+    through release() and are reused.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.condition = threading.Condition()
+        self.in_use = 0
+        self.peak = 0
+        self.free = {}
+        self.free_bytes = 0
+        self.owned = {}
+        self.wait_seconds = 0.0
+
+    @staticmethod
+    def _size_class(size):
+        size_class = MIN_CHUNK_SIZE
+        while size_class < size:
+            size_class *= 2
+        return size_class
+
+    def acquire(self, size):
+        """Returns a writable memoryview of size bytes."""
+        size_class = self._size_class(size)
+        with self.condition:
+            buffers = self.free.get(size_class)
+            if buffers:
+                self.free_bytes -= size_class
+                return memoryview(buffers.pop())[:size]
+
+            buffer = bytearray(size_class)
+            self.owned[id(buffer)] = buffer
+        return memoryview(buffer)[:size]
+
+    def recycle(self, data):
+        """Takes back a buffer that was never handed to a writer."""
+        with self.condition:
+            self._keep(data)
+
+    def reserve(self, data, should_cancel=None, poll_interval=0.25):
+        """
+        Counts data as queued for writing, waiting while the queue is full.
+        Returns False, without counting it, if should_cancel() turned true
+        during the wait.
+        """
+        size = self._size(data)
+
+        def has_room():
+            # A single oversized chunk still goes through once the queue is empty
+            return not self.in_use or self.in_use + size <= self.max_bytes
+
+        with self.condition:
+            if not has_room():
+                started = time.perf_counter()
+                try:
+                    while not self.condition.wait_for(has_room, poll_interval):
+                        if callable(should_cancel) and should_cancel():
+                            return False
+                finally:
+                    self.wait_seconds += time.perf_counter() - started
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+        return True
+
+    def release(self, data):
+        """Called once data reserved with reserve() has been written (or dropped)."""
+        with self.condition:
+            self.in_use -= self._size(data)
+            self._keep(data)
+            self.condition.notify_all()
+
+    def _size(self, data):
+        buffer = getattr(data, "obj", None)
+        if buffer is not None and self.owned.get(id(buffer)) is buffer:
+            return len(buffer)
+        return len(data)
+
+    def _keep(self, data):
+        buffer = getattr(data, "obj", None)
+        if buffer is None or self.owned.get(id(buffer)) is not buffer:
+            return
+        if self.free_bytes + len(buffer) <= self.max_bytes:
+            self.free.setdefault(len(buffer), []).append(buffer)
+            self.free_bytes += len(buffer)
+        else:
+            del self.owned[id(buffer)]
+
+
+class DiskFile:
+    """
+    A .part file being written through a DiskWriterPool. write() queues
+    data at an offset and returns at once; an error the writer hit is
+    raised by the next write() or close(), or handed to the commit
+    callback. Safe to write from several threads (segmented downloads).
+    A write() waiting for buffer room gives up when should_cancel() turns
+    true.
+    """
+
+    def __init__(self, pool, ops, path, size, resume=False, should_cancel=None):
+        self.pool = pool
+        self.ops = ops
+        self.path = path
+        self.should_cancel = should_cancel
+        self.file = None
+        self.error = None
+        self.discarded = False
+        self.final_path = None
+        self.on_done = None
+
+        self.condition = threading.Condition()
+        self.outstanding = 0
+        self.inline_lock = threading.Lock()
+
+        self._submit(self._open, size, resume)
+
+    def _submit(self, fn, *args):
+        if self.ops is None:
+            with self.inline_lock:
+                self._run(fn, args)
+            return
+
+        with self.condition:
+            self.outstanding += 1
+        self.ops.put((self, fn, args))
+
+    def _run(self, fn, args):
+        """Runs one queued operation; called by the file's writer (or inline)."""
+        try:
+            fn(*args)
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        finally:
+            if self.ops is not None:
+                with self.condition:
+                    self.outstanding -= 1
+                    self.condition.notify_all()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _wait(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.outstanding == 0)
+
+    def _open(self, size, resume):
+        started = time.perf_counter()
+        self.file = open(self.path, "r+b" if resume and os.path.exists(self.path) else "wb")
+        preallocate(self.file, size)
+        self.pool.add_busy(time.perf_counter() - started)
+
+    def _write(self, data, offset):
+        try:
+            if self.error is None and not self.discarded:
+                started = time.perf_counter()
+                self.file.seek(offset)
+                self.file.write(data)
+                self.pool.add_written(len(data), time.perf_counter() - started)
+        finally:
+            self.pool.buffers.release(data)
+
+    def write(self, data, offset):
+        """Queues data (ideally a view from pool.buffers) to be written at offset."""
+        if self.error is not None:
+            self.pool.buffers.recycle(data)
+            self._raise_error()
+        if not self.pool.buffers.reserve(data, self.should_cancel):
+            self.pool.buffers.recycle(data)
+            raise Exception("CANCELLATION_REQUESTED")
+        self._submit(self._write, data, offset)
+        if self.ops is None:
+            self._raise_error()
+
+    def after_writes(self, fn, *args):
+        """
+        Queues fn(*args) behind the writes queued so far; it runs once
+        they are in the file (flushed, and synced when the pool syncs).
+        Errors of fn are ignored rather than failing the download.
+        """
+        self._submit(self._after_writes, fn, args)
+
+    def _after_writes(self, fn, args):
+        if self.error is not None or self.discarded or self.file is None or self.file.closed:
+            return
+        self.file.flush()
+        if self.pool.fsync:
+            os.fsync(self.file.fileno())
+        try:
+            fn(*args)
+        except Exception:
+            pass
+
+    def close(self):
+        """Waits for the queued writes and closes the file; raises a write error."""
+        self._wait()
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+        self._raise_error()
+
+    def commit(self, final_path, on_done):
+        """
+        Syncs the file and renames it to final_path once its writes are
+        done, batched with other files of the same writer. on_done(error)
+        runs afterwards, on the writer thread; error is None on success.
+        """
+        self.final_path = final_path
+        self.on_done = on_done
+        if self.ops is None:
+            self.pool.commit_batch([self])
+        else:
+            self.ops.put((self, None, ()))
+
+    def discard(self):
+        """Drops the queued writes and deletes the file."""
+        self.discarded = True
+        self._wait()
+        if self.file is not None and not self.file.closed:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+        if os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class DiskWriterPool:
+    """
+    Disk-writing stage between the network threads and the file system,
+    so a slow NAS or USB drive does not stall socket reads.
+
+    Network threads read into buffers from the shared BufferPool and hand
+    them to DiskFile.write(); `writers` threads do the writes and, once a
+    file is complete, its fsync and rename. Files finished close together
+    are synced and renamed as one batch, with a single directory sync.
+    Every file belongs to one writer, so its writes stay in order, and
+    the buffer budget bounds the memory held by queued writes.
+    writers=0 does everything inline in the calling thread.
+    """
+
+    def __init__(self, writers=2, max_buffered_bytes=64 * 1024 * 1024, fsync=True, commit_batch=16, commit_delay=0.5):
+        self.writers = writers
+        self.fsync = fsync
+        self.commit_batch_size = commit_batch
+        self.commit_delay = commit_delay
+        self.buffers = BufferPool(max_buffered_bytes)
+
+        self.lock = threading.Lock()
+        self.queues = []
+        self.threads = []
+        self.next_writer = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.started_at = time.time()
+            self.bytes_written = 0
+            self.write_seconds = 0.0
+            self.busy_seconds = 0.0
+            self.files_committed = 0
+        with self.buffers.condition:
+            self.buffers.wait_seconds = 0.0
+            self.buffers.peak = self.buffers.in_use
+
+    def add_written(self, size, seconds):
+        with self.lock:
+            self.bytes_written += size
+            self.write_seconds += seconds
+            self.busy_seconds += seconds
+
+    def add_busy(self, seconds):
+        with self.lock:
+            self.busy_seconds += seconds
+
+    def open(self, path, size=0, resume=False, should_cancel=None):
+        """
+        Creates (truncating) path, preallocated to size bytes, on one of
+        the writers. resume=True keeps what an existing path holds, for
+        a transfer that continues a partial file. should_cancel lets a
+        write blocked on a full buffer queue give up.
+        """
+        return DiskFile(self, self._writer_queue(), path, size, resume, should_cancel)
+
+    def _writer_queue(self):
+        if self.writers <= 0:
+            return None
+        with self.lock:
+            if not self.threads:
+                for index in range(self.writers):
+                    ops = queue.Queue()
+                    thread = threading.Thread(target=self._writer_loop, args=(ops,), daemon=True)
+                    self.queues.append(ops)
+                    self.threads.append(thread)
+                    thread.start()
+            ops = self.queues[self.next_writer % len(self.queues)]
+            self.next_writer += 1
+            return ops
+
+    def _writer_loop(self, ops):
+        pending = []
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, pending[0][0] + self.commit_delay - time.time())
+            try:
+                item = ops.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                self.commit_batch([disk_file for _, disk_file in pending])
+                return
+            if item is not False:
+                disk_file, fn, args = item
+                if disk_file is None:
+                    # drain() barrier
+                    self.commit_batch([disk_file for _, disk_file in pending])
+                    pending = []
+                    args[0].set()
+                    continue
+                if fn is None:
+                    pending.append((time.time(), disk_file))
+                else:
+                    disk_file._run(fn, args)
+
+            if pending and (
+                item is False
+                or ops.empty()
+                or len(pending) >= self.commit_batch_size
+                or time.time() - pending[0][0] >= self.commit_delay
+            ):
+                self.commit_batch([disk_file for _, disk_file in pending])
+                pending = []
+
+    def commit_batch(self, disk_files):
+        if not disk_files:
+            return
+        started = time.perf_counter()
+
+        for disk_file in disk_files:
+            if disk_file.file is None or disk_file.file.closed:
+                continue
+            try:
+                disk_file.file.flush()
+                if self.fsync and disk_file.error is None:
+                    os.fsync(disk_file.file.fileno())
+            except OSError as e:
+                disk_file.error = disk_file.error or e
+            finally:
+                try:
+                    disk_file.file.close()
+                except OSError as e:
+                    disk_file.error = disk_file.error or e
+
+        directories = set()
+        for disk_file in disk_files:
+            if disk_file.error is None and not disk_file.discarded:
+                try:
+                    os.replace(disk_file.path, disk_file.final_path)
+                    directories.add(os.path.dirname(os.path.abspath(disk_file.final_path)))
+                except OSError as e:
+                    disk_file.error = e
+        if self.fsync:
+            for directory in directories:
+                self._sync_directory(directory)
+
+        with self.lock:
+            self.busy_seconds += time.perf_counter() - started
+            self.files_committed += len(disk_files)
+
+        for disk_file in disk_files:
+            if disk_file.on_done is not None:
+                try:
+                    disk_file.on_done(disk_file.error)
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _sync_directory(directory):
+        # Makes the renames durable on POSIX; directories cannot be opened on Windows
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def drain(self):
+        """Waits until every queued write and commit so far has been carried out."""
+        with self.lock:
+            queues = list(self.queues)
+        events = []
+        for ops in queues:
+            event = threading.Event()
+            ops.put((None, None, (event,)))
+            events.append(event)
+        for event in events:
+            event.wait()
+
+    def close(self):
+        with self.lock:
+            queues, threads = self.queues, self.threads
+            self.queues, self.threads = [], []
+        for ops in queues:
+            ops.put(None)
+        for thread in threads:
+            thread.join()
+
+    def stats(self):
+        """
+        Where the run's time went. network_wait_seconds is how long
+        network threads were held back because the writers were behind;
+        writer_busy is the share of the writers' time spent on disk I/O.
+        """
+        with self.lock:
+            elapsed = max(time.time() - self.started_at, 1e-6)
+            written = self.bytes_written
+            write_seconds = self.write_seconds
+            busy = self.busy_seconds / (elapsed * max(self.writers, 1))
+            files = self.files_committed
+        with self.buffers.condition:
+            wait = self.buffers.wait_seconds
+            peak = self.buffers.peak
+
+        return {
+            "bytes_written": written,
+            "disk_bytes_per_second": written / write_seconds if write_seconds else 0.0,
+            "writer_busy": min(busy, 1.0),
+            "network_wait_seconds": wait,
+            "peak_buffered_bytes": peak,
+            "files_committed": files,
+            "elapsed_seconds": elapsed,
+            "bottleneck": "disk" if wait >= 0.1 * elapsed or busy >= 0.8 else "network",
+        }
@@ -0,0 +1,293 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class AdaptiveLimit:
+    """
+    Semaphore whose size can change while it is in use. Used as
+    `with limiter[domain]:` exactly like the plain Semaphore it replaces.
+    asyncio tasks take a slot with `await acquire_async()`: they queue in
+    arrival order and the release that frees a slot wakes the next one
+    on its event loop, so nothing polls.
+
+    Response bodies being read count against the limit too (transfer()),
+    so a request waits while the host already has `limit` requests and
+    transfers going.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.transfers = 0
+        self.condition = threading.Condition()
+        # (loop, future) of asyncio tasks waiting for a slot, oldest first
+        self.async_waiters = deque()
+
+        # Per-interval measurements, guarded by condition
+        self.interval_start = time.time()
+        self.interval_bytes = 0
+        self.interval_errors = 0
+        self.interval_peak = 0
+        self.last_throughput = None
+        self.last_step = 0
+        self.total_bytes = 0
+        self.total_seconds = 0.0
+
+    def acquire(self, blocking=True, timeout=None):
+        with self.condition:
+            if not blocking:
+                if not self._has_room():
+                    return False
+            elif not self.condition.wait_for(self._has_room, timeout):
+                return False
+
+            self._take()
+            return True
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            if not self.async_waiters and self._has_room():
+                self._take()
+                return
+            waiter = loop.create_future()
+            self.async_waiters.append((loop, waiter))
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self.condition:
+                try:
+                    self.async_waiters.remove((loop, waiter))
+                    queued = True
+                except ValueError:
+                    queued = False
+            # Granted just before the cancel landed: hand the slot back
+            if not queued and waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def _has_room(self):
+        # Called with the condition held
+        return self.active + self.transfers < int(self.limit)
+
+    def _take(self):
+        # Called with the condition held
+        self.active += 1
+        self.interval_peak = max(self.interval_peak, self.active + self.transfers)
+
+    def _hand_over(self):
+        # Called with the condition held: free slots go to queued tasks first
+        while self.async_waiters and self._has_room():
+            loop, waiter = self.async_waiters.popleft()
+            self._take()
+            try:
+                loop.call_soon_threadsafe(self._grant, waiter)
+            except RuntimeError:
+                # Its loop is gone; the slot is free again
+                self.active -= 1
+
+    def _grant(self, waiter):
+        # Runs on the waiter's loop; a task cancelled meanwhile gives the slot back
+        if waiter.done():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self._hand_over()
+            self.condition.notify()
+
+    def transfer(self):
+        return Transfer(self)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class Transfer:
+    """
+    A response body being read, counted against its host's AdaptiveLimit
+    from creation until end() or the end of a `with` block. Never waits:
+    the body's request already got through, and started while that
+    request still holds its slot the body takes the slot over with no
+    gap for another request to slip into.
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.ended = False
+        with slot.condition:
+            slot.transfers += 1
+            slot.interval_peak = max(slot.interval_peak, slot.active + slot.transfers)
+
+    def end(self):
+        slot = self.slot
+        with slot.condition:
+            if self.ended:
+                return
+            self.ended = True
+            slot.transfers -= 1
+            slot._hand_over()
+            slot.condition.notify()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end()
+        return False
+
+
+class AdaptiveHostLimiter:
+    """
+    Per-host concurrency controller (additive increase, multiplicative
+    decrease). Every adjust_interval seconds a host that kept all its
+    slots busy (requests waiting for headers plus bodies being read, see
+    transfer()) without errors gets one more slot, as long as throughput
+    did not fall compared with the previous interval; if the last raise
+    made throughput drop, the slot is taken back. A 429/5xx burst halves
+    the limit at once. Throughput is measured from completed transfers
+    reported through record_transfer().
+
+    on_change(domain, limit, throughput, reason) is called whenever a
+    host's limit moves.
+    """
+
+    def __init__(self, initial_limit, min_limit=1, max_limit=16, adjust_interval=5.0, on_change=None):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, initial_limit)
+        self.adjust_interval = adjust_interval
+        self.on_change = on_change
+
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def __getitem__(self, domain):
+        with self.lock:
+            slot = self.hosts.get(domain)
+            if slot is None:
+                slot = AdaptiveLimit(self.initial_limit)
+                self.hosts[domain] = slot
+            return slot
+
+    def transfer(self, domain):
+        """Starts counting a body from domain against its limit; see Transfer."""
+        return self[domain].transfer()
+
+    def set_bounds(self, initial_limit, max_limit):
+        """
+        Changes the starting and maximum limit, e.g. when slots stop being
+        connections and become HTTP/2 streams. Hosts already seen start
+        over from the new initial limit.
+        """
+        with self.lock:
+            if (initial_limit, max(max_limit, initial_limit)) == (self.initial_limit, self.max_limit):
+                return
+            self.initial_limit = initial_limit
+            self.max_limit = max(max_limit, initial_limit)
+            slots = list(self.hosts.values())
+
+        for slot in slots:
+            with slot.condition:
+                self._set_limit(slot, initial_limit)
+                slot.last_step = 0
+
+    def _notify(self, domain, limit, throughput, reason):
+        if self.on_change:
+            try:
+                self.on_change(domain, limit, throughput, reason)
+            except Exception:
+                pass
+
+    def _set_limit(self, slot, limit):
+        slot.limit = max(self.min_limit, min(self.max_limit, limit))
+        slot._hand_over()
+        slot.condition.notify_all()
+        return slot.limit
+
+    def record_transfer(self, domain, size):
+        slot = self[domain]
+        change = None
+        with slot.condition:
+            slot.interval_bytes += size
+            change = self._maybe_adjust(slot)
+        if change:
+            self._notify(domain, *change)
+
+    def record_error(self, domain):
+        slot = self[domain]
+        with slot.condition:
+            slot.interval_errors += 1
+
+    def decrease(self, domain):
+        """Called on a 429/5xx burst: halves the host's limit."""
+        slot = self[domain]
+        with slot.condition:
+            old_limit = slot.limit
+            new_limit = self._set_limit(slot, old_limit // 2)
+            slot.interval_errors += 1
+            slot.last_step = 0
+        if new_limit != old_limit:
+            self._notify(domain, new_limit, slot.last_throughput or 0.0, "error burst")
+
+    def _maybe_adjust(self, slot):
+        now = time.time()
+        elapsed = now - slot.interval_start
+        if elapsed < self.adjust_interval:
+            return None
+
+        throughput = slot.interval_bytes / elapsed
+        previous = slot.last_throughput
+        saturated = slot.interval_peak >= slot.limit
+        change = None
+
+        slot.total_bytes += slot.interval_bytes
+        slot.total_seconds += elapsed
+
+        if slot.interval_errors == 0 and slot.interval_bytes > 0:
+            if previous is not None and slot.last_step > 0 and throughput < previous * 0.8:
+                old_limit = slot.limit
+                if self._set_limit(slot, old_limit - 1) != old_limit:
+                    change = (slot.limit, throughput, "throughput dropped")
+                slot.last_step = -1
+            elif saturated and (previous is None or throughput >= previous * 0.95):
+                old_limit = slot.limit
+                if self._set_limit(slot, old_limit + 1) != old_limit:
+                    change = (slot.limit, throughput, "throughput rising")
+                    slot.last_step = 1
+            else:
+                slot.last_step = 0
+
+        if slot.interval_bytes > 0:
+            slot.last_throughput = throughput
+        slot.interval_start = now
+        slot.interval_bytes = 0
+        slot.interval_errors = 0
+        slot.interval_peak = slot.active + slot.transfers
+        return change
+
+    def snapshot(self):
+        """Returns [(domain, limit, average_bytes_per_second)] for hosts that moved data."""
+        with self.lock:
+            hosts = list(self.hosts.items())
+
+        result = []
+        for domain, slot in hosts:
+            with slot.condition:
+                size = slot.total_bytes + slot.interval_bytes
+                seconds = slot.total_seconds + (time.time() - slot.interval_start)
+                limit = slot.limit
+            if size > 0:
+                result.append((domain, limit, size / max(seconds, 1e-9)))
+        return result
@@ -0,0 +1,515 @@
+import re
+import socket
+import ssl
+import threading
+import weakref
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    import httpcore
+    import httpx
+except ImportError:  # optional: only the http2 backend needs them
+    httpx = None
+
+
+NODE_RE = re.compile(r"^n\d+\.", re.IGNORECASE)
+
+# Distinct hosts whose pools stay open: n1..n10 of two sites, the API
+# hosts and a few CDNs. requests keeps only 10 by default.
+DEFAULT_POOL_HOSTS = 64
+
+
+def tls_session_scope(hostname):
+    """Hosts sharing TLS sessions: every nN. data node maps to its site."""
+    return NODE_RE.sub("", (hostname or "").lower())
+
+
+def keepalive_socket_options():
+    """TCP keep-alive probes, so idle pooled connections are not silently dropped by NATs."""
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 15), ("TCP_KEEPCNT", 4)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    Client TLS context that resumes sessions across hosts of the same
+    site: a connection to n7.coomer.st offers the session last used with
+    any other coomer.st node, saving a full handshake when the servers
+    share ticket keys. Servers that refuse simply do a full handshake.
+    """
+
+    def __new__(cls, protocol=ssl.PROTOCOL_TLS_CLIENT, *args, **kwargs):
+        return super().__new__(cls, protocol, *args, **kwargs)
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        self.minimum_version = ssl.TLSVersion.TLSv1_2
+        self.options |= ssl.OP_NO_COMPRESSION
+        self.load_default_certs()
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+
+    def _session_for(self, scope):
+        with self.sessions_lock:
+            sock_ref, session = self.sessions.get(scope, (None, None))
+
+        # TLS 1.3 tickets arrive after the handshake, so prefer asking the
+        # last socket again over the session saved when it connected
+        sock = sock_ref() if sock_ref is not None else None
+        if sock is not None:
+            try:
+                live = sock.session
+            except (OSError, ValueError):
+                live = None
+            if live is not None and live.has_ticket:
+                session = live
+        return session
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        scope = tls_session_scope(server_hostname)
+        if session is None and scope:
+            session = self._session_for(scope)
+
+        try:
+            tls_sock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        except ValueError:
+            # Session unusable for this socket; connect without it
+            tls_sock = super().wrap_socket(sock, *args, server_hostname=server_hostname, **kwargs)
+
+        if scope:
+            with self.sessions_lock:
+                self.sessions[scope] = (weakref.ref(tls_sock), tls_sock.session)
+        return tls_sock
+
+
+def _shutdown_socket(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class ConnectionRegistry:
+    """
+    Every connection a backend opened, so a cancel can reach requests
+    blocked in other threads. Shutting a socket down makes a read that
+    waits for headers or body bytes fail at once instead of running into
+    its read timeout; urllib3 then drops the connection from its pool.
+    While cancelled, connections are shut down as soon as they connect.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = weakref.WeakSet()
+        self.cancelled = False
+
+    def add(self, connection):
+        with self.lock:
+            self.connections.add(connection)
+            cancelled = self.cancelled
+        if cancelled:
+            _shutdown_socket(connection.sock)
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            connections = list(self.connections)
+        for connection in connections:
+            sock = getattr(connection, "sock", None)
+            if sock is not None:
+                _shutdown_socket(sock)
+
+    def resume(self):
+        with self.lock:
+            self.cancelled = False
+
+
+class _RegisteredConnection:
+    registry = None
+
+    def connect(self):
+        super().connect()
+        self.registry.add(self)
+
+
+def _registered_pool_classes(registry):
+    """urllib3 pool classes whose connections add themselves to registry once connected."""
+    attrs = {"registry": registry}
+    http_connection = type("RegisteredHTTPConnection", (_RegisteredConnection, HTTPConnection), attrs)
+    https_connection = type("RegisteredHTTPSConnection", (_RegisteredConnection, HTTPSConnection), attrs)
+    return {
+        "http": type("RegisteredHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": http_connection}),
+        "https": type("RegisteredHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": https_connection}),
+    }
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose pools use the shared TLS context and keep-alive
+    socket options, and report their connections to a ConnectionRegistry.
+    """
+
+    def __init__(self, ssl_context=None, socket_options=None, registry=None, **kwargs):
+        self.ssl_context = ssl_context
+        self.socket_options = socket_options
+        self.registry = registry
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.ssl_context is not None:
+            pool_kwargs.setdefault("ssl_context", self.ssl_context)
+        if self.socket_options is not None:
+            pool_kwargs.setdefault("socket_options", self.socket_options)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        if self.registry is not None:
+            self.poolmanager.pool_classes_by_scheme = _registered_pool_classes(self.registry)
+
+
+class RequestsBackend:
+    """Default backend: a requests.Session with pools sized to the downloader."""
+
+    name = "requests"
+    available = True
+    multiplexed = False
+
+    def __init__(self, pool_size=10, pool_hosts=DEFAULT_POOL_HOSTS):
+        self.session = requests.Session()
+        self.ssl_context = ResumingSSLContext()
+        self.socket_options = keepalive_socket_options()
+        self.registry = ConnectionRegistry()
+        self.pool_hosts = pool_hosts
+        self.pool_size = None
+        self.resize(pool_size)
+
+    def resize(self, pool_size):
+        pool_size = max(int(pool_size), 1)
+        if pool_size == self.pool_size:
+            return
+        self.pool_size = pool_size
+
+        for prefix in ("https://", "http://"):
+            old_adapter = self.session.adapters.get(prefix)
+            self.session.mount(
+                prefix,
+                PooledHTTPAdapter(
+                    ssl_context=self.ssl_context,
+                    socket_options=self.socket_options,
+                    registry=self.registry,
+                    pool_connections=self.pool_hosts,
+                    pool_maxsize=pool_size,
+                ),
+            )
+            if old_adapter is not None:
+                # Connections still in use are closed when they are released
+                old_adapter.close()
+
+    def get(self, url, **kwargs):
+        if self.registry.cancelled:
+            raise requests.exceptions.ConnectionError("Request cancelled")
+        return self.session.get(url, **kwargs)
+
+    def cancel(self):
+        self.registry.cancel()
+
+    def resume(self):
+        self.registry.resume()
+
+    def close(self):
+        self.session.close()
+
+
+@contextmanager
+def _requests_errors():
+    """Re-raises httpx errors as the requests exceptions the downloaders catch."""
+    try:
+        yield
+    except httpx.ConnectTimeout as e:
+        raise requests.exceptions.ConnectTimeout(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.ReadTimeout(str(e)) from e
+    except httpx.TooManyRedirects as e:
+        raise requests.exceptions.TooManyRedirects(str(e)) from e
+    except (httpx.InvalidURL, httpx.UnsupportedProtocol) as e:
+        raise requests.exceptions.InvalidURL(str(e)) from e
+    except httpx.HTTPError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+
+class _RegisteredStream:
+    """An httpcore network stream that reports itself to a ConnectionRegistry, TLS upgrade included."""
+
+    def __init__(self, stream, registry):
+        self.stream = stream
+        self.registry = registry
+        registry.add(self)
+
+    @property
+    def sock(self):
+        return self.stream.get_extra_info("socket")
+
+    def read(self, max_bytes, timeout=None):
+        return self.stream.read(max_bytes, timeout)
+
+    def write(self, buffer, timeout=None):
+        self.stream.write(buffer, timeout)
+
+    def close(self):
+        self.stream.close()
+
+    def start_tls(self, ssl_context, server_hostname=None, timeout=None):
+        return _RegisteredStream(self.stream.start_tls(ssl_context, server_hostname, timeout), self.registry)
+
+    def get_extra_info(self, info):
+        return self.stream.get_extra_info(info)
+
+
+if httpx is not None:
+
+    class _RegisteredBackend(httpcore.SyncBackend):
+        """httpcore's socket backend, with every connection added to a ConnectionRegistry."""
+
+        def __init__(self, registry):
+            self.registry = registry
+
+        def connect_tcp(self, *args, **kwargs):
+            return _RegisteredStream(super().connect_tcp(*args, **kwargs), self.registry)
+
+
+def _httpx_timeout(timeout):
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class HttpxResponse:
+    """
+    An httpx response exposing the part of requests.Response the
+    downloaders and site adapters use.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.reason = response.reason_phrase
+        self.http_version = response.http_version
+        self.aborted = False
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        with _requests_errors():
+            return self.response.read()
+
+    @property
+    def text(self):
+        self.content
+        return self.response.text
+
+    def json(self, **kwargs):
+        self.content
+        return self.response.json(**kwargs)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        with _requests_errors():
+            for chunk in self.response.iter_bytes(chunk_size):
+                if self.aborted:
+                    raise requests.exceptions.ConnectionError("Transfer aborted")
+                yield chunk
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error: {self.reason} for url: {self.url}",
+                response=self,
+            )
+
+    def abort(self):
+        # The stream may share its connection with other transfers, so it
+        # is not torn down from another thread: the reader stops at its
+        # next chunk, or at the read timeout if none arrives
+        self.aborted = True
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class HttpxBackend:
+    """
+    HTTP/2 backend: every host gets one TLS connection and concurrent
+    requests to it travel as multiplexed streams over that connection,
+    instead of each taking a connection of its own. Hosts that do not
+    negotiate HTTP/2 are served over HTTP/1.1. Requires httpx and h2.
+    """
+
+    name = "http2"
+    available = httpx is not None
+    multiplexed = True
+
+    def __init__(self, pool_size=10, pool_hosts=DEFAULT_POOL_HOSTS):
+        self.pool_size = pool_size
+        self.pool_hosts = pool_hosts
+        self.ssl_context = ResumingSSLContext()
+        self.registry = ConnectionRegistry()
+        self.client = self._new_client()
+        self.responses = weakref.WeakSet()
+        self.cancelled = False
+
+    def _new_client(self):
+        transport = httpx.HTTPTransport(
+            http2=True,
+            verify=self.ssl_context,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.pool_hosts),
+            socket_options=keepalive_socket_options(),
+        )
+        # httpx takes no network backend of its own; its httpcore pool does
+        transport._pool._network_backend = _RegisteredBackend(self.registry)
+        return httpx.Client(transport=transport, timeout=None)
+
+    def resize(self, pool_size):
+        # Connections are not capped per host: one carries all the streams,
+        # and the downloader's per-host slots bound how many are open
+        self.pool_size = pool_size
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None, allow_redirects=True):
+        if self.cancelled:
+            raise requests.exceptions.ConnectionError("Request cancelled")
+        with _requests_errors():
+            request = self.client.build_request(
+                "GET", url, headers=headers, params=params, timeout=_httpx_timeout(timeout)
+            )
+            response = HttpxResponse(self.client.send(request, stream=True, follow_redirects=allow_redirects))
+        self.responses.add(response)
+        if self.cancelled:
+            response.abort()
+        if not stream:
+            response.content
+        return response
+
+    def cancel(self):
+        # Everything this client carries is being cancelled, so its
+        # connections are shut down, which also fails requests still
+        # waiting for their headers. Later requests get a fresh client
+        # rather than the broken connections left in the old one's pool
+        self.cancelled = True
+        for response in list(self.responses):
+            response.abort()
+        self.registry.cancel()
+        old_client, self.client = self.client, self._new_client()
+        old_client.close()
+
+    def resume(self):
+        self.cancelled = False
+        self.registry.resume()
+
+    def close(self):
+        self.client.close()
+
+
+BACKENDS = {}
+
+
+def register_backend(name, factory):
+    """
+    Makes a backend selectable by name. factory(pool_size=...) must return
+    an object with get(url, **requests_kwargs), resize(pool_size),
+    cancel(), resume() and close(); get() returns requests.Response-
+    compatible objects and raises requests.exceptions errors, which is
+    all the downloaders rely on. cancel() makes requests in flight fail
+    as soon as possible and new ones fail at once, until resume().
+    A falsy factory.available hides the backend (missing dependency).
+    """
+    BACKENDS[name] = factory
+
+
+def available_backends():
+    return [name for name, factory in BACKENDS.items() if getattr(factory, "available", True)]
+
+
+register_backend(RequestsBackend.name, RequestsBackend)
+register_backend(HttpxBackend.name, HttpxBackend)
+
+
+class HttpTransport:
+    """
+    What downloaders and site adapters send requests through, in place of
+    a bare requests.Session. The backend can be swapped by name and the
+    per-host pool resized as worker counts change; callers only ever use
+    get(), exactly as they did with the session.
+    """
+
+    def __init__(self, backend=RequestsBackend.name, pool_size=10):
+        self.pool_size = pool_size
+        self.backend = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.use_backend(backend)
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    @property
+    def multiplexed(self):
+        """True when concurrent requests to a host share one connection (HTTP/2)."""
+        return self.backend.multiplexed
+
+    def use_backend(self, name):
+        """Switches to backend `name`, falling back to requests; returns the name in use."""
+        factory = BACKENDS.get(name)
+        if factory is None or not getattr(factory, "available", True):
+            factory = BACKENDS[RequestsBackend.name]
+
+        with self.lock:
+            if self.backend is not None and self.backend.name == factory.name:
+                return self.backend.name
+            old_backend, self.backend = self.backend, factory(pool_size=self.pool_size)
+            if self.cancelled:
+                self.backend.cancel()
+
+        if old_backend is not None:
+            old_backend.close()
+        return self.backend.name
+
+    def resize(self, pool_size):
+        with self.lock:
+            self.pool_size = pool_size
+            self.backend.resize(pool_size)
+
+    def get(self, url, **kwargs):
+        return self.backend.get(url, **kwargs)
+
+    def cancel(self):
+        """Fails every request in flight and refuses new ones until resume()."""
+        with self.lock:
+            self.cancelled = True
+            self.backend.cancel()
+
+    def resume(self):
+        with self.lock:
+            self.cancelled = False
+            self.backend.resume()
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobJournal:
+    """
+    Persisted copy of the job list of every download, so work that took
+    minutes of API paging or page scraping to resolve survives a crash
+    or a cancel. A source (the URL being downloaded and its download
+    folder) keeps its latest run: one row per job with its keyword
+    arguments, including the pinned target folder and file name, and
+    its state (pending, done or failed). Jobs are stored before the
+    first one starts and read back lazily a page at a time, so a 30k
+    file run is not held in memory.
+
+    Runs not started for max_age_seconds are dropped. If the database
+    cannot be used the journal lives in memory, for the session only.
+    """
+
+    def __init__(
+        self,
+        db_path="resources/config/downloads.db",
+        runs_table="journal_runs",
+        jobs_table="journal_jobs",
+        page_size=500,
+        max_age_seconds=30 * 24 * 3600,
+    ):
+        self.db_path = db_path
+        self.runs_table = runs_table
+        self.jobs_table = jobs_table
+        self.page_size = page_size
+        self.lock = threading.Lock()
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._create_tables(max_age_seconds)
+            self.available = True
+        except Exception:
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._create_tables(max_age_seconds)
+            self.available = False
+
+    def _create_tables(self, max_age_seconds):
+        with self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.runs_table} ("
+                "source TEXT PRIMARY KEY, started_at REAL, finished_at REAL)"
+            )
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.jobs_table} ("
+                "source TEXT, seq INTEGER, media_url TEXT, job TEXT, state TEXT, "
+                "PRIMARY KEY (source, seq))"
+            )
+            cutoff = time.time() - max_age_seconds
+            self.conn.execute(
+                f"DELETE FROM {self.jobs_table} WHERE source IN "
+                f"(SELECT source FROM {self.runs_table} WHERE started_at < ?)",
+                (cutoff,),
+            )
+            self.conn.execute(f"DELETE FROM {self.runs_table} WHERE started_at < ?", (cutoff,))
+
+    def unfinished(self, source):
+        """True when the last run of source stopped before trying every job (a crash or a cancel)."""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT finished_at FROM {self.runs_table} WHERE source = ?", (source,)
+            ).fetchone()
+        return row is not None and row[0] is None
+
+    def start(self, source, jobs):
+        """
+        Replaces the journal of source with jobs (dicts of process_media_element
+        arguments), all pending, and returns how many there are. jobs may
+        be a generator; if it raises, the previous journal is kept.
+        """
+        count = 0
+
+        def rows():
+            nonlocal count
+            for seq, job in enumerate(jobs):
+                count += 1
+                yield source, seq, job["media_url"], json.dumps(job), PENDING
+
+        with self.lock, self.conn:
+            self.conn.execute(f"DELETE FROM {self.jobs_table} WHERE source = ?", (source,))
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.runs_table} (source, started_at, finished_at) VALUES (?, ?, NULL)",
+                (source, time.time()),
+            )
+            self.conn.executemany(
+                f"INSERT INTO {self.jobs_table} (source, seq, media_url, job, state) VALUES (?, ?, ?, ?, ?)",
+                rows(),
+            )
+        return count
+
+    def count(self, source, states=(PENDING,)):
+        marks = ", ".join("?" * len(states))
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT COUNT(*) FROM {self.jobs_table} WHERE source = ? AND state IN ({marks})",
+                (source, *states),
+            ).fetchone()
+        return row[0]
+
+    def jobs(self, source, states=(PENDING,)):
+        """Yields the jobs of source in the given states, in their stored order."""
+        marks = ", ".join("?" * len(states))
+        last_seq = -1
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT seq, job FROM {self.jobs_table} "
+                    f"WHERE source = ? AND seq > ? AND state IN ({marks}) ORDER BY seq LIMIT ?",
+                    (source, last_seq, *states, self.page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for seq, job in rows:
+                last_seq = seq
+                yield json.loads(job)
+
+    def settle(self, source, landed, completed=False):
+        """
+        Marks the jobs of source whose file landed (landed(media_url) is
+        true) as done. completed=True is for a run that went through all
+        of its jobs: the others become failed and the run is closed.
+        Otherwise they keep their state for the next start to pick up.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT seq, media_url FROM {self.jobs_table} WHERE source = ? AND state != ?",
+                (source, DONE),
+            ).fetchall()
+            done = [(DONE, source, seq) for seq, media_url in rows if landed(media_url)]
+            with self.conn:
+                self.conn.executemany(
+                    f"UPDATE {self.jobs_table} SET state = ? WHERE source = ? AND seq = ?",
+                    done,
+                )
+                if completed:
+                    self.conn.execute(
+                        f"UPDATE {self.jobs_table} SET state = ? WHERE source = ? AND state != ?",
+                        (FAILED, source, DONE),
+                    )
+                    self.conn.execute(
+                        f"UPDATE {self.runs_table} SET finished_at = ? WHERE source = ?",
+                        (time.time(), source),
+                    )
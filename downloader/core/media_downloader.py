@@ -0,0 +1,1712 @@
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+import os
+import re
+import requests
+import threading
+import time
+import weakref
+import zlib
+import sqlite3
+import shutil
+
+from downloader.core.async_engine import AsyncDownloadEngine
+from downloader.core.bandwidth_limiter import PRIORITY_NORMAL, shared_limiter
+from downloader.core.body_reader import BodyReader
+from downloader.core.circuit_breaker import HostCircuitBreaker, shared_breaker
+from downloader.core.disk_space import shared_disk_guard
+from downloader.core.disk_writer import DiskWriterPool
+from downloader.core.host_limiter import AdaptiveHostLimiter
+from downloader.core.http_transport import HttpTransport
+from downloader.core.job_journal import FAILED, PENDING, JobJournal
+from downloader.core.job_scheduler import estimate_size, schedule_jobs
+from downloader.core.part_file import CHECKPOINT_SECONDS, PART_SUFFIX, PartState, remove_stale_parts, resumable_part
+from downloader.core.pause_gate import PauseGate
+from downloader.core.preflight import PROBE_RANGE, probe_sizes, response_size
+from downloader.core.retry_scheduler import DeferredRetry, RetryBudget, RetryScheduler, parse_retry_after
+from downloader.core.stall_watchdog import StallWatchdog
+from downloader.core.subdomain_prober import SubdomainProber
+from downloader.core.segmented_download import MirroredDownload, SegmentedDownload, split_ranges
+from downloader.core.single_flight import SingleFlight
+from downloader.core.size_filter import SizeFilter, format_size
+from downloader.core.spill_list import SpillList
+from downloader.core.worker_pool import ResizableThreadPool
+
+
+class MediaDownloader:
+    """
+    The download pipeline shared by every site downloader: host limits,
+    retries, .part files, the job journal, pre-flight sizing and the
+    disk writers. Subclasses resolve a site's pages into media jobs and
+    hand them to _run_media_jobs or _run_journaled, and provide log() and
+    _compute_retry_delay().
+    """
+
+    # Concurrent requests per host to start from, and the most the adaptive limit may raise it to
+    host_limits = (2, 8)
+    # Used instead when the transport multiplexes requests (HTTP/2)
+    host_stream_limits = (8, 32)
+
+    def __init__(
+        self,
+        download_folder,
+        max_workers=5,
+        log_callback=None,
+        enable_widgets_callback=None,
+        update_progress_callback=None,
+        update_global_progress_callback=None,
+        headers=None,
+        max_retries=3,
+        retry_interval=1.0,
+        download_images=True,
+        download_videos=True,
+        download_compressed=True,
+        tr=None,
+        folder_structure="default",
+        rate_limit_interval=1.0,
+    ):
+        self.download_folder = download_folder
+        self.log_callback = log_callback
+        self.enable_widgets_callback = enable_widgets_callback
+        self.update_progress_callback = update_progress_callback
+        self.update_global_progress_callback = update_global_progress_callback
+        self.cancel_requested = threading.Event()
+        self.pause_gate = PauseGate()
+        self.pause_changed_callback = None
+        self.headers = headers or {
+            "User-Agent": "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+            "Referer": "https://coomer.st/",
+            "Accept": "text/css",
+        }
+
+        self.session = HttpTransport(pool_size=max_workers)
+        # A backend switch asked for during a run waits for the last run to end
+        self.run_lock = threading.Lock()
+        self.active_runs = 0
+        self.pending_http_backend = None
+        self.max_workers = max_workers
+        self.per_domain_limit, self.per_domain_max_limit = self.host_limits
+        self.per_domain_stream_limit, self.per_domain_max_streams = self.host_stream_limits
+        self.executor = ResizableThreadPool(self.max_workers)
+        self.domain_locks = AdaptiveHostLimiter(
+            self.per_domain_limit,
+            max_limit=self.per_domain_max_limit,
+            on_change=self._on_host_limit_changed,
+        )
+        self.domain_last_request = defaultdict(float)
+        # Host slots handed from a request to the body it returned, until the body is read
+        self.held_transfers = weakref.WeakKeyDictionary()
+        self.rate_limit_interval = rate_limit_interval
+
+        self.video_extensions = (".mp4", ".mkv", ".webm", ".mov", ".avi", ".flv", ".wmv", ".m4v")
+        self.image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff")
+        self.document_extensions = (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx")
+        self.compressed_extensions = (".zip", ".rar", ".7z", ".tar", ".gz")
+
+        self.download_images = download_images
+        self.download_videos = download_videos
+        self.download_compressed = download_compressed
+
+        self.futures = []
+        self.total_files = 0
+        self.completed_files = 0
+        # Counted, with long lists spilled to disk, so huge runs stay flat in memory
+        self.skipped_files = SpillList()
+        self.failed_files = SpillList()
+        self.tr = tr
+        self.shutdown_called = False
+        self.folder_structure = folder_structure
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.file_lock = threading.Lock()
+        self.counter_lock = threading.Lock()
+        self.post_attachment_counter = defaultdict(int)
+        self.subdomain_cache = {}
+        self.subdomain_locks = defaultdict(threading.Lock)
+        self.subdomain_prober = SubdomainProber(self.session, headers=self.headers)
+        self.request_timeout = (10, 120)
+        self.domain_name = "system"
+
+        self.max_retry_after = 300.0
+        self.retry_budget = RetryBudget(500)
+        self.retry_budget_reported = False
+        self.retry_scheduler = None
+
+        self.single_flight = SingleFlight()
+
+        self.progress_update_interval = 0.25
+        self.download_engine = "threads"
+        self.segment_count = 4
+        self.segment_threshold_bytes = 100 * 1024 * 1024
+        # Pull segments from every mirror _find_mirror_urls knows, not just one host
+        self.multi_mirror_downloads = False
+        self.mirror_piece_bytes = 4 * 1024 * 1024
+        self.stall_watchdog = StallWatchdog()
+        self.disk_writer = DiskWriterPool()
+        self.bandwidth_limiter = shared_limiter
+        self.bandwidth_priority = PRIORITY_NORMAL
+        self.download_order = "small_first"
+        # Jobs the sorted download orders look ahead, per worker, to pick the next file
+        self.schedule_lookahead_per_worker = 32
+        # .part files left by earlier runs are deleted once this old; 0 keeps them
+        self.part_max_age_days = 7
+        self.stale_parts_checked = False
+        # Set before a download to rerun only the jobs its last run could not download
+        self.retry_failed_only = False
+        # Optional pass that asks for the size of every planned file before a run
+        self.preflight_sizing = False
+        self.preflight_workers = 8
+        self.known_sizes = {}
+        # Bytes of the current run, from the pre-flight pass, and how many have landed
+        self.run_total_bytes = 0
+        self.run_landed_bytes = 0
+        # New files wait while starting them would leave less than this free; 0 turns it off
+        self.disk_reserve_mb = 500
+        self.disk_guard = shared_disk_guard
+        self.disk_space_low = False
+        # Size range per media class, checked from the response headers
+        self.size_filter = SizeFilter()
+        self.size_filtered = {}
+        # Files skipped by size_filter, per reason; their paths are in skipped_files
+        self.size_skip_reasons = defaultdict(int)
+
+        db_folder = os.path.join("resources", "config")
+        os.makedirs(db_folder, exist_ok=True)
+        self.db_path = os.path.join(db_folder, "downloads.db")
+        self.db_lock = threading.Lock()
+        self.init_db()
+        self.load_download_cache()
+        self.host_breaker = shared_breaker(self.db_path)
+        self.host_breaker.add_listener(self._on_breaker_changed)
+        self.job_journal = JobJournal(self.db_path)
+
+    def _translate_text(self, key, **kwargs):
+        if callable(self.tr):
+            try:
+                return self.tr(key, **kwargs)
+            except TypeError:
+                text = self.tr(key)
+                if kwargs:
+                    try:
+                        return text.format(**kwargs)
+                    except Exception:
+                        return text
+                return text
+
+        if kwargs:
+            try:
+                return key.format(**kwargs)
+            except Exception:
+                return key
+        return key
+
+    def init_db(self):
+        self.db_connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.db_cursor = self.db_connection.cursor()
+        self.db_cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS downloads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                media_url TEXT UNIQUE,
+                file_path TEXT,
+                file_size INTEGER,
+                user_id TEXT,
+                post_id TEXT,
+                downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        self.db_connection.commit()
+
+    def load_download_cache(self):
+        with self.db_lock:
+            self.db_cursor.execute("SELECT media_url, file_path, file_size FROM downloads")
+            rows = self.db_cursor.fetchall()
+        self.download_cache = {row[0]: (row[1], row[2]) for row in rows}
+
+    def sanitize_filename(self, filename):
+        return re.sub(r'[<>:"/\\\\|?*]', "_", filename)
+
+    def request_cancel(self):
+        self.cancel_requested.set()
+        # Requests blocked on slow hosts fail now instead of at their timeouts
+        self.session.cancel()
+        self.log("DOWNLOAD_CANCELLATION_REQUESTED")
+        for future in self.futures:
+            future.cancel()
+
+    def request_pause(self):
+        """Stops every transfer at its next chunk, keeping its .part file to resume from."""
+        if self.pause_gate.paused:
+            return
+        self.pause_gate.pause()
+        self.log("DOWNLOAD_PAUSE_REQUESTED")
+        self._notify_pause_changed()
+
+    def request_resume(self):
+        if not self.pause_gate.paused:
+            return
+        self.pause_gate.resume()
+        self.log("DOWNLOAD_RESUMED")
+        self._notify_pause_changed()
+
+    def _notify_pause_changed(self):
+        if self.pause_changed_callback:
+            self.pause_changed_callback(self.pause_gate.paused)
+
+    def _wait_while_paused(self):
+        """Returns False if the run was cancelled while paused."""
+        return self.pause_gate.wait(self.cancel_requested.is_set)
+
+    def shutdown_executor(self):
+        if not self.shutdown_called:
+            self.shutdown_called = True
+            if self.executor:
+                self.executor.shutdown(wait=True)
+            self.disk_writer.close()
+            self.host_breaker.remove_listener(self._on_breaker_changed)
+            if self.enable_widgets_callback:
+                self.enable_widgets_callback()
+            self.log("ALL_DOWNLOADS_COMPLETED_OR_CANCELLED")
+            with self.db_lock:
+                try:
+                    self.db_connection.close()
+                except Exception:
+                    pass
+
+    def get_filename(self, media_url, post_id=None, post_name=None, attachment_index=1, post_time=None):
+        base_name = os.path.basename(media_url).split("?")[0]
+        name_no_ext, extension = os.path.splitext(base_name)
+
+        if not hasattr(self, "file_naming_mode"):
+            self.file_naming_mode = 0
+
+        mode = self.file_naming_mode
+
+        def sanitize(name):
+            return self.sanitize_filename(name).strip()
+
+        if mode == 0:
+            sanitized = sanitize(name_no_ext) or "file"
+            return f"{sanitized}_{attachment_index}{extension}"
+        elif mode == 1:
+            sanitized_post = sanitize(post_name or "") or (f"post_{post_id}" if post_id else "post")
+            short_hash = f"{zlib.crc32(media_url.encode('utf-8')) & 0xFFFF:04x}"
+            return f"{sanitized_post}_{attachment_index}_{short_hash}{extension}"
+        elif mode == 2:
+            sanitized_post = sanitize(post_name or "") or (f"post_{post_id}" if post_id else "post")
+            return (
+                f"{sanitized_post} - {post_id}_{attachment_index}{extension}"
+                if post_id else f"{sanitized_post}_{attachment_index}{extension}"
+            )
+        elif mode == 3:
+            sanitized_post = sanitize(post_name or "") or (f"post_{post_id}" if post_id else "post")
+            sanitized_time = sanitize(post_time or "")
+            short_hash = f"{zlib.crc32(media_url.encode('utf-8')) & 0xFFFF:04x}"
+            return f"{sanitized_time} - {sanitized_post}_{attachment_index}_{short_hash}{extension}"
+
+        return sanitize(name_no_ext) + extension
+
+    def get_media_folder(self, extension, user_id, post_id=None):
+        if extension in self.video_extensions:
+            folder_name = "videos"
+        elif extension in self.image_extensions:
+            folder_name = "images"
+        elif extension in self.document_extensions:
+            folder_name = "documents"
+        elif extension in self.compressed_extensions:
+            folder_name = "compressed"
+        else:
+            folder_name = "other"
+
+        if self.folder_structure == "post_number" and post_id:
+            return os.path.join(self.download_folder, user_id, f"post_{post_id}", folder_name)
+
+        return os.path.join(self.download_folder, user_id, folder_name)
+
+    def _emit_progress_update(
+        self,
+        downloaded_size,
+        total_size,
+        download_id,
+        file_path,
+        start_time,
+        last_emit_time,
+        force=False,
+    ):
+        if not self.update_progress_callback:
+            return last_emit_time
+
+        now = time.time()
+        if not force and (now - last_emit_time) < self.progress_update_interval:
+            return last_emit_time
+
+        elapsed_time = now - start_time
+        speed = downloaded_size / elapsed_time if elapsed_time > 0 else 0
+        remaining_time = (total_size - downloaded_size) / speed if speed > 0 and total_size > 0 else 0
+
+        self.update_progress_callback(
+            downloaded_size,
+            total_size,
+            file_id=download_id,
+            file_path=file_path,
+            speed=speed,
+            eta=remaining_time,
+        )
+        return now
+
+    def _wait_for_domain_cooldown(self, domain):
+        """Waits while the host's circuit breaker is open; False if cancelled meanwhile."""
+        while True:
+            if self.cancel_requested.is_set():
+                return False
+
+            wait = self.host_breaker.acquire(domain)
+            if wait <= 0:
+                return True
+
+            self.cancel_requested.wait(min(wait, 0.5))
+
+    def _mark_domain_success(self, domain):
+        self.host_breaker.record_success(domain)
+
+    def _mark_domain_error(self, domain, status_code):
+        """Counts a failed request; status_code is None for timeouts and connection errors."""
+        if status_code is not None and status_code not in (429, 500, 502, 503, 504):
+            # The host answered; only this request was refused
+            self.host_breaker.record_success(domain, reset=False)
+            return
+
+        if self.host_breaker.record_failure(domain):
+            self.domain_locks.decrease(domain)
+        else:
+            self.domain_locks.record_error(domain)
+
+    def _on_breaker_changed(self, domain, state, seconds):
+        if state == HostCircuitBreaker.OPEN:
+            self.log("CIRCUIT_OPENED", domain=domain, seconds=f"{seconds:.0f}")
+        elif state == HostCircuitBreaker.HALF_OPEN:
+            self.log("CIRCUIT_HALF_OPEN", domain=domain)
+        elif state == HostCircuitBreaker.CLOSED:
+            self.log("CIRCUIT_CLOSED", domain=domain)
+        else:
+            self.log("CIRCUIT_RESTORED", domain=domain, seconds=f"{seconds:.0f}")
+
+    def _on_host_limit_changed(self, domain, limit, throughput, reason):
+        self.log(
+            "HOST_LIMIT_CHANGED",
+            domain=domain,
+            limit=limit,
+            speed=f"{throughput / (1024 * 1024):.2f} MB/s",
+            reason=reason,
+        )
+
+    def _log_disk_stats(self):
+        stats = self.disk_writer.stats()
+        if not stats["bytes_written"]:
+            return
+        self.log(
+            "DISK_STATS",
+            size=f"{stats['bytes_written'] / (1024 * 1024):.1f} MB",
+            speed=f"{stats['disk_bytes_per_second'] / (1024 * 1024):.1f} MB/s",
+            busy=f"{stats['writer_busy'] * 100:.0f}%",
+            wait=f"{stats['network_wait_seconds']:.1f}",
+            verdict=self._translate_text(
+                "DISK_BOUND_RUN" if stats["bottleneck"] == "disk" else "NETWORK_BOUND_RUN"
+            ),
+        )
+
+    def _log_host_limits(self):
+        for domain, limit, throughput in self.domain_locks.snapshot():
+            self.log(
+                "HOST_LIMIT_SUMMARY",
+                domain=domain,
+                limit=limit,
+                speed=f"{throughput / (1024 * 1024):.2f} MB/s",
+            )
+
+    def _record_transfer(self, url, size, seconds):
+        self.domain_locks.record_transfer(urlparse(url).netloc, size)
+
+    def _hold_transfer(self, response, domain):
+        # Called with the domain slot still held, so the body takes the slot over without a gap
+        transfer = self.domain_locks.transfer(domain)
+        self.held_transfers[response] = transfer
+        # A response dropped unread gives the slot back once it is collected
+        weakref.finalize(response, transfer.end)
+
+    def _transfer_slot(self, response):
+        """
+        Held while response's body is read, so the host limit bounds
+        transfers and not just requests; takes over the slot a
+        safe_request(..., transfer=True) handed the response.
+        """
+        transfer = self.held_transfers.pop(response, None)
+        return transfer or self.domain_locks.transfer(urlparse(str(response.url)).netloc)
+
+    def _end_transfer(self, response):
+        # For a held response closed unread before this thread asks the host for another
+        transfer = self.held_transfers.pop(response, None)
+        if transfer is not None:
+            transfer.end()
+
+    def safe_request(self, url, max_retries=None, headers=None, defer=False, first_attempt=0, transfer=False):
+        """
+        GETs url with retries. Backoff waits happen after the domain slot
+        is released; with defer=True they do not block the caller at all:
+        DeferredRetry is raised so the job can be rescheduled, and the
+        retry comes back as safe_request(..., first_attempt=retry.attempt).
+        With transfer=True the response keeps the domain slot until its
+        body is read through _transfer_slot (or _end_transfer).
+        """
+        if max_retries is None:
+            max_retries = self.max_retries
+        if headers is None:
+            headers = self.headers
+
+        try:
+            max_retries = int(max_retries)
+        except (TypeError, ValueError):
+            max_retries = 0
+        if max_retries < 0:
+            max_retries = 0
+
+        url = self._route_to_known_node(url)
+        parsed = urlparse(url)
+        domain = parsed.netloc
+
+        for attempt in range(first_attempt, max_retries + 1):
+            if self.cancel_requested.is_set():
+                return None
+
+            if not self._wait_for_domain_cooldown(domain):
+                return None
+
+            probe_status = None
+            retry_delay = None
+            with self.domain_locks[domain]:
+                elapsed_time = time.time() - self.domain_last_request[domain]
+                if elapsed_time < self.rate_limit_interval:
+                    if self.cancel_requested.wait(self.rate_limit_interval - elapsed_time):
+                        return None
+
+                try:
+                    self.domain_last_request[domain] = time.time()
+                    response = self.session.get(
+                        url,
+                        stream=True,
+                        headers=headers,
+                        timeout=self.request_timeout,
+                    )
+                    sc = response.status_code
+
+                    if sc in (403, 404) and ("coomer" in domain or "kemono" in domain):
+                        # Probe after releasing the domain semaphore
+                        self._record_node_miss(response.url)
+                        response.close()
+                        self._mark_domain_error(domain, sc)
+                        probe_status = sc
+                    else:
+                        response.raise_for_status()
+                        self._mark_domain_success(domain)
+                        self._record_node_success(response.url)
+                        if transfer:
+                            self._hold_transfer(response, domain)
+                        return response
+
+                except requests.exceptions.RequestException as e:
+                    if self.cancel_requested.is_set():
+                        # Aborted by request_cancel, not the host's fault
+                        return None
+                    status_code = getattr(e.response, "status_code", None)
+                    self._mark_domain_error(domain, status_code)
+
+                    if status_code in (429, 500, 502, 503, 504):
+                        self.log(
+                            "HTTP_RETRY_REQUEST",
+                            attempt=attempt + 1,
+                            total=max_retries + 1,
+                            status_code=status_code,
+                            url=url,
+                        )
+
+                        if attempt < max_retries:
+                            retry_delay = self._retry_delay_for(domain, attempt, e.response)
+
+                    elif isinstance(e, requests.exceptions.ReadTimeout):
+                        self.log(
+                            "READ_TIMEOUT_RETRY",
+                            attempt=attempt + 1,
+                            total=max_retries + 1,
+                            timeout=self.request_timeout[1],
+                        )
+
+                        if attempt < max_retries:
+                            retry_delay = self._compute_retry_delay(attempt)
+
+                    elif status_code not in (403, 404):
+                        url_display = getattr(e.request, "url", url)
+                        if len(url_display) > 60:
+                            url_display = url_display[:60] + "..."
+                        self.log(
+                            "ERROR_ACCESSING_URL",
+                            attempt=attempt + 1,
+                            total=max_retries + 1,
+                            url=url_display,
+                            error=e,
+                        )
+
+                        if attempt < max_retries:
+                            retry_delay = self._compute_retry_delay(attempt)
+
+                    if status_code in (403, 404) and ("coomer" in domain or "kemono" in domain) and attempt == max_retries:
+                        self.log(
+                            "FINAL_FAILURE_ACCESSING_URL",
+                            url=url,
+                            status_code=status_code,
+                        )
+
+            if probe_status is not None:
+                return self._request_alternate_subdomain(url, probe_status, max_retries - attempt, headers, transfer)
+
+            if retry_delay is not None:
+                if not self._spend_retry():
+                    return None
+                if defer:
+                    raise DeferredRetry(retry_delay, attempt + 1)
+                if self.cancel_requested.wait(retry_delay):
+                    return None
+
+        return None
+
+    def _retry_delay_for(self, domain, attempt, response=None):
+        """Backoff for a retryable status, stretched to the server's Retry-After."""
+        delay = self._compute_retry_delay(attempt)
+        headers = getattr(response, "headers", None) or {}
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if retry_after is None:
+            return delay
+
+        retry_after = min(retry_after, self.max_retry_after)
+        self.host_breaker.hold(domain, retry_after)
+        return max(delay, retry_after)
+
+    def _spend_retry(self):
+        if self.retry_budget.try_spend():
+            return True
+        with self.retry_budget.lock:
+            first_refusal = not self.retry_budget_reported
+            self.retry_budget_reported = True
+        if first_refusal:
+            self.log("RETRY_BUDGET_EXHAUSTED", budget=self.retry_budget.limit)
+        return False
+
+    # Hooks for sites whose files live on several interchangeable hosts;
+    # Downloader fills them in for the Coomer/Kemono data nodes.
+    def _route_to_known_node(self, url):
+        return url
+
+    def _record_node_success(self, url):
+        pass
+
+    def _record_node_miss(self, url):
+        pass
+
+    def _mark_media_dead(self, url, status_code):
+        pass
+
+    def _skip_known_dead(self, media_url, final_path):
+        return False
+
+    def _find_mirror_urls(self, url, total_size):
+        """Every URL serving the same file with Range support, `url` first; [] when unknown."""
+        return []
+
+    def _switch_stalled_node(self, url, total_size):
+        """Another URL serving the same file as a stalled url, or None."""
+        return None
+
+    def _resolve_subdomain(self, url):
+        """Returns the data node serving url's path (url itself if none), probing once per path."""
+        path = urlparse(url).path
+        with self.subdomain_locks[path]:
+            if path in self.subdomain_cache:
+                return self.subdomain_cache[path]
+            alt_url = self._find_valid_subdomain(url)
+            self.subdomain_cache[path] = alt_url
+
+        if alt_url != url:
+            self.subdomain_cache.setdefault(urlparse(alt_url).path, alt_url)
+        return alt_url
+
+    def _request_alternate_subdomain(self, url, status_code, max_retries, headers, transfer=False):
+        if self.update_progress_callback:
+            self.update_progress_callback(0, 0, status=f"{status_code} - probing subdomains")
+
+        alt_url = self._resolve_subdomain(url)
+        if alt_url == url:
+            if self.update_progress_callback:
+                self.update_progress_callback(0, 0, status="Exhausted subdomains")
+            self._mark_media_dead(url, status_code)
+            return None
+
+        if self.update_progress_callback:
+            self.update_progress_callback(0, 0, status=f"Subdomain found: {urlparse(alt_url).netloc}")
+
+        # The alternate node gets its own semaphore, cooldown and retries
+        return self.safe_request(alt_url, max_retries=max_retries, headers=headers, transfer=transfer)
+
+    def _find_valid_subdomain(self, url, max_subdomains=10):
+        if self.update_progress_callback:
+            self.update_progress_callback(0, 0, status="Probing subdomains")
+
+        alt_url, elapsed = self.subdomain_prober.find(
+            url,
+            max_subdomains=max_subdomains,
+            should_cancel=self.cancel_requested.is_set,
+        )
+        stats = self.subdomain_prober.snapshot()
+
+        if alt_url is None:
+            self.log(
+                "SUBDOMAIN_PROBE_MISS",
+                url=url,
+                elapsed_ms=int(elapsed * 1000),
+                hits=stats["hits"],
+                lookups=stats["lookups"],
+            )
+            return url
+
+        self.log(
+            "SUBDOMAIN_PROBE_HIT",
+            node=urlparse(alt_url).netloc,
+            elapsed_ms=int(elapsed * 1000),
+            hits=stats["hits"],
+            lookups=stats["lookups"],
+        )
+        return alt_url
+
+    def _media_target(
+        self,
+        media_url,
+        user_id=None,
+        post_id=None,
+        post_name=None,
+        post_time=None,
+        target_folder=None,
+        forced_filename=None,
+    ):
+        """(folder, file name) of a media file; unnamed files take their post's next attachment index."""
+        if forced_filename:
+            filename = forced_filename
+        else:
+            if post_id:
+                with self.counter_lock:
+                    self.post_attachment_counter[post_id] += 1
+                    attachment_index = self.post_attachment_counter[post_id]
+            else:
+                attachment_index = 1
+
+            filename = self.get_filename(
+                media_url,
+                post_id=post_id,
+                post_name=post_name,
+                post_time=post_time,
+                attachment_index=attachment_index,
+            )
+
+        if target_folder:
+            return target_folder, filename
+
+        extension = os.path.splitext(media_url.split("?")[0])[1].lower()
+        return self.get_media_folder(extension, user_id or "generic", post_id), filename
+
+    def _prepare_media_target(
+        self,
+        media_url,
+        user_id=None,
+        post_id=None,
+        post_name=None,
+        post_time=None,
+        target_folder=None,
+        forced_filename=None,
+    ):
+        extension = os.path.splitext(media_url.split("?")[0])[1].lower()
+
+        if (
+            (extension in self.image_extensions and not self.download_images)
+            or (extension in self.video_extensions and not self.download_videos)
+            or (extension in self.compressed_extensions and not self.download_compressed)
+        ):
+            self.log("SKIPPING_MEDIA_DUE_TO_SETTINGS", media_url=media_url)
+            return None
+
+        media_folder, filename = self._media_target(
+            media_url,
+            user_id=user_id,
+            post_id=post_id,
+            post_name=post_name,
+            post_time=post_time,
+            target_folder=target_folder,
+            forced_filename=forced_filename,
+        )
+        os.makedirs(media_folder, exist_ok=True)
+
+        return os.path.normpath(os.path.join(media_folder, filename))
+
+    def _finalize_download(self, tmp_path, final_path, media_url, total_size, user_id=None, post_id=None):
+        with self.file_lock:
+            if os.path.exists(final_path):
+                os.remove(final_path)
+            os.rename(tmp_path, final_path)
+        self._record_download(final_path, media_url, total_size, user_id, post_id)
+
+    def _commit_download(
+        self, disk_file, final_path, media_url, total_size, user_id=None, post_id=None, on_finished=None
+    ):
+        """
+        Hands the finished .part file to its disk writer, which syncs and
+        renames it in a batch; the download is recorded once that is done.
+        on_finished(path) is called last, with None if the commit failed.
+        """
+
+        def on_done(error):
+            PartState.remove(disk_file.path)
+            try:
+                if error is None:
+                    self._record_download(final_path, media_url, total_size, user_id, post_id)
+                    return
+                disk_file.discard()
+                self.log("DISK_WRITE_FAILED", media_url=media_url, error=error)
+                with self.file_lock:
+                    self.failed_files.append(media_url)
+            finally:
+                if on_finished is not None:
+                    on_finished(final_path if error is None else None)
+
+        disk_file.commit(final_path, on_done)
+
+    def _checkpoint_part(self, disk_file, progress, force=False):
+        # Records in the sidecar, behind the queued writes, how much of the .part is filled
+        part = progress.get("part")
+        now = time.time()
+        if part is None or (not force and now - progress["checkpoint_at"] < CHECKPOINT_SECONDS):
+            return
+        progress["checkpoint_at"] = now
+        disk_file.after_writes(part.record, disk_file.path, progress["downloaded"])
+
+    def _keep_part(self, disk_file, progress):
+        """
+        Leaves a failed or cancelled transfer on disk as a .part file whose
+        sidecar holds the bytes received, for a later run to resume from.
+        Parts that could not be resumed are deleted.
+        """
+        if progress.get("part") is not None and progress["downloaded"] > 0:
+            self._checkpoint_part(disk_file, progress, force=True)
+            try:
+                disk_file.close()
+                return
+            except Exception:
+                pass
+        disk_file.discard()
+        PartState.remove(disk_file.path)
+
+    def _remove_stale_parts(self):
+        # Once per downloader: parts no run came back for within the configured age
+        if self.stale_parts_checked:
+            return
+        self.stale_parts_checked = True
+        removed = remove_stale_parts(self.download_folder, float(self.part_max_age_days or 0) * 86400)
+        if removed:
+            self.log("STALE_PARTS_REMOVED", count=removed, days=self.part_max_age_days)
+
+    def _disk_reserve_bytes(self):
+        return int(float(self.disk_reserve_mb or 0) * 1024 * 1024)
+
+    def _try_claim_disk_space(self, path, size):
+        """
+        Claims room for size bytes next to path, or returns None while
+        that would leave less than disk_reserve_mb free on its disk. The
+        first refusal and the first claim granted after it are logged.
+        """
+        claim = self.disk_guard.try_claim(path, size, self._disk_reserve_bytes())
+        with self.file_lock:
+            changed = self.disk_space_low != (claim is None)
+            self.disk_space_low = claim is None
+        if changed and claim is None:
+            self.log(
+                "DISK_SPACE_LOW_WAITING",
+                free=f"{(self.disk_guard.free_bytes(path) or 0) / (1024 * 1024):.1f} MB",
+                reserve=f"{float(self.disk_reserve_mb):.1f} MB",
+            )
+        elif changed:
+            self.log("DISK_SPACE_AVAILABLE_AGAIN")
+        return claim
+
+    def _claim_disk_space(self, path, media_url):
+        """
+        Holds a new file back until its expected size (known from the
+        pre-flight pass, otherwise 0) fits on the disk above the reserve;
+        running transfers carry on meanwhile. Returns the claim, to be
+        released once the file is done, or None if the run was cancelled.
+        """
+        size = self.known_sizes.get(media_url, 0)
+        claim = self._try_claim_disk_space(path, size)
+        while claim is None:
+            if self.cancel_requested.wait(0.5):
+                return None
+            claim = self._try_claim_disk_space(path, size)
+        return claim
+
+    def _media_class(self, media_url):
+        extension = os.path.splitext(media_url.split("?")[0])[1].lower()
+        if extension in self.image_extensions:
+            return "images"
+        if extension in self.video_extensions:
+            return "videos"
+        if extension in self.compressed_extensions:
+            return "compressed"
+        return None
+
+    def _skip_by_size(self, media_url, final_path, size):
+        """
+        True when size is outside the range size_filter allows for the
+        file's media class; the file is logged and listed as skipped, its
+        reason counted in size_skip_reasons, and the journal counts the
+        file as settled.
+        """
+        rejected = self.size_filter.rejects(self._media_class(media_url), size)
+        if rejected is None:
+            return False
+        reason_key, bound = rejected
+        reason = self._translate_text(reason_key, limit=format_size(bound))
+        self.log("SKIPPING_MEDIA_DUE_TO_SIZE", media_url=media_url, size=format_size(size), reason=reason)
+        with self.file_lock:
+            self.size_filtered[media_url] = reason
+            self.size_skip_reasons[reason] += 1
+            self.skipped_files.append(final_path)
+        return True
+
+    def _share_download(self, source_path, final_path, media_url):
+        """
+        Completes a job whose URL another job was already downloading: the
+        file that job produced is hard-linked (or copied, across devices)
+        to this job's own target path.
+        """
+        if os.path.normcase(os.path.abspath(source_path)) == os.path.normcase(os.path.abspath(final_path)):
+            self.log("FILE_DOWNLOADED_BY_OTHER_JOB_SKIPPING", media_url=media_url)
+            with self.file_lock:
+                self.skipped_files.append(final_path)
+            return
+
+        tmp_path = final_path + ".tmp"
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            try:
+                os.link(source_path, tmp_path)
+            except OSError:
+                shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, final_path)
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            self.log("DOWNLOAD_SHARE_FAILED", media_url=media_url, error=e)
+            with self.file_lock:
+                self.failed_files.append(media_url)
+            return
+
+        with self.file_lock:
+            self.completed_files += 1
+        self.log("DOWNLOAD_SHARED_FROM", media_url=media_url, path=final_path)
+        if self.update_global_progress_callback:
+            self.update_global_progress_callback(self.completed_files, self.total_files)
+
+    def _wait_for_flight(self, flight, media_url, final_path, job):
+        """
+        Waits for the job already downloading media_url and shares its
+        file; if that job failed, this one downloads the file itself.
+        """
+        self.log("FILE_ALREADY_IN_PROGRESS_WAITING", media_url=media_url)
+        if not flight.wait(self.cancel_requested.is_set):
+            return
+        if flight.result is None:
+            self.process_media_element(**job)
+            return
+        self._share_download(flight.result, final_path, media_url)
+
+    def _record_download(self, final_path, media_url, total_size, user_id=None, post_id=None):
+        with self.file_lock:
+            self.completed_files += 1
+            self.run_landed_bytes += self.known_sizes.get(media_url, 0)
+
+        self.log("DOWNLOAD_SUCCESS_FROM", media_url=media_url)
+
+        if self.update_global_progress_callback:
+            self.update_global_progress_callback(self.completed_files, self.total_files)
+
+        with self.db_lock:
+            self.db_cursor.execute(
+                """
+                INSERT OR REPLACE INTO downloads (media_url, file_path, file_size, user_id, post_id)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (media_url, final_path, total_size, user_id, post_id),
+            )
+            self.db_connection.commit()
+
+        self.download_cache[media_url] = (final_path, total_size)
+
+    def _download_segmented(self, media_url, response, disk_file, total_size, download_id):
+        """
+        Splits large files into parallel Range segments, or across every
+        mirror holding the file when multi-mirror mode is on. Returns
+        False, leaving `response` untouched, when the file is too small or
+        the server ignores Range, so the caller streams it in one piece.
+        """
+        if self.segment_count < 2 or total_size < max(self.segment_threshold_bytes, 1):
+            return False
+        if response.headers.get("accept-ranges", "").lower() == "none":
+            return False
+
+        source_url = response.url or media_url
+        start_time = time.time()
+        progress = {"last_emit_time": 0.0}
+
+        def on_progress(downloaded_size):
+            progress["last_emit_time"] = self._emit_progress_update(
+                downloaded_size=downloaded_size,
+                total_size=total_size,
+                download_id=download_id,
+                file_path=disk_file.path,
+                start_time=start_time,
+                last_emit_time=progress["last_emit_time"],
+            )
+
+        transfer = None
+        mirror_urls = []
+        if self.multi_mirror_downloads:
+            mirror_urls = self._find_mirror_urls(source_url, total_size)
+
+        if len(mirror_urls) >= 2:
+            self.log("MIRRORED_DOWNLOAD_STARTED", media_url=media_url, mirrors=len(mirror_urls))
+            transfer = MirroredDownload(
+                disk_file,
+                total_size,
+                [self._range_opener(url) for url in mirror_urls],
+                piece_size=self.mirror_piece_bytes,
+                should_cancel=self.cancel_requested.is_set,
+                on_progress=on_progress,
+                throttle=self._throttle,
+                pause_gate=self.pause_gate,
+                max_retries=self.max_retries,
+                initial_response=(0, response),
+                transfer_slot=self._transfer_slot,
+            )
+        else:
+            segments = split_ranges(total_size, self.segment_count)
+            open_range = self._range_opener(source_url)
+            # The probe may need the slot `response` holds; segment 0 counts it again once read
+            self._end_transfer(response)
+
+            # Probe with the last segment: a 200 means Range is ignored
+            last_start, last_end = segments[-1]
+            probe = open_range(last_start, last_end)
+            if probe is None:
+                return False
+            if probe.status_code != 206:
+                self._end_transfer(probe)
+                probe.close()
+                return False
+
+            self.log("SEGMENTED_DOWNLOAD_STARTED", media_url=media_url, segments=len(segments))
+            transfer = SegmentedDownload(
+                disk_file,
+                total_size,
+                segments,
+                open_range,
+                should_cancel=self.cancel_requested.is_set,
+                on_progress=on_progress,
+                throttle=self._throttle,
+                pause_gate=self.pause_gate,
+                max_retries=self.max_retries,
+                initial_responses={0: response, len(segments) - 1: probe},
+                transfer_slot=self._transfer_slot,
+            )
+
+        try:
+            downloaded_size = transfer.run()
+        finally:
+            if isinstance(transfer, MirroredDownload):
+                self._log_mirror_stats(mirror_urls, transfer.source_stats)
+
+        if downloaded_size != total_size:
+            raise Exception(
+                self._translate_text(
+                    "FINAL_SIZE_MISMATCH",
+                    expected=total_size,
+                    actual=downloaded_size,
+                )
+            )
+
+        self._emit_progress_update(
+            downloaded_size=downloaded_size,
+            total_size=total_size,
+            download_id=download_id,
+            file_path=disk_file.path,
+            start_time=start_time,
+            last_emit_time=progress["last_emit_time"],
+            force=True,
+        )
+        return True
+
+    def _range_opener(self, url):
+        def open_range(start, end):
+            range_headers = self.headers.copy()
+            range_headers["Range"] = f"bytes={start}-{end}"
+            return self.safe_request(url, max_retries=self.max_retries, headers=range_headers, transfer=True)
+
+        return open_range
+
+    def _receive_body(self, response, disk_file, media_url, total_size, download_id, progress):
+        """
+        Queues response's body to disk_file from byte progress["downloaded"]
+        on, advancing progress as it goes. Returns the URL to move away from
+        when the stall watchdog cut the transfer, otherwise None. A pause
+        stops it at a chunk boundary with the response closed, and the
+        caller resumes with a Range request.
+        """
+        with self.stall_watchdog.watch(response) as watch, self._transfer_slot(response):
+            try:
+                reader = BodyReader(
+                    response,
+                    max_chunk_size=self.bandwidth_limiter.max_chunk_size(),
+                    buffers=self.disk_writer.buffers,
+                )
+                for chunk in reader.chunks():
+                    size = len(chunk)
+                    disk_file.write(chunk, progress["downloaded"])
+                    if self.cancel_requested.is_set():
+                        raise Exception("CANCELLATION_REQUESTED")
+
+                    self._throttle(size)
+
+                    watch.add(size)
+                    progress["downloaded"] += size
+                    self._checkpoint_part(disk_file, progress)
+                    progress["last_emit_time"] = self._emit_progress_update(
+                        downloaded_size=progress["downloaded"],
+                        total_size=total_size,
+                        download_id=download_id,
+                        file_path=disk_file.path,
+                        start_time=progress["start_time"],
+                        last_emit_time=progress["last_emit_time"],
+                    )
+
+                    if self.pause_gate.paused:
+                        if total_size:
+                            # The caller continues from here with a Range request
+                            response.close()
+                            return None
+                        # Unknown size: no Range to resume with, hold the stream
+                        if not self._wait_while_paused():
+                            raise Exception("CANCELLATION_REQUESTED")
+            except requests.exceptions.RequestException:
+                if not watch.stalled:
+                    raise
+                return self._on_transfer_stalled(response, watch, media_url)
+        return None
+
+    def _on_transfer_stalled(self, response, watch, media_url):
+        response.close()
+        self.log(
+            "STALL_DETECTED",
+            media_url=media_url,
+            speed=f"{watch.speed / 1024:.1f} KB/s",
+            seconds=int(self.stall_watchdog.window_seconds),
+        )
+        url = str(response.url)
+        self._record_node_miss(url)
+        return url
+
+    def _log_mirror_stats(self, mirror_urls, source_stats):
+        for url, stats in zip(mirror_urls, source_stats):
+            seconds = stats["seconds"] or 1e-9
+            self.log(
+                "MIRROR_NODE_STATS",
+                node=urlparse(url).netloc,
+                pieces=stats["pieces"],
+                size=f"{stats['bytes'] / (1024 * 1024):.1f} MB",
+                speed=f"{stats['bytes'] / seconds / (1024 * 1024):.2f} MB/s",
+                status="failed" if stats["failed"] else "ok",
+            )
+
+    def process_media_element(
+        self,
+        media_url,
+        user_id=None,
+        post_id=None,
+        post_name=None,
+        post_time=None,
+        download_id=None,
+        target_folder=None,
+        forced_filename=None,
+        retry_attempt=0,
+    ):
+        if self.cancel_requested.is_set() or not self._wait_while_paused():
+            return
+
+        final_path = self._prepare_media_target(
+            media_url,
+            user_id=user_id,
+            post_id=post_id,
+            post_name=post_name,
+            post_time=post_time,
+            target_folder=target_folder,
+            forced_filename=forced_filename,
+        )
+        if final_path is None:
+            return
+
+        part_path = final_path + PART_SUFFIX
+
+        if media_url in self.download_cache:
+            cached_path = self.download_cache[media_url][0]
+            if retry_attempt and cached_path and os.path.exists(cached_path):
+                # A duplicate job landed the file while this one waited to retry
+                self._share_download(cached_path, final_path, media_url)
+                return
+            self.log("FILE_ALREADY_IN_DB_SKIPPING", media_url=media_url)
+            with self.file_lock:
+                self.skipped_files.append(final_path)
+            return
+
+        if self._skip_known_dead(media_url, final_path):
+            return
+
+        # Known from the pre-flight pass: no need to ask the server again
+        if self._skip_by_size(media_url, final_path, self.known_sizes.get(media_url, 0)):
+            return
+
+        flight, leader = self.single_flight.begin(media_url)
+        if not leader:
+            self._wait_for_flight(
+                flight,
+                media_url,
+                final_path,
+                dict(
+                    media_url=media_url,
+                    user_id=user_id,
+                    post_id=post_id,
+                    post_name=post_name,
+                    post_time=post_time,
+                    download_id=download_id,
+                    target_folder=os.path.dirname(final_path),
+                    forced_filename=os.path.basename(final_path),
+                    retry_attempt=retry_attempt,
+                ),
+            )
+            return
+
+        # Set once the flight is handed to the disk writer, which lands it
+        handed_off = False
+        space_claim = None
+        try:
+            space_claim = self._claim_disk_space(final_path, media_url)
+            if space_claim is None:
+                self.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
+                return
+
+            if not retry_attempt:
+                self.log("STARTING_DOWNLOAD_FROM", media_url=media_url)
+
+            # A .part file an earlier run left behind continues where it stopped
+            part = resumable_part(part_path, media_url)
+            request_headers = None
+            if part is not None:
+                request_headers = self.headers.copy()
+                request_headers.update(part.resume_headers())
+
+            try:
+                response = self.safe_request(
+                    media_url,
+                    max_retries=self.max_retries,
+                    headers=request_headers,
+                    defer=self.retry_scheduler is not None,
+                    first_attempt=retry_attempt,
+                    transfer=True,
+                )
+            except DeferredRetry as retry:
+                # Pin the resolved path so the retry keeps its attachment index
+                self._defer_media_job(
+                    retry,
+                    media_url=media_url,
+                    user_id=user_id,
+                    post_id=post_id,
+                    post_name=post_name,
+                    post_time=post_time,
+                    download_id=download_id,
+                    target_folder=os.path.dirname(final_path),
+                    forced_filename=os.path.basename(final_path),
+                )
+                return
+
+            if part is not None and response is not None and not part.continues(response.status_code, response.headers):
+                part = None
+                if response.status_code == 206:
+                    # A range that does not continue the part; fetch the whole file instead
+                    self._end_transfer(response)
+                    response.close()
+                    response = self.safe_request(media_url, max_retries=self.max_retries, transfer=True)
+
+            if response is None:
+                if self.cancel_requested.is_set():
+                    self.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
+                    return
+                self.log(
+                    "FAILED_TO_DOWNLOAD_AFTER_ATTEMPTS",
+                    media_url=media_url,
+                    total=self.max_retries + 1,
+                )
+                with self.file_lock:
+                    self.failed_files.append(media_url)
+                return
+
+            disk_file = None
+            try:
+                if part is not None:
+                    # 206: the server still has the same file, continue the .part
+                    self.log("RESUMING_PART_FILE", media_url=media_url, downloaded_size=part.written)
+                    total_size = part.size
+                    offset = part.written
+                else:
+                    # 200: new file, or it changed since the .part was written
+                    total_size = int(response.headers.get("content-length", 0))
+                    offset = 0
+                    part = PartState.from_headers(media_url, total_size, response.headers)
+                # Rejected on the headers alone, before any of the body is read
+                if self._skip_by_size(media_url, final_path, total_size):
+                    response.close()
+                    return
+                self.disk_guard.adjust(space_claim, total_size - offset)
+                progress = {
+                    "downloaded": offset,
+                    "start_time": time.time(),
+                    "last_emit_time": 0.0,
+                    # Sidecar kept up to date while the body comes in, when a later run could resume
+                    "part": part if total_size and part.validator else None,
+                    "checkpoint_at": time.time(),
+                }
+                disk_file = self.disk_writer.open(
+                    part_path,
+                    size=total_size,
+                    resume=offset > 0,
+                    should_cancel=self.cancel_requested.is_set,
+                )
+
+                if not offset and self._download_segmented(media_url, response, disk_file, total_size, download_id):
+                    self._record_transfer(response.url, total_size, time.time() - progress["start_time"])
+                    self._commit_download(
+                        disk_file, final_path, media_url, total_size, user_id, post_id, on_finished=lambda path: self.single_flight.finish(media_url, flight, path)
+                    )
+                    handed_off = True
+                    return
+
+                stalled_url = self._receive_body(response, disk_file, media_url, total_size, download_id, progress)
+
+                resume_url = media_url
+                zero_progress_rounds = 0
+                while total_size and progress["downloaded"] < total_size:
+                    if not self._wait_while_paused():
+                        raise Exception("CANCELLATION_REQUESTED")
+
+                    if stalled_url:
+                        resume_url = self._switch_stalled_node(stalled_url, total_size) or resume_url
+                        stalled_url = None
+
+                    resume_headers = self.headers.copy()
+                    resume_headers["Range"] = f"bytes={progress['downloaded']}-"
+                    self.log(
+                        "RESUMING_DOWNLOAD_AT_BYTE",
+                        downloaded_size=progress["downloaded"],
+                        media_url=media_url,
+                    )
+
+                    part_response = self.safe_request(
+                        resume_url,
+                        max_retries=self.max_retries,
+                        headers=resume_headers,
+                        transfer=True,
+                    )
+                    if part_response is None:
+                        raise Exception("RESUMPTION_FAILED_AFTER_RETRIES")
+
+                    if part_response.status_code == 200:
+                        # Server ignored the Range header and sent the full file again
+                        progress["downloaded"] = 0
+                        offset = 0
+
+                    bytes_before_round = progress["downloaded"]
+                    stalled_url = self._receive_body(
+                        part_response, disk_file, media_url, total_size, download_id, progress
+                    )
+
+                    if progress["downloaded"] == bytes_before_round:
+                        zero_progress_rounds += 1
+                        if zero_progress_rounds >= 3:
+                            raise Exception("RESUME_NO_PROGRESS")
+                    else:
+                        zero_progress_rounds = 0
+
+                downloaded_size = progress["downloaded"]
+                if total_size > 0 and downloaded_size != total_size:
+                    raise Exception(
+                        self._translate_text(
+                            "FINAL_SIZE_MISMATCH",
+                            expected=total_size,
+                            actual=downloaded_size,
+                        )
+                    )
+
+                self._emit_progress_update(
+                    downloaded_size=downloaded_size,
+                    total_size=total_size,
+                    download_id=download_id,
+                    file_path=part_path,
+                    start_time=progress["start_time"],
+                    last_emit_time=progress["last_emit_time"],
+                    force=True,
+                )
+
+                self._record_transfer(response.url, downloaded_size - offset, time.time() - progress["start_time"])
+                self._commit_download(
+                    disk_file, final_path, media_url, total_size, user_id, post_id, on_finished=lambda path: self.single_flight.finish(media_url, flight, path)
+                )
+                handed_off = True
+
+            except Exception:
+                if disk_file is not None:
+                    self._keep_part(disk_file, progress)
+
+                if self.cancel_requested.is_set():
+                    self.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
+                    return
+
+                self.log(
+                    "FAILED_TO_DOWNLOAD_AFTER_ATTEMPTS",
+                    media_url=media_url,
+                    total=self.max_retries + 1,
+                )
+                with self.file_lock:
+                    self.failed_files.append(media_url)
+
+        finally:
+            self.disk_guard.release(space_claim)
+            if not handed_off:
+                self.single_flight.finish(media_url, flight)
+
+    def _http_pool_size(self):
+        # A worker holds up to segment_count connections to the same host
+        return max(self.max_workers * max(int(self.segment_count or 1), 1), self.per_domain_max_limit)
+
+    def set_http_backend(self, name):
+        """
+        Switches the HTTP backend. During a run the switch is queued for
+        when the run ends: closing the old backend would cut the transfers
+        still reading from its connections.
+        """
+        with self.run_lock:
+            if self.active_runs:
+                self.pending_http_backend = name
+                if name != self.session.name:
+                    self.log("HTTP_BACKEND_DEFERRED", backend=name)
+                return
+            self._switch_http_backend(name)
+
+    def _switch_http_backend(self, name):
+        backend = self.session.use_backend(name)
+        self.session.resize(self._http_pool_size())
+        if backend != name:
+            self.log("HTTP_BACKEND_UNAVAILABLE", backend=name, fallback=backend)
+
+    def _begin_run(self):
+        with self.run_lock:
+            self.active_runs += 1
+
+    def _end_run(self):
+        """Ends a run started with _begin_run, applying a backend switch queued meanwhile."""
+        with self.run_lock:
+            self.active_runs -= 1
+            if self.active_runs or self.pending_http_backend is None:
+                return
+            name, self.pending_http_backend = self.pending_http_backend, None
+            self._switch_http_backend(name)
+
+    def _apply_host_limits(self):
+        # Over HTTP/2 a host slot is a stream on a shared connection, so
+        # far more fit; the asyncio engine always uses HTTP/1.1 connections
+        if self.session.multiplexed and self.download_engine != "asyncio":
+            self.domain_locks.set_bounds(self.per_domain_stream_limit, self.per_domain_max_streams)
+        else:
+            self.domain_locks.set_bounds(self.per_domain_limit, self.per_domain_max_limit)
+
+    def _defer_media_job(self, retry, **job):
+        """Puts a job whose request must back off into the retry heap, freeing this worker."""
+        self.log(
+            "RETRY_DEFERRED",
+            media_url=job["media_url"],
+            delay=f"{retry.delay:.1f}",
+            attempt=retry.attempt + 1,
+        )
+        if not self.retry_scheduler.schedule(retry.delay, self.process_media_element, retry_attempt=retry.attempt, **job):
+            with self.file_lock:
+                self.failed_files.append(job["media_url"])
+
+    def _job_host(self, job):
+        # The host the file will come from, after any known-node routing
+        return urlparse(self._route_to_known_node(job["media_url"])).netloc.lower()
+
+    def _expected_size(self, job):
+        known = self.known_sizes.get(job["media_url"])
+        if known:
+            return known
+        cached = self.download_cache.get(job["media_url"])
+        if cached and cached[1]:
+            return cached[1]
+        return estimate_size(job["media_url"])
+
+    def _throttle(self, size):
+        # Waits for this run's share of the global bandwidth cap, if one is set
+        self.bandwidth_limiter.consume(size, self.bandwidth_priority, self.cancel_requested.is_set)
+
+    def _submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def _landed(self, media_url):
+        return media_url in self.download_cache or media_url in self.size_filtered
+
+    def _pin_target(self, job):
+        # Journaled jobs keep the folder and file name they were resolved with
+        media_folder, filename = self._media_target(
+            job["media_url"],
+            user_id=job.get("user_id"),
+            post_id=job.get("post_id"),
+            post_name=job.get("post_name"),
+            post_time=job.get("post_time"),
+            target_folder=job.get("target_folder"),
+            forced_filename=job.get("forced_filename"),
+        )
+        return dict(job, target_folder=media_folder, forced_filename=filename)
+
+    def _probe_size(self, job):
+        # One byte of the file, through the same per-host slots and cooldowns as the downloads
+        headers = self.headers.copy()
+        headers["Range"] = PROBE_RANGE
+        response = self.safe_request(job["media_url"], max_retries=0, headers=headers)
+        if response is None:
+            return None
+        try:
+            return response_size(response.status_code, response.headers)
+        finally:
+            response.close()
+
+    def _preflight(self, jobs):
+        """
+        With preflight_sizing on, asks for the size of every file of the
+        run that is not downloaded yet, several at a time, and reports the
+        run's total and whether it fits on the disk; when it does not, the
+        run is paused before the first transfer until the user resumes or
+        cancels it. The sizes then order
+        the run, feed the overall progress and ETA, and let disk-space
+        admission claim each file's real size.
+        """
+        self.known_sizes = {}
+        self.run_total_bytes = 0
+        self.run_landed_bytes = 0
+        if not self.preflight_sizing:
+            return
+
+        self.log("PREFLIGHT_STARTED", count=self.total_files)
+        self.session.resize(self._http_pool_size())
+        self._apply_host_limits()
+        unknown = 0
+        jobs = (job for job in jobs if not self._landed(job["media_url"]))
+        for job, size in probe_sizes(jobs, self._probe_size, self.preflight_workers, self.cancel_requested.is_set):
+            if size is None:
+                unknown += 1
+            else:
+                self.known_sizes[job["media_url"]] = size
+        if self.cancel_requested.is_set():
+            return
+
+        wanted = [
+            size
+            for media_url, size in self.known_sizes.items()
+            if self.size_filter.rejects(self._media_class(media_url), size) is None
+        ]
+        self.run_total_bytes = sum(wanted)
+        self.log(
+            "PREFLIGHT_TOTAL_SIZE",
+            size=f"{self.run_total_bytes / (1024 * 1024):.1f} MB",
+            files=len(wanted),
+            unknown=unknown,
+        )
+        free = self.disk_guard.free_bytes(self.download_folder)
+        if free is not None and self.run_total_bytes > free - self._disk_reserve_bytes():
+            self.log(
+                "PREFLIGHT_NOT_ENOUGH_SPACE",
+                size=f"{self.run_total_bytes / (1024 * 1024):.1f} MB",
+                free=f"{free / (1024 * 1024):.1f} MB",
+                reserve=f"{float(self.disk_reserve_mb):.1f} MB",
+            )
+            self.pause_gate.pause()
+            self._notify_pause_changed()
+
+    def _run_journaled(self, source, resolve, priority=PRIORITY_NORMAL, folder=None):
+        """
+        Runs the media jobs of source (the URL being downloaded) through
+        the job journal. A run of source cut short by a crash or a cancel
+        continues from the journal without calling resolve(); otherwise
+        resolve() returns the jobs, or None when there is nothing to
+        download, and they are journaled before the first one starts.
+        With retry_failed_only set, only the jobs the last run failed are
+        run again, and nothing is resolved. Returns what _run_media_jobs
+        returns, or None when nothing ran.
+        """
+        journal = self.job_journal
+        # The resolved list depends on the folder and on the media types picked
+        media_types = f"{int(self.download_images)}{int(self.download_videos)}{int(self.download_compressed)}"
+        source = f"{os.path.abspath(folder or self.download_folder)}|{media_types}|{source}"
+
+        if self.retry_failed_only:
+            journal.settle(source, self._landed)
+            states = (FAILED,)
+            self.total_files = journal.count(source, states)
+            if not self.total_files:
+                self.log("JOURNAL_NO_FAILED_JOBS")
+                return None
+            self.log("JOURNAL_RETRYING_FAILED", count=self.total_files)
+        elif journal.unfinished(source):
+            journal.settle(source, self._landed)
+            states = (PENDING, FAILED)
+            self.total_files = journal.count(source, states)
+            self.log("JOURNAL_RESUMING", count=self.total_files)
+        else:
+            jobs = resolve()
+            if jobs is None:
+                return None
+            # Numbered from 1 per post, in post order, whatever order the jobs run in
+            with self.counter_lock:
+                self.post_attachment_counter.clear()
+            states = (PENDING,)
+            self.total_files = journal.start(source, (self._pin_target(job) for job in jobs))
+
+        self.completed_files = 0
+        self._begin_run()
+        try:
+            self._preflight(journal.jobs(source, states))
+            finished = self._run_media_jobs(journal.jobs(source, states), priority=priority)
+        finally:
+            self._end_run()
+        journal.settle(source, self._landed, completed=finished)
+        return finished
+
+    def _run_media_jobs(self, jobs, priority=PRIORITY_NORMAL):
+        """
+        Runs process_media_element for every job (a dict of its keyword
+        arguments) on the configured engine. jobs may be any iterable; it
+        is consumed lazily, keeping only a small window of jobs submitted
+        ahead of the workers. priority weighs the run's share of the
+        bandwidth cap against other running downloads. Returns False when
+        the run stopped early because of a cancellation request.
+        """
+        self.bandwidth_priority = priority
+        jobs = schedule_jobs(
+            jobs,
+            self.download_order,
+            host_of=self._job_host,
+            size_of=self._expected_size,
+            lookahead=max(self.max_workers, 1) * self.schedule_lookahead_per_worker,
+        )
+        self._begin_run()
+        try:
+            self.session.resize(self._http_pool_size())
+            self._apply_host_limits()
+            self.disk_writer.reset_stats()
+            self._remove_stale_parts()
+
+            if self.download_engine == "asyncio":
+                engine = AsyncDownloadEngine(self)
+                if engine.available:
+                    self.log("ASYNC_ENGINE_STARTED", jobs=self.total_files)
+                    engine.run(jobs)
+                    return not self.cancel_requested.is_set()
+                self.log("ASYNC_ENGINE_UNAVAILABLE")
+
+            self.retry_scheduler = RetryScheduler(self._submit, should_cancel=self.cancel_requested.is_set)
+            jobs = iter(jobs)
+            pending = {}
+            while True:
+                # Looked up on every round: update_max_downloads may change it
+                window = max(self.max_workers, 1) * 2
+                while len(pending) < window:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pending[self._submit(self.process_media_element, **job)] = job["media_url"]
+                self.futures = tuple(pending)
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                if self.cancel_requested.is_set():
+                    return False
+                for future in done:
+                    media_url = pending.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        # An error no handler expected (a folder that cannot be
+                        # created, say) fails its own file, not the whole run
+                        self.log("MEDIA_JOB_FAILED", media_url=media_url, error=e)
+                        with self.file_lock:
+                            self.failed_files.append(media_url)
+
+            # Deferred retries run after their first attempt's future is done
+            return self.retry_scheduler.join()
+        finally:
+            if self.retry_scheduler is not None:
+                self.retry_scheduler.close()
+                self.retry_scheduler = None
+            # Every completed file is synced, renamed and recorded before the run ends
+            self.disk_writer.drain()
+            self._log_host_limits()
+            self._log_disk_stats()
+            self._end_run()
+
+    def update_max_downloads(self, new_max):
+        try:
+            new_max = int(new_max)
+        except (TypeError, ValueError):
+            return
+
+        if new_max < 1:
+            new_max = 1
+
+        self.max_workers = new_max
+
+        # Resized in place: extra workers start at once, surplus ones retire
+        # after their current file, and the host limits keep their state.
+        # Never blocks, since this runs on the UI thread.
+        self.executor.resize(new_max)
+        self.session.resize(self._http_pool_size())
+
+        self.log(
+            "UPDATED_MAX_WORKERS",
+            new_max=new_max,
+            per_domain_limit=self.per_domain_limit,
+        )
\ No newline at end of file
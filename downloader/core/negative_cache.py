@@ -0,0 +1,126 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class NegativeCache:
+    """
+    Persisted list of media files that no data node could serve. A file
+    is skipped until its entry expires; every further failure doubles the
+    wait (ttl_seconds, 2x, 4x, ... up to max_ttl_seconds) so permanently
+    dead files cost almost nothing while temporarily missing ones are
+    retried soon. Entries are keyed by site and /data path, so the same
+    file is recognised whichever node the URL points at.
+
+    Any storage failure silently disables persistence; the cache then
+    only remembers failures for the current session.
+    """
+
+    COLUMNS = ["media_key", "status_code", "attempts", "first_seen", "last_seen"]
+    NODE_RE = re.compile(r"^n\d+\.", re.IGNORECASE)
+
+    def __init__(
+        self,
+        db_path="resources/config/downloads.db",
+        table="dead_media",
+        ttl_seconds=24 * 3600,
+        max_ttl_seconds=30 * 24 * 3600,
+    ):
+        self.db_path = db_path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_ttl_seconds = max_ttl_seconds
+
+        self.lock = threading.Lock()
+        self.entries = {}
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cols = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")]
+                if cols and cols != self.COLUMNS:
+                    conn.execute(f"DROP TABLE {self.table}")
+
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    "media_key TEXT PRIMARY KEY, status_code INTEGER, attempts INTEGER, "
+                    "first_seen REAL, last_seen REAL)"
+                )
+                conn.commit()
+
+                for key, status_code, attempts, first_seen, last_seen in conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM {self.table}"
+                ):
+                    self.entries[key] = [status_code, attempts, first_seen, last_seen]
+            finally:
+                conn.close()
+            self.available = True
+        except Exception:
+            self.available = False
+
+    @classmethod
+    def key_for(cls, url):
+        parsed = urlparse(url)
+        site = cls.NODE_RE.sub("", parsed.netloc.lower())
+        path = parsed.path if parsed.path.startswith("/data/") else "/data" + parsed.path
+        return f"{site}{path}"
+
+    def _expiry(self, attempts, last_seen):
+        backoff = self.ttl_seconds * (2 ** max(attempts - 1, 0))
+        return last_seen + min(backoff, self.max_ttl_seconds)
+
+    def lookup(self, url):
+        """Returns (status_code, attempts, retry_at) while url is known dead, else None."""
+        with self.lock:
+            entry = self.entries.get(self.key_for(url))
+        if entry is None:
+            return None
+
+        status_code, attempts, _, last_seen = entry
+        retry_at = self._expiry(attempts, last_seen)
+        if time.time() >= retry_at:
+            return None
+        return status_code, attempts, retry_at
+
+    def record(self, url, status_code):
+        key = self.key_for(url)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = [status_code, 0, now, now]
+                self.entries[key] = entry
+            entry[0] = status_code
+            entry[1] += 1
+            entry[3] = now
+            row = (key, *entry)
+
+        self._execute(
+            f"INSERT OR REPLACE INTO {self.table} ({', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            row,
+        )
+
+    def forget(self, url):
+        key = self.key_for(url)
+        with self.lock:
+            if self.entries.pop(key, None) is None:
+                return
+
+        self._execute(f"DELETE FROM {self.table} WHERE media_key = ?", (key,))
+
+    def _execute(self, sql, params):
+        if not self.available:
+            return
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute(sql, params)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,153 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class NodeAffinityStore:
+    """
+    Remembers which data node (n1, n2, ...) serves each /data/xx/yy shard
+    of a site, with per-node success rate and measured throughput, so a
+    new session can go straight to the node that served that shard last
+    time instead of paying a 404 and a probe per file.
+
+    Counters are kept in memory and written to downloads.db at most every
+    flush_interval seconds (and on flush()). Any storage failure silently
+    disables persistence; predictions then only use the current session.
+    """
+
+    COLUMNS = ["site", "shard", "node", "successes", "misses", "bytes", "seconds", "updated_at"]
+    SHARD_RE = re.compile(r"^(?:/data)?/([0-9a-f]{2})/([0-9a-f]{2})/", re.IGNORECASE)
+    NODE_RE = re.compile(r"^n\d+\.", re.IGNORECASE)
+
+    def __init__(self, db_path="resources/config/downloads.db", table="node_affinity", flush_interval=10.0):
+        self.db_path = db_path
+        self.table = table
+        self.flush_interval = flush_interval
+
+        self.lock = threading.Lock()
+        self.entries = {}
+        # (site, shard) -> {node: entry}, the same lists as entries, so a lookup reads one shard
+        self.shards = {}
+        self.dirty = set()
+        self.last_flush = time.time()
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cols = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")]
+                if cols and cols != self.COLUMNS:
+                    conn.execute(f"DROP TABLE {self.table}")
+
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    "site TEXT, shard TEXT, node TEXT, successes INTEGER, misses INTEGER, "
+                    "bytes REAL, seconds REAL, updated_at REAL, PRIMARY KEY (site, shard, node))"
+                )
+                conn.commit()
+
+                for site, shard, node, successes, misses, size, seconds, _ in conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM {self.table}"
+                ):
+                    self._add_entry((site, shard, node), [successes, misses, size, seconds])
+            finally:
+                conn.close()
+            self.available = True
+        except Exception:
+            self.available = False
+
+    def _add_entry(self, key, entry):
+        # Called with the lock held, or before the store is shared
+        self.entries[key] = entry
+        self.shards.setdefault(key[:2], {})[key[2]] = entry
+        return entry
+
+    @classmethod
+    def shard_of(cls, url):
+        """Returns (site, shard, node) for a data-node URL; node is None for the main host."""
+        parsed = urlparse(url)
+        match = cls.SHARD_RE.match(parsed.path)
+        if not match:
+            return None
+
+        host = parsed.netloc.lower()
+        node = host if cls.NODE_RE.match(host) else None
+        site = cls.NODE_RE.sub("", host)
+        return site, f"/data/{match.group(1).lower()}/{match.group(2).lower()}", node
+
+    def predict(self, url):
+        """Returns the best known node host for url's shard, or None."""
+        key = self.shard_of(url)
+        if key is None:
+            return None
+        best = None
+        best_score = None
+        with self.lock:
+            for node, (successes, misses, size, seconds) in self.shards.get(key[:2], {}).items():
+                if successes < 1:
+                    continue
+
+                success_rate = (successes + 1) / (successes + misses + 2)
+                if success_rate < 0.5:
+                    continue
+
+                throughput = size / seconds if seconds > 0 else 0.0
+                score = (round(success_rate, 1), throughput)
+                if best_score is None or score > best_score:
+                    best, best_score = node, score
+        return best
+
+    def _update(self, url, successes=0, misses=0, size=0, seconds=0.0):
+        key = self.shard_of(url)
+        if key is None or key[2] is None:
+            return
+
+        with self.lock:
+            entry = self.entries.get(key) or self._add_entry(key, [0, 0, 0.0, 0.0])
+            entry[0] += successes
+            entry[1] += misses
+            entry[2] += size
+            entry[3] += seconds
+            self.dirty.add(key)
+            due = time.time() - self.last_flush >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def record_success(self, url):
+        self._update(url, successes=1)
+
+    def record_miss(self, url):
+        self._update(url, misses=1)
+
+    def record_transfer(self, url, size, seconds):
+        if size > 0 and seconds > 0:
+            self._update(url, size=size, seconds=seconds)
+
+    def flush(self):
+        with self.lock:
+            self.last_flush = time.time()
+            rows = [
+                (site, shard, node, *self.entries[(site, shard, node)], self.last_flush)
+                for site, shard, node in self.dirty
+            ]
+            self.dirty.clear()
+
+        if not self.available or not rows:
+            return
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} ({', '.join(self.COLUMNS)}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import time
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".json"
+# How often a transfer records its progress in the sidecar
+CHECKPOINT_SECONDS = 5.0
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)", re.IGNORECASE)
+
+
+class PartState:
+    """
+    Sidecar of a .part file (<name>.part.json): the URL it comes from,
+    the expected size, the server's validator (ETag or Last-Modified)
+    and how many bytes from the start are known to be on disk. A later
+    run uses it to ask for the rest with Range and If-Range; the server
+    answers 206 only if the file is still the same, 200 otherwise.
+    """
+
+    def __init__(self, url, size, etag=None, last_modified=None, written=0):
+        self.url = url
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.written = written
+
+    @classmethod
+    def from_headers(cls, url, size, headers, written=0):
+        return cls(url, size, headers.get("etag"), headers.get("last-modified"), written)
+
+    @staticmethod
+    def path_for(part_path):
+        return part_path + STATE_SUFFIX
+
+    @classmethod
+    def load(cls, part_path):
+        try:
+            with open(cls.path_for(part_path), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(
+                data["url"],
+                int(data["size"]),
+                data.get("etag"),
+                data.get("last_modified"),
+                int(data.get("written", 0)),
+            )
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def save(self, part_path):
+        path = self.path_for(part_path)
+        data = {
+            "url": self.url,
+            "size": self.size,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "written": self.written,
+            "updated_at": time.time(),
+        }
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def record(self, part_path, written):
+        """Saves written as the bytes on disk; a sidecar that cannot be written only costs the resume."""
+        self.written = written
+        try:
+            self.save(part_path)
+        except OSError:
+            pass
+
+    @classmethod
+    def remove(cls, part_path):
+        try:
+            os.remove(cls.path_for(part_path))
+        except OSError:
+            pass
+
+    @property
+    def validator(self):
+        # If-Range only accepts strong ETags
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    def resume_headers(self):
+        """Range and If-Range headers asking for the rest of the file, or None if it cannot be checked."""
+        if not self.validator or self.written <= 0 or self.written >= self.size:
+            return None
+        return {"Range": f"bytes={self.written}-", "If-Range": self.validator}
+
+    def continues(self, status_code, headers):
+        """True when a response to resume_headers() carries the rest of this very file."""
+        if status_code != 206:
+            return False
+        match = _CONTENT_RANGE.match(headers.get("content-range", "").strip())
+        if not match or int(match.group(1)) != self.written:
+            return False
+        return match.group(3) == "*" or int(match.group(3)) == self.size
+
+
+def resumable_part(part_path, url):
+    """PartState of part_path if it holds the start of url with a validator to check, otherwise None."""
+    state = PartState.load(part_path)
+    if state is None or state.url != url or state.resume_headers() is None:
+        return None
+    try:
+        if os.path.getsize(part_path) < state.written:
+            return None
+    except OSError:
+        return None
+    return state
+
+
+def remove_stale_parts(folder, max_age_seconds, now=None):
+    """
+    Deletes the .part files under folder, with their sidecars, that no
+    transfer has touched for max_age_seconds, and sidecars left without
+    a .part. Returns how many parts were removed.
+    """
+    if not folder or max_age_seconds <= 0 or not os.path.isdir(folder):
+        return 0
+    cutoff = (now or time.time()) - max_age_seconds
+    removed = 0
+
+    pending = [folder]
+    while pending:
+        try:
+            entries = list(os.scandir(pending.pop()))
+        except OSError:
+            continue
+        names = {entry.name for entry in entries}
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                    continue
+                if entry.name.endswith(PART_SUFFIX):
+                    # The sidecar is rewritten on every checkpoint, so it is the newer of the two
+                    last_touched = entry.stat().st_mtime
+                    if entry.name + STATE_SUFFIX in names:
+                        last_touched = max(last_touched, os.path.getmtime(PartState.path_for(entry.path)))
+                    if last_touched < cutoff:
+                        os.remove(entry.path)
+                        PartState.remove(entry.path)
+                        removed += 1
+                elif entry.name.endswith(PART_SUFFIX + STATE_SUFFIX):
+                    if entry.name[: -len(STATE_SUFFIX)] not in names and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+            except OSError:
+                continue
+    return removed
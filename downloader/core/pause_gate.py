@@ -0,0 +1,32 @@
+import threading
+
+
+class PauseGate:
+    """
+    Pause switch shared by a downloader's workers. Transfers look at
+    `paused` between chunks: when it is set they close their response,
+    keep the .part file and the offset they reached, and block in wait()
+    until resume(), then carry on with a Range request from that offset.
+    Jobs that have not started yet wait before their first request.
+    """
+
+    def __init__(self):
+        self.running = threading.Event()
+        self.running.set()
+
+    @property
+    def paused(self):
+        return not self.running.is_set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def wait(self, should_cancel=None, poll_interval=0.25):
+        """Blocks while paused; returns False if should_cancel() turned true first."""
+        while not self.running.wait(poll_interval):
+            if callable(should_cancel) and should_cancel():
+                return False
+        return True
@@ -0,0 +1,55 @@
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Range asked for by a size probe: one byte, so the server sends headers and next to no body
+PROBE_RANGE = "bytes=0-0"
+
+_CONTENT_RANGE_TOTAL = re.compile(r"/(\d+)\s*$")
+
+
+def response_size(status_code, headers):
+    """Size of the whole file behind a response to a PROBE_RANGE request, or None if it is not given."""
+    if status_code == 206:
+        match = _CONTENT_RANGE_TOTAL.search(headers.get("content-range", ""))
+        return int(match.group(1)) if match else None
+    try:
+        size = int(headers.get("content-length") or 0)
+    except (TypeError, ValueError):
+        return None
+    return size or None
+
+
+def probe_sizes(jobs, probe, workers=8, should_cancel=None):
+    """
+    Yields (job, size) for every job, size being probe(job) (None when
+    unknown), with up to workers probes running at once. Per-host limits
+    are left to probe, which goes through the downloader's own request
+    path. jobs may be any iterable and is read lazily, a small window
+    ahead of the probes; pairs come out in completion order. Stops early
+    once should_cancel() is true.
+    """
+    workers = max(int(workers or 1), 1)
+    jobs = iter(jobs)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="SizeProbe") as executor:
+        pending = {}
+        while True:
+            while len(pending) < workers * 2:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending[executor.submit(probe, job)] = job
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            if callable(should_cancel) and should_cancel():
+                for future in pending:
+                    future.cancel()
+                return
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    size = future.result()
+                except Exception:
+                    size = None
+                yield job, size
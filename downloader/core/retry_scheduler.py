@@ -0,0 +1,136 @@
+import heapq
+import itertools
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class DeferredRetry(Exception):
+    """Raised by safe_request(defer=True): retry attempt `attempt` after `delay` seconds."""
+
+    def __init__(self, delay, attempt):
+        super().__init__(f"retry in {delay:.1f}s")
+        self.delay = delay
+        self.attempt = attempt
+
+
+def parse_retry_after(value):
+    """Returns the Retry-After header value in seconds, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class RetryBudget:
+    """Caps how many retries a whole run may spend, so a dying host fails fast."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.spent = 0
+        self.lock = threading.Lock()
+
+    def try_spend(self):
+        with self.lock:
+            if self.limit is not None and self.spent >= self.limit:
+                return False
+            self.spent += 1
+            return True
+
+    @property
+    def exhausted(self):
+        with self.lock:
+            return self.limit is not None and self.spent >= self.limit
+
+
+class RetryScheduler:
+    """
+    Delay heap for retries. Instead of sleeping on a worker thread (and
+    its domain slot), a job that must wait is scheduled here and handed
+    back to `submit` (normally executor.submit) once it is due. join()
+    waits until every scheduled job, and anything those jobs schedule in
+    turn, has run.
+    """
+
+    def __init__(self, submit, should_cancel=None):
+        self.submit = submit
+        self.should_cancel = should_cancel
+
+        self.heap = []
+        self.sequence = itertools.count()
+        self.outstanding = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def _cancelled(self):
+        return callable(self.should_cancel) and self.should_cancel()
+
+    def schedule(self, delay, fn, *args, **kwargs):
+        with self.condition:
+            if self.closed:
+                return False
+            heapq.heappush(self.heap, (time.time() + max(delay, 0.0), next(self.sequence), fn, args, kwargs))
+            self.outstanding += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+        return True
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.closed:
+                        return
+                    if self._cancelled():
+                        self._drop_pending()
+                    if self.heap and self.heap[0][0] <= time.time():
+                        break
+                    timeout = self.heap[0][0] - time.time() if self.heap else 0.5
+                    self.condition.wait(min(max(timeout, 0.01), 0.5))
+                _, _, fn, args, kwargs = heapq.heappop(self.heap)
+
+            try:
+                future = self.submit(fn, *args, **kwargs)
+            except Exception:
+                self._job_done()
+                continue
+            future.add_done_callback(lambda _: self._job_done())
+
+    def _drop_pending(self):
+        self.outstanding -= len(self.heap)
+        self.heap.clear()
+        self.condition.notify_all()
+
+    def _job_done(self):
+        with self.condition:
+            self.outstanding -= 1
+            self.condition.notify_all()
+
+    def pending(self):
+        with self.condition:
+            return len(self.heap)
+
+    def join(self):
+        """Waits for all scheduled work; returns False if cancelled first."""
+        with self.condition:
+            while self.outstanding > 0:
+                if self._cancelled():
+                    self._drop_pending()
+                    return False
+                self.condition.wait(0.5)
+        return not self._cancelled()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self._drop_pending()
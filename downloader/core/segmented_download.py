@@ -0,0 +1,338 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+import requests
+
+from downloader.core.body_reader import BodyReader
+
+
+def split_ranges(total_size, segment_count):
+    """Splits [0, total_size) into inclusive (start, end) byte ranges."""
+    segment_count = max(1, min(int(segment_count), total_size))
+    base = total_size // segment_count
+    ranges = []
+    start = 0
+    for index in range(segment_count):
+        end = total_size - 1 if index == segment_count - 1 else start + base - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+class SegmentAborted(Exception):
+    pass
+
+
+class RangeFailed(Exception):
+    """A byte range gave up at `position`, the first byte not yet written."""
+
+    def __init__(self, position, reason):
+        super().__init__(reason)
+        self.position = position
+
+
+class SegmentedDownload:
+    """
+    Downloads a single file as several byte-range segments in parallel,
+    each one written at its own offset of disk_file (a DiskFile opened at
+    the full size; the caller commits or discards it).
+
+    open_range(start, end) must return a streamed response for that
+    inclusive range (or None when every retry failed). Responses that are
+    already open can be handed in through initial_responses, keyed by
+    segment index, so the request that discovered the file size is not
+    wasted. A segment that drops mid-way is re-requested from the byte it
+    reached; it fails only after max_retries rounds without progress.
+    With a pause_gate, segments close their response at the next chunk
+    while it is paused and re-request from there once it is resumed.
+    transfer_slot(response), when given, returns a context manager held
+    while that response's body is read, for the per-host limits.
+    """
+
+    def __init__(
+        self,
+        disk_file,
+        total_size,
+        segments,
+        open_range,
+        should_cancel=None,
+        on_progress=None,
+        throttle=None,
+        pause_gate=None,
+        max_retries=3,
+        initial_responses=None,
+        chunk_size=1048576,
+        transfer_slot=None,
+    ):
+        self.disk_file = disk_file
+        self.total_size = total_size
+        self.segments = segments
+        self.open_range = open_range
+        self.should_cancel = should_cancel
+        self.on_progress = on_progress
+        self.throttle = throttle
+        self.pause_gate = pause_gate
+        self.max_retries = max_retries
+        self.initial_responses = dict(initial_responses or {})
+        self.chunk_size = chunk_size
+        self.transfer_slot = transfer_slot
+
+        self.downloaded = 0
+        self.progress_lock = threading.Lock()
+        self.abort = threading.Event()
+
+    def run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.segments)) as pool:
+                futures = [
+                    pool.submit(self._run_segment, index, start, end)
+                    for index, (start, end) in enumerate(self.segments)
+                ]
+
+                first_error = None
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except SegmentAborted:
+                        pass
+                    except Exception as e:
+                        if first_error is None:
+                            first_error = e
+                            self.abort.set()
+
+                if first_error is not None:
+                    raise first_error
+        finally:
+            for response in self.initial_responses.values():
+                response.close()
+            self.initial_responses.clear()
+
+        return self.downloaded
+
+    def _check_stop(self):
+        if callable(self.should_cancel) and self.should_cancel():
+            raise Exception("CANCELLATION_REQUESTED")
+        if self.abort.is_set():
+            raise SegmentAborted()
+
+    def _wait_if_paused(self):
+        if self.pause_gate is not None and not self.pause_gate.wait(self.should_cancel):
+            raise Exception("CANCELLATION_REQUESTED")
+
+    def _add_progress(self, size):
+        with self.progress_lock:
+            self.downloaded += size
+            if self.on_progress:
+                self.on_progress(self.downloaded)
+
+    def _run_segment(self, index, start, end):
+        response = self.initial_responses.pop(index, None)
+        self._fetch_range(start, end, self.open_range, response)
+
+    def _fetch_range(self, start, end, open_range, response=None):
+        position = start
+        rounds_without_progress = 0
+
+        while position <= end:
+            self._check_stop()
+
+            if response is None:
+                self._wait_if_paused()
+                response = open_range(position, end)
+                if response is None:
+                    raise RangeFailed(position, "RESUMPTION_FAILED_AFTER_RETRIES")
+                if response.status_code != 206:
+                    response.close()
+                    raise RangeFailed(position, "SEGMENT_RANGE_NOT_HONORED")
+
+            bytes_before_round = position
+            reader = BodyReader(response, max_chunk_size=self.chunk_size, buffers=self.disk_file.pool.buffers)
+
+            try:
+                with self.transfer_slot(response) if self.transfer_slot else nullcontext():
+                    # Capped at the range end: the first segment may reuse a full-file response
+                    for chunk in reader.chunks(limit=end + 1 - position):
+                        self.disk_file.write(chunk, position)
+                        position += len(chunk)
+                        self._add_progress(len(chunk))
+                        self._check_stop()
+                        if self.throttle:
+                            self.throttle(len(chunk))
+                        if self.pause_gate is not None and self.pause_gate.paused:
+                            # Closed below; re-requested from here on resume
+                            break
+            except requests.exceptions.RequestException:
+                # Dropped mid-segment: re-request from the current byte
+                pass
+            finally:
+                response.close()
+                response = None
+
+            if position == bytes_before_round:
+                rounds_without_progress += 1
+                if rounds_without_progress > self.max_retries:
+                    raise RangeFailed(position, "RESUME_NO_PROGRESS")
+            else:
+                rounds_without_progress = 0
+
+        return position
+
+
+class MirroredDownload(SegmentedDownload):
+    """
+    Downloads a single file from several mirrors at once. Every mirror
+    gets one worker that keeps cutting its next piece off the front of
+    the remaining ranges, sized to about piece_seconds of transfer at the
+    speed that mirror has shown so far (between chunk_size and
+    piece_size). Faster mirrors therefore serve more of the file, slow
+    ones never hold a large piece at the end, and no mirror sees more
+    than one connection. A mirror that fails a piece is retired and the
+    unfinished part of that piece goes back to the queue for the others.
+
+    sources is a list of open_range callables, one per mirror. An already
+    open response for the start of the file can be handed to one of them
+    through initial_response=(source_index, response).
+    """
+
+    def __init__(
+        self,
+        disk_file,
+        total_size,
+        sources,
+        piece_size=4 * 1048576,
+        piece_seconds=2.0,
+        should_cancel=None,
+        on_progress=None,
+        throttle=None,
+        pause_gate=None,
+        max_retries=3,
+        initial_response=None,
+        chunk_size=1048576,
+        transfer_slot=None,
+    ):
+        super().__init__(
+            disk_file,
+            total_size,
+            [(0, total_size - 1)],
+            open_range=None,
+            should_cancel=should_cancel,
+            on_progress=on_progress,
+            throttle=throttle,
+            pause_gate=pause_gate,
+            max_retries=max_retries,
+            chunk_size=chunk_size,
+            transfer_slot=transfer_slot,
+        )
+        self.sources = list(sources)
+        self.piece_size = max(piece_size, chunk_size)
+        self.piece_seconds = piece_seconds
+        self.initial_response = initial_response
+
+        self.pending = deque(self.segments)
+        self.in_flight = 0
+        self.queue_condition = threading.Condition()
+        self.source_stats = [{"bytes": 0, "pieces": 0, "seconds": 0.0, "failed": False} for _ in self.sources]
+
+    def run(self):
+        first_piece = {}
+        if self.initial_response is not None:
+            source_index, response = self.initial_response
+            first_piece[source_index] = (self._take_piece(self.piece_size), response)
+            self.in_flight += 1
+            self.initial_response = None
+
+        last_error = None
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.sources)) as pool:
+                futures = [
+                    pool.submit(self._run_source, index, first_piece.pop(index, None))
+                    for index in range(len(self.sources))
+                ]
+
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except SegmentAborted:
+                        pass
+                    except RangeFailed as e:
+                        last_error = e
+                    except Exception as e:
+                        if last_error is None or isinstance(last_error, RangeFailed):
+                            last_error = e
+                        self.abort.set()
+                        with self.queue_condition:
+                            self.queue_condition.notify_all()
+        finally:
+            for _, response in first_piece.values():
+                response.close()
+
+        if self.pending or self.downloaded != self.total_size:
+            raise last_error or Exception("RESUMPTION_FAILED_AFTER_RETRIES")
+
+        return self.downloaded
+
+    def _piece_size_for(self, stats):
+        if stats["seconds"] <= 0:
+            return self.chunk_size
+        speed = stats["bytes"] / stats["seconds"]
+        return int(min(self.piece_size, max(self.chunk_size, speed * self.piece_seconds)))
+
+    def _take_piece(self, size):
+        start, end = self.pending.popleft()
+        if end - start + 1 > size:
+            self.pending.appendleft((start + size, end))
+            end = start + size - 1
+        return start, end
+
+    def _next_piece(self, size):
+        with self.queue_condition:
+            while not self.pending and self.in_flight > 0:
+                self._check_stop()
+                # Another mirror may still hand back the rest of its piece
+                self.queue_condition.wait(0.5)
+            if not self.pending:
+                return None
+            self.in_flight += 1
+            return self._take_piece(size)
+
+    def _finish_piece(self, leftover=None):
+        with self.queue_condition:
+            self.in_flight -= 1
+            if leftover is not None:
+                self.pending.appendleft(leftover)
+            self.queue_condition.notify_all()
+
+    def _run_source(self, index, first_piece=None):
+        open_range = self.sources[index]
+        stats = self.source_stats[index]
+
+        while True:
+            if first_piece is not None:
+                (start, end), response = first_piece
+                first_piece = None
+            else:
+                piece = self._next_piece(self._piece_size_for(stats))
+                if piece is None:
+                    return
+                (start, end), response = piece, None
+
+            piece_started = time.time()
+            try:
+                self._fetch_range(start, end, open_range, response)
+            except RangeFailed as e:
+                stats["bytes"] += e.position - start
+                stats["seconds"] += time.time() - piece_started
+                stats["failed"] = True
+                self._finish_piece((e.position, end))
+                raise
+            except BaseException:
+                self._finish_piece()
+                raise
+
+            stats["bytes"] += end + 1 - start
+            stats["pieces"] += 1
+            stats["seconds"] += time.time() - piece_started
+            self._finish_piece()
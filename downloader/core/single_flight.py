@@ -0,0 +1,54 @@
+import threading
+
+
+class Flight:
+    """One in-flight download; result is its final path, or None if it failed."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+    def wait(self, should_cancel=None, poll_interval=0.25):
+        """Blocks until the flight lands; returns False if cancelled first."""
+        while not self.done.wait(poll_interval):
+            if callable(should_cancel) and should_cancel():
+                return False
+        return True
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent downloads of the same key (media URL). The first
+    caller of begin() leads and must call finish() exactly once; callers
+    arriving while it is in flight get the same Flight to wait on instead
+    of starting a second transfer. Keys are spread over striped locks, so
+    workers handling different URLs do not contend on a single lock.
+    """
+
+    def __init__(self, stripes=64):
+        self.stripes = [threading.Lock() for _ in range(stripes)]
+        self.flights = {}
+
+    def _lock(self, key):
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    def begin(self, key):
+        """Returns (flight, leader); leader is True when the caller must do the work."""
+        with self._lock(key):
+            flight = self.flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = Flight()
+            self.flights[key] = flight
+            return flight, True
+
+    def finish(self, key, flight, result=None):
+        with self._lock(key):
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.result = result
+        flight.done.set()
+
+    def __contains__(self, key):
+        with self._lock(key):
+            return key in self.flights
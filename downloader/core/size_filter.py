@@ -0,0 +1,81 @@
+import re
+
+MEDIA_CLASSES = ("images", "videos", "compressed")
+
+_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+_SIZE = re.compile(r"^(\d+(?:\.\d+)?)\s*([kmg]?)i?b?$", re.IGNORECASE)
+
+
+def parse_size(text):
+    """Bytes in text such as "50K", "500 MB" or "1.5G" (a plain number is bytes); 0 when empty."""
+    text = (text or "").strip()
+    if not text:
+        return 0
+    match = _SIZE.match(text)
+    if not match:
+        raise ValueError(f"invalid size: {text!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def parse_size_range(text):
+    """
+    (min_bytes, max_bytes) from "MIN-MAX", either side of which may be
+    left out ("50K-", "-500M"); 0 leaves that side open and an empty
+    text is no filter. Raises ValueError when the range makes no sense.
+    """
+    text = (text or "").strip()
+    if not text:
+        return 0, 0
+    if "-" not in text:
+        raise ValueError(f"invalid size range: {text!r}")
+    low, high = text.split("-", 1)
+    minimum, maximum = parse_size(low), parse_size(high)
+    if maximum and minimum > maximum:
+        raise ValueError(f"invalid size range: {text!r}")
+    return minimum, maximum
+
+
+def format_size(size):
+    for unit, factor in (("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024)):
+        if size >= factor:
+            return f"{size / factor:.1f} {unit}"
+    return f"{size} B"
+
+
+class SizeFilter:
+    """
+    Size range allowed for each media class (images, videos, compressed),
+    inclusive at both ends. Checked against the size the server states
+    in its response headers, before any of the body is read, so a file
+    outside its range costs one request and no transfer. A file whose
+    size is not given, or whose class has no range, is let through.
+    """
+
+    def __init__(self, ranges=None):
+        self.ranges = {
+            media_class: tuple(bounds)
+            for media_class, bounds in (ranges or {}).items()
+            if media_class in MEDIA_CLASSES and any(bounds)
+        }
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Reads the size_range_<class> settings; a range that does not parse is ignored."""
+        ranges = {}
+        for media_class in MEDIA_CLASSES:
+            try:
+                ranges[media_class] = parse_size_range(settings.get(f"size_range_{media_class}", ""))
+            except ValueError:
+                continue
+        return cls(ranges)
+
+    def rejects(self, media_class, size):
+        """None if a file of media_class and size is wanted, otherwise (reason key, bound in bytes)."""
+        if not size or media_class not in self.ranges:
+            return None
+        minimum, maximum = self.ranges[media_class]
+        if minimum and size < minimum:
+            return "SIZE_BELOW_MINIMUM", minimum
+        if maximum and size > maximum:
+            return "SIZE_ABOVE_MAXIMUM", maximum
+        return None
@@ -0,0 +1,65 @@
+import tempfile
+import threading
+
+
+class SpillList:
+    """
+    Append-only list of strings (skipped and failed files) whose memory
+    stays flat however long a run gets: the first keep_in_memory items
+    are held as usual, later ones go to an anonymous temporary file that
+    is deleted when the list is. len() is a plain counter and iterating
+    yields every item in order, so callers use it like a list.
+    """
+
+    def __init__(self, keep_in_memory=1000):
+        self.keep_in_memory = keep_in_memory
+        self.lock = threading.Lock()
+        self.items = []
+        self.count = 0
+        self.spill = None
+
+    def append(self, item):
+        line = str(item).replace("\n", " ")
+        with self.lock:
+            self.count += 1
+            if len(self.items) < self.keep_in_memory:
+                self.items.append(line)
+                return
+            if self.spill is None:
+                self.spill = tempfile.TemporaryFile("w+b")
+            self.spill.write(line.encode("utf-8") + b"\n")
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def __iter__(self):
+        with self.lock:
+            items = list(self.items)
+        yield from items
+
+        position = 0
+        while True:
+            # Read back in blocks so iterating does not load the whole file
+            with self.lock:
+                if self.spill is None:
+                    return
+                self.spill.flush()
+                self.spill.seek(position)
+                lines = self.spill.readlines(65536)
+                position = self.spill.tell()
+                self.spill.seek(0, 2)
+            if not lines:
+                return
+            for line in lines:
+                yield line.rstrip(b"\n").decode("utf-8")
+
+    def clear(self):
+        with self.lock:
+            self.items = []
+            self.count = 0
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
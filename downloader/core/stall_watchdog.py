@@ -0,0 +1,130 @@
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def abort_response(response):
+    """
+    Shuts down the socket under a streamed requests response, so a read
+    blocked in another thread fails at once instead of waiting for the
+    read timeout. The reading thread still closes the response itself.
+    Responses of other transports provide their own abort().
+    """
+    abort = getattr(response, "abort", None)
+    if callable(abort):
+        abort()
+        return True
+
+    raw = getattr(response, "raw", None)
+    sock = getattr(getattr(raw, "_connection", None), "sock", None)
+    if sock is None:
+        fp = getattr(getattr(raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    if sock is None:
+        return False
+
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    return True
+
+
+class TransferWatch:
+    """Byte counter for one streamed response; add() is called by the reading thread."""
+
+    def __init__(self, response):
+        self.response = response
+        self.bytes = 0
+        self.samples = deque([(time.time(), 0)])
+        self.stalled = False
+        self.speed = 0.0
+
+    def add(self, size):
+        self.bytes += size
+
+
+class StallWatchdog:
+    """
+    Catches connections that degrade without dropping. A single monitor
+    thread samples every watched transfer each check_interval seconds;
+    one that received less than min_bytes_per_second on average over the
+    last window_seconds is marked stalled and its socket is shut down,
+    so the reader gets an error it can recover from with a Range resume.
+    A min_bytes_per_second of 0 disables the watchdog.
+    """
+
+    def __init__(self, min_bytes_per_second=16 * 1024, window_seconds=30.0, check_interval=1.0):
+        self.min_bytes_per_second = min_bytes_per_second
+        self.window_seconds = window_seconds
+        self.check_interval = check_interval
+
+        self.lock = threading.Lock()
+        self.watches = set()
+        self.thread = None
+
+    @contextmanager
+    def watch(self, response):
+        transfer = TransferWatch(response)
+        if not self.min_bytes_per_second or self.min_bytes_per_second <= 0:
+            yield transfer
+            return
+
+        with self.lock:
+            self.watches.add(transfer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+        try:
+            yield transfer
+        finally:
+            with self.lock:
+                self.watches.discard(transfer)
+
+    def poll(self, transfer):
+        """
+        Inline check for readers that get partial reads and cannot be
+        interrupted from another thread (the asyncio engine). Runs at
+        most once per check_interval; True once transfer has stalled.
+        """
+        if not self.min_bytes_per_second or self.min_bytes_per_second <= 0 or transfer.stalled:
+            return transfer.stalled
+
+        now = time.time()
+        if now - transfer.samples[-1][0] >= self.check_interval and self._check(transfer, now):
+            transfer.stalled = True
+        return transfer.stalled
+
+    def _loop(self):
+        while True:
+            time.sleep(self.check_interval)
+            with self.lock:
+                if not self.watches:
+                    self.thread = None
+                    return
+                watches = list(self.watches)
+
+            now = time.time()
+            for transfer in watches:
+                if not transfer.stalled and self._check(transfer, now):
+                    transfer.stalled = True
+                    abort_response(transfer.response)
+
+    def _check(self, transfer, now):
+        samples = transfer.samples
+        samples.append((now, transfer.bytes))
+
+        # Keep one sample at or before the start of the window as baseline
+        window_start = now - self.window_seconds
+        while len(samples) > 1 and samples[1][0] <= window_start:
+            samples.popleft()
+
+        start_time, start_bytes = samples[0]
+        elapsed = now - start_time
+        if elapsed < self.window_seconds:
+            return False
+
+        transfer.speed = (transfer.bytes - start_bytes) / elapsed
+        return transfer.speed < self.min_bytes_per_second
@@ -0,0 +1,146 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+
+class SubdomainProber:
+    """
+    Looks for the data node (n1..n10) that serves a Coomer/Kemono path.
+
+    Every candidate is probed at the same time with a one-byte Range GET
+    and short timeouts; the first node answering 200/206 wins and probes
+    that have not started yet are dropped. Probes still in flight finish
+    in the background and close their response. Lookup latency and hit
+    rate are kept so callers can report them.
+    """
+
+    def __init__(self, session, headers=None, timeout=(3, 5)):
+        self.session = session
+        self.headers = headers or {}
+        self.timeout = timeout
+
+        self.stats_lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.total_latency = 0.0
+
+    @staticmethod
+    def candidates(url, max_subdomains=10):
+        parsed = urlparse(url)
+        original_path = parsed.path
+
+        path = original_path
+        if not original_path.startswith("/data/"):
+            path = ("/data" + original_path) if not original_path.startswith("/data") else original_path
+
+        host = parsed.netloc
+
+        if "coomer" in host:
+            base_domains = ["coomer.st"]
+        elif "kemono" in host:
+            base_domains = ["kemono.cr", "kemono.su"]
+        else:
+            base_domains = [host]
+
+        return [
+            parsed._replace(netloc=f"n{i}.{base}", path=path).geturl()
+            for base in base_domains
+            for i in range(1, max_subdomains + 1)
+        ]
+
+    def _probe(self, test_url, stop_event=None):
+        """Returns (status_code, headers) for test_url, or None on error."""
+        if stop_event is not None and stop_event.is_set():
+            return None
+
+        probe_headers = dict(self.headers)
+        probe_headers["Range"] = "bytes=0-0"
+
+        try:
+            resp = self.session.get(
+                test_url,
+                headers=probe_headers,
+                timeout=self.timeout,
+                stream=True,
+            )
+        except Exception:
+            return None
+
+        try:
+            return resp.status_code, resp.headers
+        finally:
+            resp.close()
+
+    def _deadline(self):
+        if isinstance(self.timeout, (tuple, list)):
+            return sum(self.timeout) + 1
+        return self.timeout * 2 + 1
+
+    def find(self, url, max_subdomains=10, should_cancel=None):
+        """
+        Races every candidate node and returns (winning_url or None,
+        elapsed_seconds). should_cancel is polled while waiting, so a
+        cancel returns within a fraction of a second.
+        """
+        candidates = self.candidates(url, max_subdomains)
+        started = time.monotonic()
+        deadline = started + self._deadline()
+        winner = None
+
+        stop_event = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=max(1, len(candidates)))
+        try:
+            futures = {pool.submit(self._probe, c, stop_event): c for c in candidates}
+            pending = set(futures)
+            while pending and winner is None:
+                if callable(should_cancel) and should_cancel():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=min(remaining, 0.25), return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result is not None and result[0] in (200, 206):
+                        winner = futures[future]
+                        break
+        finally:
+            stop_event.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.monotonic() - started
+        with self.stats_lock:
+            self.lookups += 1
+            self.total_latency += elapsed
+            if winner is not None:
+                self.hits += 1
+
+        return winner, elapsed
+
+    def find_all(self, url, accept, max_subdomains=10, exclude=()):
+        """
+        Probes every candidate node concurrently and returns, in node
+        order, those for which accept(status_code, headers) is true.
+        """
+        candidates = [c for c in self.candidates(url, max_subdomains) if c not in exclude]
+        if not candidates:
+            return []
+
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            results = list(pool.map(self._probe, candidates))
+
+        return [
+            candidate
+            for candidate, result in zip(candidates, results)
+            if result is not None and accept(*result)
+        ]
+
+    def snapshot(self):
+        with self.stats_lock:
+            average = self.total_latency / self.lookups if self.lookups else 0.0
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "average_latency": average,
+            }
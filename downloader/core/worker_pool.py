@@ -0,0 +1,106 @@
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class ResizableThreadPool:
+    """
+    Thread pool whose size can change while it runs, with the submit() /
+    shutdown() interface of ThreadPoolExecutor. resize() grows the pool
+    at once: queued tasks get new workers right away. Shrinking lets
+    busy workers finish their current task and retires them afterwards,
+    so running tasks never add up across an old and a new pool and
+    nothing in flight is interrupted.
+    """
+
+    def __init__(self, max_workers, thread_name_prefix="DownloadWorker"):
+        self.condition = threading.Condition()
+        self.queue = deque()
+        self.size = max(int(max_workers), 1)
+        self.workers = 0
+        # Workers not running a task (waiting, or started but not yet waiting)
+        self.idle = 0
+        self.threads = set()
+        self.shutdown_requested = False
+        self.thread_name_prefix = thread_name_prefix
+        self.thread_numbers = itertools.count()
+
+    @property
+    def max_workers(self):
+        return self.size
+
+    def submit(self, fn, *args, **kwargs):
+        with self.condition:
+            if self.shutdown_requested:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future = Future()
+            self.queue.append((future, fn, args, kwargs))
+            self._spawn()
+            self.condition.notify()
+            return future
+
+    def resize(self, max_workers):
+        with self.condition:
+            self.size = max(int(max_workers), 1)
+            self._spawn()
+            # Surplus idle workers wake up and exit; busy ones after their task
+            self.condition.notify_all()
+
+    def _spawn(self):
+        # Called with the condition held
+        while self.workers < self.size and len(self.queue) > self.idle and not self.shutdown_requested:
+            self.workers += 1
+            self.idle += 1
+            thread = threading.Thread(
+                target=self._work,
+                name=f"{self.thread_name_prefix}_{next(self.thread_numbers)}",
+                daemon=True,
+            )
+            self.threads.add(thread)
+            thread.start()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.workers > self.size or (self.shutdown_requested and not self.queue):
+                        self.workers -= 1
+                        self.idle -= 1
+                        self.threads.discard(threading.current_thread())
+                        self.condition.notify_all()
+                        return
+                    if self.queue:
+                        break
+                    self.condition.wait()
+                future, fn, args, kwargs = self.queue.popleft()
+                self.idle -= 1
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            # Drop references before waiting, as ThreadPoolExecutor does
+            del future, fn, args, kwargs
+
+            with self.condition:
+                self.idle += 1
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self.condition:
+            self.shutdown_requested = True
+            if cancel_futures:
+                while self.queue:
+                    future = self.queue.popleft()[0]
+                    future.cancel()
+            self.condition.notify_all()
+            threads = list(self.threads)
+
+        if wait:
+            current = threading.current_thread()
+            for thread in threads:
+                if thread is not current:
+                    thread.join()
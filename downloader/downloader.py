@@ -1,17 +1,19 @@
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Semaphore
 from urllib.parse import quote_plus, urlencode, urljoin, urlparse
 import os
-import re
-import requests
-import threading
 import time
-import zlib
-import sqlite3
 import random
 
-class Downloader:
+from downloader.core.bandwidth_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from downloader.core.media_downloader import MediaDownloader
+from downloader.core.negative_cache import NegativeCache
+from downloader.core.node_affinity import NodeAffinityStore
+
+
+class Downloader(MediaDownloader):
+    # The data nodes serve many files at once; the album sites are stricter
+    host_limits = (6, 16)
+    host_stream_limits = (16, 64)
+
     def __init__(
         self,
         download_folder,
@@ -30,120 +32,29 @@ class Downloader:
         folder_structure="default",
         rate_limit_interval=0.05,
     ):
-        self.download_folder = download_folder
-        self.log_callback = log_callback
-        self.enable_widgets_callback = enable_widgets_callback
-        self.update_progress_callback = update_progress_callback
-        self.update_global_progress_callback = update_global_progress_callback
-        self.cancel_requested = threading.Event()
-        self.headers = headers or {
-            "User-Agent": "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
-            "Referer": "https://coomer.st/",
-            "Accept": "text/css",
-        }
-
-        self.session = requests.Session()
-        self.max_workers = max_workers
-        self.per_domain_limit = 6
-        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
-        self.domain_locks = defaultdict(lambda: Semaphore(self.per_domain_limit))
-        self.domain_last_request = defaultdict(float)
-        self.rate_limit_interval = rate_limit_interval
-
-        self.video_extensions = (".mp4", ".mkv", ".webm", ".mov", ".avi", ".flv", ".wmv", ".m4v")
-        self.image_extensions = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff")
-        self.document_extensions = (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx")
-        self.compressed_extensions = (".zip", ".rar", ".7z", ".tar", ".gz")
-
-        self.download_images = download_images
-        self.download_videos = download_videos
-        self.download_compressed = download_compressed
-
-        self.futures = []
-        self.total_files = 0
-        self.completed_files = 0
-        self.skipped_files = []
-        self.failed_files = []
-        self.tr = tr
-        self.shutdown_called = False
-        self.folder_structure = folder_structure
-        self.max_retries = max_retries
-        self.retry_interval = retry_interval
-        self.file_lock = threading.Lock()
-        self.counter_lock = threading.Lock()
-        self.post_attachment_counter = defaultdict(int)
-        self.subdomain_cache = {}
-        self.subdomain_locks = defaultdict(threading.Lock)
-        self.request_timeout = (10, 120)
-        self.domain_name = "coomer"
-        
-        self.domain_error_state = defaultdict(
-            lambda: {
-                "burst_count": 0,
-                "last_error_ts": 0.0,
-                "cooldown_until": 0.0,
-            }
+        super().__init__(
+            download_folder,
+            max_workers=max_workers,
+            log_callback=log_callback,
+            enable_widgets_callback=enable_widgets_callback,
+            update_progress_callback=update_progress_callback,
+            update_global_progress_callback=update_global_progress_callback,
+            headers=headers,
+            max_retries=max_retries,
+            retry_interval=retry_interval,
+            download_images=download_images,
+            download_videos=download_videos,
+            download_compressed=download_compressed,
+            tr=tr,
+            folder_structure=folder_structure,
+            rate_limit_interval=rate_limit_interval,
         )
-        self.domain_error_lock = threading.Lock()
-        self.domain_error_window = 10.0
-        self.domain_error_threshold = 4
-        self.domain_cooldown_seconds = 8.0
-
-        self.active_downloads = set()
-        self.active_downloads_lock = threading.Lock()
-
-        self.progress_update_interval = 0.25
-
-        db_folder = os.path.join("resources", "config")
-        os.makedirs(db_folder, exist_ok=True)
-        self.db_path = os.path.join(db_folder, "downloads.db")
-        self.db_lock = threading.Lock()
-        self.init_db()
-        self.load_download_cache()
-
-    def _translate_text(self, key, **kwargs):
-        if callable(self.tr):
-            try:
-                return self.tr(key, **kwargs)
-            except TypeError:
-                text = self.tr(key)
-                if kwargs:
-                    try:
-                        return text.format(**kwargs)
-                    except Exception:
-                        return text
-                return text
-
-        if kwargs:
-            try:
-                return key.format(**kwargs)
-            except Exception:
-                return key
-        return key
-
-    def init_db(self):
-        self.db_connection = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.db_cursor = self.db_connection.cursor()
-        self.db_cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS downloads (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                media_url TEXT UNIQUE,
-                file_path TEXT,
-                file_size INTEGER,
-                user_id TEXT,
-                post_id TEXT,
-                downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
-        self.db_connection.commit()
-
-    def load_download_cache(self):
-        with self.db_lock:
-            self.db_cursor.execute("SELECT media_url, file_path, file_size FROM downloads")
-            rows = self.db_cursor.fetchall()
-        self.download_cache = {row[0]: (row[1], row[2]) for row in rows}
+        self.domain_name = "coomer"
+        self.multi_mirror_downloads = False
+        self.mirror_piece_bytes = 4 * 1024 * 1024
+        self.recheck_dead_media = False
+        self.node_affinity = NodeAffinityStore(self.db_path)
+        self.negative_cache = NegativeCache(self.db_path)
 
     def log(self, message, **kwargs):
         final_message = self._translate_text(message, **kwargs)
@@ -153,318 +64,72 @@ class Downloader:
             except TypeError:
                 self.log_callback(final_message)
 
-    def sanitize_filename(self, filename):
-        return re.sub(r'[<>:"/\\\\|?*]', "_", filename)
-
-    def request_cancel(self):
-        self.cancel_requested.set()
-        self.log("DOWNLOAD_CANCELLATION_REQUESTED")
-        for future in self.futures:
-            future.cancel()
-
-    def shutdown_executor(self):
-        if not self.shutdown_called:
-            self.shutdown_called = True
-            if self.executor:
-                self.executor.shutdown(wait=True)
-            if self.enable_widgets_callback:
-                self.enable_widgets_callback()
-            self.log("ALL_DOWNLOADS_COMPLETED_OR_CANCELLED")
-
-    def get_filename(self, media_url, post_id=None, post_name=None, attachment_index=1, post_time=None):
-        base_name = os.path.basename(media_url).split("?")[0]
-        name_no_ext, extension = os.path.splitext(base_name)
-
-        if not hasattr(self, "file_naming_mode"):
-            self.file_naming_mode = 0
-
-        mode = self.file_naming_mode
-
-        def sanitize(name):
-            return self.sanitize_filename(name).strip()
-
-        if mode == 0:
-            sanitized = sanitize(name_no_ext) or "file"
-            return f"{sanitized}_{attachment_index}{extension}"
-        elif mode == 1:
-            sanitized_post = sanitize(post_name or "") or (f"post_{post_id}" if post_id else "post")
-            short_hash = f"{zlib.crc32(media_url.encode('utf-8')) & 0xFFFF:04x}"
-            return f"{sanitized_post}_{attachment_index}_{short_hash}{extension}"
-        elif mode == 2:
-            sanitized_post = sanitize(post_name or "") or (f"post_{post_id}" if post_id else "post")
-            return (
-                f"{sanitized_post} - {post_id}_{attachment_index}{extension}"
-                if post_id else f"{sanitized_post}_{attachment_index}{extension}"
-            )
-        elif mode == 3:
-            sanitized_post = sanitize(post_name or "") or (f"post_{post_id}" if post_id else "post")
-            sanitized_time = sanitize(post_time or "")
-            short_hash = f"{zlib.crc32(media_url.encode('utf-8')) & 0xFFFF:04x}"
-            return f"{sanitized_time} - {sanitized_post}_{attachment_index}_{short_hash}{extension}"
-
-        return sanitize(name_no_ext) + extension
-
-    def get_media_folder(self, extension, user_id, post_id=None):
-        if extension in self.video_extensions:
-            folder_name = "videos"
-        elif extension in self.image_extensions:
-            folder_name = "images"
-        elif extension in self.document_extensions:
-            folder_name = "documents"
-        elif extension in self.compressed_extensions:
-            folder_name = "compressed"
-        else:
-            folder_name = "other"
-
-        if self.folder_structure == "post_number" and post_id:
-            return os.path.join(self.download_folder, user_id, f"post_{post_id}", folder_name)
-
-        return os.path.join(self.download_folder, user_id, folder_name)
-
-    def _emit_progress_update(
-        self,
-        downloaded_size,
-        total_size,
-        download_id,
-        file_path,
-        start_time,
-        last_emit_time,
-        force=False,
-    ):
-        if not self.update_progress_callback:
-            return last_emit_time
-
-        now = time.time()
-        if not force and (now - last_emit_time) < self.progress_update_interval:
-            return last_emit_time
-
-        elapsed_time = now - start_time
-        speed = downloaded_size / elapsed_time if elapsed_time > 0 else 0
-        remaining_time = (total_size - downloaded_size) / speed if speed > 0 and total_size > 0 else 0
-
-        self.update_progress_callback(
-            downloaded_size,
-            total_size,
-            file_id=download_id,
-            file_path=file_path,
-            speed=speed,
-            eta=remaining_time,
-        )
-        return now
-    
     def _compute_retry_delay(self, attempt_index):
         base = max(float(self.retry_interval or 0), 0.1)
         return (base * (attempt_index + 1)) + random.uniform(0.35, 1.15)
 
-    def _wait_for_domain_cooldown(self, domain):
-        while True:
-            if self.cancel_requested.is_set():
-                return False
-
-            with self.domain_error_lock:
-                cooldown_until = self.domain_error_state[domain]["cooldown_until"]
+    def _record_transfer(self, url, size, seconds):
+        super()._record_transfer(url, size, seconds)
+        self.node_affinity.record_transfer(url, size, seconds)
 
-            now = time.time()
-            remaining = cooldown_until - now
-            if remaining <= 0:
-                return True
+    def _record_download(self, final_path, media_url, total_size, user_id=None, post_id=None):
+        super()._record_download(final_path, media_url, total_size, user_id, post_id)
+        self.negative_cache.forget(media_url)
 
-            sleep_for = min(remaining, 0.5)
-            time.sleep(sleep_for)
+    def _record_node_success(self, url):
+        self.node_affinity.record_success(url)
 
-    def _mark_domain_success(self, domain):
-        with self.domain_error_lock:
-            state = self.domain_error_state[domain]
-            state["burst_count"] = 0
-            state["last_error_ts"] = 0.0
-            state["cooldown_until"] = 0.0
-
-    def _mark_domain_error(self, domain, status_code):
-        if status_code not in (429, 500, 502, 503, 504):
-            return
-
-        now = time.time()
-        with self.domain_error_lock:
-            state = self.domain_error_state[domain]
-
-            if now - state["last_error_ts"] > self.domain_error_window:
-                state["burst_count"] = 0
-
-            state["burst_count"] += 1
-            state["last_error_ts"] = now
-
-            if state["burst_count"] >= self.domain_error_threshold:
-                state["cooldown_until"] = max(
-                    state["cooldown_until"],
-                    now + self.domain_cooldown_seconds,
-                )
-
-    def safe_request(self, url, max_retries=None, headers=None):
-        if max_retries is None:
-            max_retries = self.max_retries
-        if headers is None:
-            headers = self.headers
-
-        try:
-            max_retries = int(max_retries)
-        except (TypeError, ValueError):
-            max_retries = 0
-        if max_retries < 0:
-            max_retries = 0
+    def _record_node_miss(self, url):
+        self.node_affinity.record_miss(url)
 
+    def _route_to_known_node(self, url):
+        """
+        Sends a data-file request straight to the node that served its
+        shard before. Paths already probed this session keep the probed
+        answer, so a wrong prediction costs one 404 and one probe. A URL
+        that already names a node (a probe, a mirror piece) goes where it
+        says.
+        """
         parsed = urlparse(url)
-        domain = parsed.netloc
-        path = parsed.path
+        if "coomer" not in parsed.netloc and "kemono" not in parsed.netloc:
+            return url
+        if NodeAffinityStore.NODE_RE.match(parsed.netloc):
+            return url
+        if parsed.path in self.subdomain_cache:
+            return url
+
+        node = self.node_affinity.predict(url)
+        if not node or node == parsed.netloc.lower():
+            return url
+
+        path = parsed.path if parsed.path.startswith("/data/") else "/data" + parsed.path
+        return parsed._replace(netloc=node, path=path).geturl()
+
+    def _mark_media_dead(self, url, status_code):
+        if urlparse(url).path.startswith(("/api/", "/thumbnail/")):
+            return
+        self.negative_cache.record(url, status_code)
 
-        for attempt in range(max_retries + 1):
-            if self.cancel_requested.is_set():
-                return None
+    def _skip_known_dead(self, media_url, final_path):
+        """Skips media no data node could serve on an earlier run, until its backoff expires."""
+        if self.recheck_dead_media:
+            return False
 
-            if not self._wait_for_domain_cooldown(domain):
-                return None
+        dead = self.negative_cache.lookup(media_url)
+        if dead is None:
+            return False
 
-            with self.domain_locks[domain]:
-                elapsed_time = time.time() - self.domain_last_request[domain]
-                if elapsed_time < self.rate_limit_interval:
-                    time.sleep(self.rate_limit_interval - elapsed_time)
-
-                try:
-                    self.domain_last_request[domain] = time.time()
-                    response = self.session.get(
-                        url,
-                        stream=True,
-                        headers=headers,
-                        timeout=self.request_timeout,
-                    )
-                    sc = response.status_code
-
-                    if sc in (403, 404) and ("coomer" in domain or "kemono" in domain):
-                        if self.update_progress_callback:
-                            self.update_progress_callback(0, 0, status=f"{sc} - probing subdomains")
-
-                        with self.subdomain_locks[path]:
-                            if path in self.subdomain_cache:
-                                alt_url = self.subdomain_cache[path]
-                            else:
-                                alt_url = self._find_valid_subdomain(url)
-                                self.subdomain_cache[path] = alt_url
-
-                        if alt_url != url:
-                            found = urlparse(alt_url).netloc
-                            if self.update_progress_callback:
-                                self.update_progress_callback(0, 0, status=f"Subdomain found: {found}")
-
-                            alt_domain = urlparse(alt_url).netloc
-                            if not self._wait_for_domain_cooldown(alt_domain):
-                                return None
-
-                            response = self.session.get(
-                                alt_url,
-                                stream=True,
-                                headers=headers,
-                                timeout=self.request_timeout,
-                            )
-                            response.raise_for_status()
-                            self._mark_domain_success(alt_domain)
-                            return response
-
-                        if self.update_progress_callback:
-                            self.update_progress_callback(0, 0, status="Exhausted subdomains")
-                        return None
-
-                    response.raise_for_status()
-                    self._mark_domain_success(domain)
-                    return response
-
-                except requests.exceptions.ReadTimeout:
-                    self.log(
-                        "READ_TIMEOUT_RETRY",
-                        attempt=attempt + 1,
-                        total=max_retries + 1,
-                        timeout=self.request_timeout[1],
-                    )
-
-                    if attempt < max_retries:
-                        time.sleep(self._compute_retry_delay(attempt))
-
-                except requests.exceptions.RequestException as e:
-                    status_code = getattr(e.response, "status_code", None)
-
-                    if status_code in (429, 500, 502, 503, 504):
-                        self._mark_domain_error(domain, status_code)
-                        self.log(
-                            "HTTP_RETRY_REQUEST",
-                            attempt=attempt + 1,
-                            total=max_retries + 1,
-                            status_code=status_code,
-                            url=url,
-                        )
-
-                        if attempt < max_retries:
-                            time.sleep(self._compute_retry_delay(attempt))
-
-                    elif status_code not in (403, 404):
-                        url_display = getattr(e.request, "url", url)
-                        if len(url_display) > 60:
-                            url_display = url_display[:60] + "..."
-                        self.log(
-                            "ERROR_ACCESSING_URL",
-                            attempt=attempt + 1,
-                            total=max_retries + 1,
-                            url=url_display,
-                            error=e,
-                        )
-
-                        if attempt < max_retries:
-                            time.sleep(self._compute_retry_delay(attempt))
-
-                    if status_code in (403, 404) and ("coomer" in domain or "kemono" in domain) and attempt == max_retries:
-                        self.log(
-                            "FINAL_FAILURE_ACCESSING_URL",
-                            url=url,
-                            status_code=status_code,
-                        )
-
-        return None
-
-    def _find_valid_subdomain(self, url, max_subdomains=10):
-        parsed = urlparse(url)
-        original_path = parsed.path
-
-        path = original_path
-        if not original_path.startswith("/data/"):
-            path = ("/data" + original_path) if not original_path.startswith("/data") else original_path
-
-        host = parsed.netloc
-
-        if "coomer" in host:
-            base_domains = ["coomer.st"]
-        elif "kemono" in host:
-            base_domains = ["kemono.cr", "kemono.su"]
-        else:
-            base_domains = [host]
-
-        for base in base_domains:
-            for i in range(1, max_subdomains + 1):
-                domain = f"n{i}.{base}"
-                test_url = parsed._replace(netloc=domain, path=path).geturl()
-
-                if self.update_progress_callback:
-                    self.update_progress_callback(0, 0, status=f"Testing subdomain: {domain}")
-
-                try:
-                    resp = self.session.get(
-                        test_url,
-                        headers=self.headers,
-                        timeout=self.request_timeout,
-                        stream=True,
-                    )
-                    if resp.status_code == 200:
-                        return test_url
-                except Exception:
-                    pass
-
-        return url
+        status_code, attempts, retry_at = dead
+        self.log(
+            "DEAD_MEDIA_SKIPPING",
+            media_url=media_url,
+            status_code=status_code,
+            attempts=attempts,
+            retry_at=time.strftime("%Y-%m-%d %H:%M", time.localtime(retry_at)),
+        )
+        with self.file_lock:
+            self.skipped_files.append(final_path)
+        return True
 
     def get_domain_name(self, site):
         if "pawchive" in site:
@@ -522,13 +187,17 @@ class Downloader:
                     if post:
                         return [post]
 
-                all_posts.extend(posts)
+                # Only what the media collection reads is kept; full posts
+                # (content, embeds, ...) add up on profiles with many pages
+                all_posts.extend(self._slim_post(post) for post in posts)
                 offset += 50
 
                 if only_first_page and not specific_post_id:
                     break
 
             except Exception as e:
+                if self.cancel_requested.is_set():
+                    return all_posts
                 self.log("CK_ERROR_FETCHING_USER_POSTS", error=e)
                 break
 
@@ -537,6 +206,19 @@ class Downloader:
 
         return all_posts
 
+    @staticmethod
+    def _slim_post(post):
+        def _file(entry):
+            return {key: entry.get(key) for key in ("path", "url", "name") if entry.get(key)}
+
+        return {
+            "id": post.get("id"),
+            "title": post.get("title"),
+            "published": post.get("published"),
+            "file": _file(post.get("file") or {}),
+            "attachments": [_file(att) for att in (post.get("attachments") or [])],
+        }
+
     def process_post(self, post, site):
         base = f"https://{site}/"
         if "pawchive" in site:
@@ -599,280 +281,92 @@ class Downloader:
 
         return collected
 
-    def process_media_element(
-        self,
-        media_url,
-        user_id=None,
-        post_id=None,
-        post_name=None,
-        post_time=None,
-        download_id=None,
-        target_folder=None,
-        forced_filename=None,
-    ):
-        if self.cancel_requested.is_set():
-            return
-
-        extension = os.path.splitext(media_url.split("?")[0])[1].lower()
-
-        if (
-            (extension in self.image_extensions and not self.download_images)
-            or (extension in self.video_extensions and not self.download_videos)
-            or (extension in self.compressed_extensions and not self.download_compressed)
-        ):
-            self.log("SKIPPING_MEDIA_DUE_TO_SETTINGS", media_url=media_url)
-            return
-
-        if post_id:
-            with self.counter_lock:
-                self.post_attachment_counter[post_id] += 1
-                attachment_index = self.post_attachment_counter[post_id]
-        else:
-            attachment_index = 1
-
-        filename = forced_filename or self.get_filename(
-            media_url,
-            post_id=post_id,
-            post_name=post_name,
-            post_time=post_time,
-            attachment_index=attachment_index,
+    def _find_mirror_urls(self, url, total_size, max_subdomains=10):
+        """
+        Returns every data node URL that serves the same file with Range
+        support, `url` first. Nodes are only kept when they report the
+        same total size.
+        """
+        host = urlparse(url).netloc
+        if "coomer" not in host and "kemono" not in host:
+            return []
+
+        if self.update_progress_callback:
+            self.update_progress_callback(0, 0, status="Looking for mirrors")
+
+        def same_file(status_code, headers):
+            content_range = headers.get("content-range", "")
+            return status_code == 206 and content_range.rsplit("/", 1)[-1] == str(total_size)
+
+        return [url] + self.subdomain_prober.find_all(
+            url,
+            same_file,
+            max_subdomains=max_subdomains,
+            exclude=(url,),
         )
 
-        if target_folder:
-            media_folder = target_folder
-        else:
-            effective_user_id = user_id or "generic"
-            media_folder = self.get_media_folder(extension, effective_user_id, post_id)
-
-        os.makedirs(media_folder, exist_ok=True)
-
-        final_path = os.path.normpath(os.path.join(media_folder, filename))
-        tmp_path = final_path + ".tmp"
+    def _switch_stalled_node(self, url, total_size):
+        """Returns another data node serving the same file as url, or None."""
+        if not total_size:
+            return None
 
-        with self.active_downloads_lock:
-            if media_url in self.download_cache:
-                self.log("FILE_ALREADY_IN_DB_SKIPPING", media_url=media_url)
-                with self.file_lock:
-                    self.skipped_files.append(final_path)
-                return
+        alternates = self._find_mirror_urls(url, total_size)[1:]
+        if not alternates:
+            return None
 
-            if media_url in self.active_downloads:
-                self.log("FILE_ALREADY_IN_PROGRESS_SKIPPING", media_url=media_url)
-                with self.file_lock:
-                    self.skipped_files.append(final_path)
-                return
-
-            self.active_downloads.add(media_url)
+        alt_url = alternates[0]
+        # Keep safe_request from routing back to the node that stalled
+        self.subdomain_cache[urlparse(alt_url).path] = alt_url
+        self.log("STALL_SWITCHING_NODE", node=urlparse(alt_url).netloc)
+        return alt_url
 
+    def _run_media_jobs(self, jobs, priority=PRIORITY_NORMAL):
         try:
-            self.log("STARTING_DOWNLOAD_FROM", media_url=media_url)
-
-            response = self.safe_request(media_url, max_retries=self.max_retries)
-
-            if response is None:
-                self.log(
-                    "FAILED_TO_DOWNLOAD_AFTER_ATTEMPTS",
-                    media_url=media_url,
-                    total=self.max_retries + 1,
-                )
-                with self.file_lock:
-                    self.failed_files.append(media_url)
-                return
-
-            total_size = int(response.headers.get("content-length", 0))
-            downloaded_size = 0
-            start_time = time.time()
-            last_emit_time = 0.0
-
-            try:
-                with open(tmp_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=1048576):
-                        if self.cancel_requested.is_set():
-                            if os.path.exists(tmp_path):
-                                try:
-                                    os.remove(tmp_path)
-                                except Exception:
-                                    pass
-                            self.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
-                            return
-
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-                            last_emit_time = self._emit_progress_update(
-                                downloaded_size=downloaded_size,
-                                total_size=total_size,
-                                download_id=download_id,
-                                file_path=tmp_path,
-                                start_time=start_time,
-                                last_emit_time=last_emit_time,
-                                force=False,
-                            )
-
-                zero_progress_rounds = 0
-                while total_size and downloaded_size < total_size:
-                    resume_headers = self.headers.copy()
-                    resume_headers["Range"] = f"bytes={downloaded_size}-"
-                    self.log(
-                        "RESUMING_DOWNLOAD_AT_BYTE",
-                        downloaded_size=downloaded_size,
-                        media_url=media_url,
-                    )
-
-                    part_response = self.safe_request(
-                        media_url,
-                        max_retries=self.max_retries,
-                        headers=resume_headers,
-                    )
-                    if part_response is None:
-                        raise Exception("RESUMPTION_FAILED_AFTER_RETRIES")
-
-                    if part_response.status_code == 200:
-                        # Server ignored the Range header and sent the full file again
-                        downloaded_size = 0
-                        open_mode = "wb"
-                    else:
-                        open_mode = "ab"
-
-                    bytes_before_round = downloaded_size
-
-                    with open(tmp_path, open_mode) as f:
-                        for chunk in part_response.iter_content(chunk_size=1048576):
-                            if self.cancel_requested.is_set():
-                                if os.path.exists(tmp_path):
-                                    try:
-                                        os.remove(tmp_path)
-                                    except Exception:
-                                        pass
-                                self.log("DOWNLOAD_CANCELLED_FROM", media_url=media_url)
-                                return
-
-                            if chunk:
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                                last_emit_time = self._emit_progress_update(
-                                    downloaded_size=downloaded_size,
-                                    total_size=total_size,
-                                    download_id=download_id,
-                                    file_path=tmp_path,
-                                    start_time=start_time,
-                                    last_emit_time=last_emit_time,
-                                    force=False,
-                                )
-
-                    if downloaded_size == bytes_before_round:
-                        zero_progress_rounds += 1
-                        if zero_progress_rounds >= 3:
-                            raise Exception("RESUME_NO_PROGRESS")
-                    else:
-                        zero_progress_rounds = 0
-
-                if total_size > 0 and downloaded_size != total_size:
-                    raise Exception(
-                        self._translate_text(
-                            "FINAL_SIZE_MISMATCH",
-                            expected=total_size,
-                            actual=downloaded_size,
-                        )
-                    )
-
-                self._emit_progress_update(
-                    downloaded_size=downloaded_size,
-                    total_size=total_size,
-                    download_id=download_id,
-                    file_path=tmp_path,
-                    start_time=start_time,
-                    last_emit_time=last_emit_time,
-                    force=True,
-                )
-
-                with self.file_lock:
-                    if os.path.exists(final_path):
-                        os.remove(final_path)
-                    os.rename(tmp_path, final_path)
-                    self.completed_files += 1
-
-                self.log("DOWNLOAD_SUCCESS_FROM", media_url=media_url)
-
-                if self.update_global_progress_callback:
-                    self.update_global_progress_callback(self.completed_files, self.total_files)
-
-                with self.db_lock:
-                    self.db_cursor.execute(
-                        """
-                        INSERT OR REPLACE INTO downloads (media_url, file_path, file_size, user_id, post_id)
-                        VALUES (?, ?, ?, ?, ?)
-                        """,
-                        (media_url, final_path, total_size, user_id, post_id),
-                    )
-                    self.db_connection.commit()
-
-                self.download_cache[media_url] = (final_path, total_size)
-
-            except Exception:
-                if os.path.exists(tmp_path):
-                    try:
-                        os.remove(tmp_path)
-                    except Exception:
-                        pass
-
-                self.log(
-                    "FAILED_TO_DOWNLOAD_AFTER_ATTEMPTS",
-                    media_url=media_url,
-                    total=self.max_retries + 1,
-                )
-                with self.file_lock:
-                    self.failed_files.append(media_url)
-
+            return super()._run_media_jobs(jobs, priority)
         finally:
-            with self.active_downloads_lock:
-                self.active_downloads.discard(media_url)
+            self.node_affinity.flush()
 
     def download_media(self, site, user_id, service, query=None, download_all=False, initial_offset=0, only_first_page=False):
         try:
             self.domain_name = self.get_domain_name(site)
             self.log("CK_STARTING_DOWNLOAD_PROCESS")
 
-            posts = self.fetch_user_posts(
-                site,
-                user_id,
-                service,
-                query=query,
-                initial_offset=initial_offset,
-                log_fetching=download_all,
-                only_first_page=only_first_page,
-            )
-
-            if not posts:
-                self.log("CK_NO_POSTS_FOUND_FOR_USER")
-                return
+            def resolve():
+                posts = self.fetch_user_posts(
+                    site,
+                    user_id,
+                    service,
+                    query=query,
+                    initial_offset=initial_offset,
+                    log_fetching=download_all,
+                    only_first_page=only_first_page,
+                )
+                if self.cancel_requested.is_set():
+                    return None
 
-            if not download_all:
-                posts = posts[:50]
+                if not posts:
+                    self.log("CK_NO_POSTS_FOUND_FOR_USER")
+                    return None
 
-            media_entries = self._collect_filtered_media(posts, site)
-            self.total_files = len(media_entries)
-            self.completed_files = 0
+                if not download_all:
+                    posts = posts[:50]
 
-            futures = []
-            for entry in media_entries:
-                future = self.executor.submit(
-                    self.process_media_element,
-                    entry["media_url"],
-                    user_id,
-                    entry["post_id"],
-                    entry["title"],
-                    entry["published"],
-                    entry["media_url"],
+                return (
+                    {
+                        "media_url": entry["media_url"],
+                        "user_id": user_id,
+                        "post_id": entry["post_id"],
+                        "post_name": entry["title"],
+                        "post_time": entry["published"],
+                        "download_id": entry["media_url"],
+                    }
+                    for entry in self._collect_filtered_media(posts, site)
                 )
-                futures.append(future)
-
-            self.futures = futures
 
-            for future in as_completed(futures):
-                if self.cancel_requested.is_set():
-                    break
-                future.result()
+            source = f"{site}/{service}/user/{user_id}?" + urlencode(
+                {"q": query or "", "o": initial_offset, "all": int(download_all), "first": int(only_first_page)}
+            )
+            self._run_journaled(source, resolve, priority=PRIORITY_BACKGROUND)
 
         except Exception as e:
             self.log("CK_ERROR_DURING_DOWNLOAD", error=e)
@@ -882,75 +376,46 @@ class Downloader:
     def download_single_post(self, site, post_id, service, user_id):
         try:
             self.domain_name = self.get_domain_name(site)
-            posts = self.fetch_user_posts(site, user_id, service, specific_post_id=post_id)
-            if not posts:
-                self.log("CK_NO_POST_FOUND_FOR_ID")
-                return
 
-            current_post = posts[0]
-            media_urls = self.process_post(current_post, site)
-
-            current_post_id = current_post.get("id") or post_id or "unknown_id"
-            title = current_post.get("title") or ""
-            published_time = current_post.get("published") or ""
+            def resolve():
+                posts = self.fetch_user_posts(site, user_id, service, specific_post_id=post_id)
+                if self.cancel_requested.is_set():
+                    return None
+                if not posts:
+                    self.log("CK_NO_POST_FOUND_FOR_ID")
+                    return None
 
-            deduped_media_urls = []
-            seen = set()
-            for media_url in media_urls:
-                if media_url in seen:
-                    continue
-                seen.add(media_url)
-                deduped_media_urls.append(media_url)
+                current_post = posts[0]
+                media_urls = self.process_post(current_post, site)
 
-            self.total_files = len(deduped_media_urls)
-            self.completed_files = 0
-            futures = []
+                current_post_id = current_post.get("id") or post_id or "unknown_id"
+                title = current_post.get("title") or ""
+                published_time = current_post.get("published") or ""
 
-            for media_url in deduped_media_urls:
-                future = self.executor.submit(
-                    self.process_media_element,
-                    media_url,
-                    user_id,
-                    current_post_id,
-                    title,
-                    published_time,
-                    media_url,
-                )
-                futures.append(future)
+                deduped_media_urls = []
+                seen = set()
+                for media_url in media_urls:
+                    if media_url in seen:
+                        continue
+                    seen.add(media_url)
+                    deduped_media_urls.append(media_url)
 
-            self.futures = futures
+                return [
+                    {
+                        "media_url": media_url,
+                        "user_id": user_id,
+                        "post_id": current_post_id,
+                        "post_name": title,
+                        "post_time": published_time,
+                        "download_id": media_url,
+                    }
+                    for media_url in deduped_media_urls
+                ]
 
-            for future in as_completed(futures):
-                if self.cancel_requested.is_set():
-                    break
-                future.result()
+            self._run_journaled(f"{site}/{service}/user/{user_id}/post/{post_id}", resolve, priority=PRIORITY_INTERACTIVE)
 
         except Exception as e:
             self.log("CK_ERROR_DURING_DOWNLOAD", error=e)
         finally:
             self.shutdown_executor()
 
-    def update_max_downloads(self, new_max):
-        try:
-            new_max = int(new_max)
-        except (TypeError, ValueError):
-            return
-
-        if new_max < 1:
-            new_max = 1
-
-        self.max_workers = new_max
-
-        if self.executor:
-            # wait=False: blocking here would freeze the UI thread while
-            # in-flight downloads finish; they drain on the old executor.
-            self.executor.shutdown(wait=False)
-
-        self.executor = ThreadPoolExecutor(max_workers=new_max)
-        self.domain_locks = defaultdict(lambda: Semaphore(self.per_domain_limit))
-
-        self.log(
-            "UPDATED_MAX_WORKERS",
-            new_max=new_max,
-            per_domain_limit=self.per_domain_limit,
-        )
\ No newline at end of file
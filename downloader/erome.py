@@ -1,6 +1,6 @@
 import os
-from concurrent.futures import as_completed
 
+from downloader.core.bandwidth_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
 from downloader.core.base_api_downloader import BaseApiDownloader
 from downloader.adapters.erome_adapter import EromeAdapter
 
@@ -68,10 +68,8 @@ class EromeDownloader(BaseApiDownloader):
         if self.is_profile_download and self.enable_widgets_callback:
             self.enable_widgets_callback()
 
-    def _download_entries(self, media_entries, root_folder):
-        self.total_files = len(media_entries)
-        self.completed_files = 0
-        futures = []
+    def _entry_jobs(self, media_entries, root_folder):
+        jobs = []
 
         for entry in media_entries:
             media_url = entry["media_url"]
@@ -80,26 +78,24 @@ class EromeDownloader(BaseApiDownloader):
 
             os.makedirs(target_folder, exist_ok=True)
 
-            future = self.executor.submit(
-                self.process_media_element,
-                media_url,
-                user_id=None,
-                post_id=entry.get("post_id"),
-                post_name=entry.get("title"),
-                post_time=entry.get("published"),
-                download_id=media_url,
-                target_folder=target_folder,
-                forced_filename=entry.get("filename"),
+            jobs.append(
+                {
+                    "media_url": media_url,
+                    "user_id": None,
+                    "post_id": entry.get("post_id"),
+                    "post_name": entry.get("title"),
+                    "post_time": entry.get("published"),
+                    "download_id": media_url,
+                    "target_folder": target_folder,
+                    "forced_filename": entry.get("filename"),
+                }
             )
-            futures.append(future)
+        return jobs
 
-        self.futures = futures
-
-        for future in as_completed(futures):
-            if self.cancel_requested.is_set():
-                self.log("EROME_CANCELLING_REMAINING_DOWNLOADS")
-                break
-            future.result()
+    def _download_journaled(self, url, resolve, root_folder):
+        priority = PRIORITY_BACKGROUND if self.is_profile_download else PRIORITY_INTERACTIVE
+        if self._run_journaled(url, resolve, priority=priority, folder=root_folder) is False:
+            self.log("EROME_CANCELLING_REMAINING_DOWNLOADS")
 
     def process_album_page(self, page_url, base_folder, download_images=True, download_videos=True):
         try:
@@ -107,15 +103,21 @@ class EromeDownloader(BaseApiDownloader):
                 return
 
             self.log("EROME_PROCESSING_ALBUM_URL", page_url=page_url)
-            resolved = self.adapter._resolve_album(
-                page_url,
-                download_images=download_images,
-                download_videos=download_videos,
-                direct_download=self.direct_download,
-            )
-
-            self._download_entries(resolved["media"], base_folder)
-            self.log("EROME_ALBUM_DOWNLOAD_COMPLETE", folder_name=resolved["folder_name"])
+            resolved = {}
+
+            def resolve():
+                resolved.update(
+                    self.adapter._resolve_album(
+                        page_url,
+                        download_images=download_images,
+                        download_videos=download_videos,
+                        direct_download=self.direct_download,
+                    )
+                )
+                return self._entry_jobs(resolved["media"], base_folder)
+
+            self._download_journaled(page_url, resolve, base_folder)
+            self.log("EROME_ALBUM_DOWNLOAD_COMPLETE", folder_name=resolved.get("folder_name", page_url))
 
         except Exception as e:
             self.log("EROME_ERROR_ACCESSING_PAGE", page_url=page_url, status_code=str(e))
@@ -128,15 +130,21 @@ class EromeDownloader(BaseApiDownloader):
                 return
 
             self.log("EROME_PROCESSING_PROFILE_URL", url=url)
-            resolved = self.adapter._resolve_profile(
-                url,
-                download_images=download_images,
-                download_videos=download_videos,
-                direct_download=self.direct_download,
-            )
-
-            self._download_entries(resolved["media"], download_folder)
-            self.log("EROME_PROFILE_DOWNLOAD_COMPLETE", username=resolved["folder_name"])
+            resolved = {}
+
+            def resolve():
+                resolved.update(
+                    self.adapter._resolve_profile(
+                        url,
+                        download_images=download_images,
+                        download_videos=download_videos,
+                        direct_download=self.direct_download,
+                    )
+                )
+                return self._entry_jobs(resolved["media"], download_folder)
+
+            self._download_journaled(url, resolve, download_folder)
+            self.log("EROME_PROFILE_DOWNLOAD_COMPLETE", username=resolved.get("folder_name", url))
 
         except Exception as e:
             self.log("EROME_ERROR_ACCESSING_PAGE", page_url=url, status_code=str(e))
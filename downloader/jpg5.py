@@ -1,5 +1,4 @@
 import os
-from concurrent.futures import as_completed
 
 from downloader.core.base_api_downloader import BaseApiDownloader
 from downloader.adapters.jpg5_adapter import Jpg5Adapter
@@ -44,40 +43,27 @@ class Jpg5Downloader(BaseApiDownloader):
         try:
             os.makedirs(self.download_folder, exist_ok=True)
 
-            resolved = self.adapter.resolve_gallery(self.url)
-            media_entries = resolved["media"]
-
-            self.total_files = len(media_entries)
-            self.completed_files = 0
-            futures = []
-
-            for entry in media_entries:
-                media_url = entry["media_url"]
-
+            def resolve():
+                resolved = self.adapter.resolve_gallery(self.url)
                 if self.cancel_requested.is_set():
-                    self.log("JPG5_DOWNLOAD_CANCELLED_BY_USER")
-                    return
+                    return None
 
-                future = self.executor.submit(
-                    self.process_media_element,
-                    media_url,
-                    user_id=None,
-                    post_id=entry.get("post_id"),
-                    post_name=entry.get("title"),
-                    post_time=entry.get("published"),
-                    download_id=media_url,
-                    target_folder=self.download_folder,
-                    forced_filename=entry.get("filename"),
-                )
-                futures.append(future)
+                return [
+                    {
+                        "media_url": entry["media_url"],
+                        "user_id": None,
+                        "post_id": entry.get("post_id"),
+                        "post_name": entry.get("title"),
+                        "post_time": entry.get("published"),
+                        "download_id": entry["media_url"],
+                        "target_folder": self.download_folder,
+                        "forced_filename": entry.get("filename"),
+                    }
+                    for entry in resolved["media"]
+                ]
 
-            self.futures = futures
-
-            for future in as_completed(futures):
-                if self.cancel_requested.is_set():
-                    self.log("JPG5_DOWNLOAD_CANCELLED_BY_USER")
-                    break
-                future.result()
+            if self._run_journaled(self.url, resolve) is False or self.cancel_requested.is_set():
+                self.log("JPG5_DOWNLOAD_CANCELLED_BY_USER")
 
         except Exception as e:
             self.log("JPG5_ERROR_PROCESSING_GALLERY", url=self.url, error=e)
@@ -1,5 +1,4 @@
 import os
-from concurrent.futures import as_completed
 
 from downloader.core.base_api_downloader import BaseApiDownloader
 from downloader.adapters.simpcity_adapter import SimpCityAdapter
@@ -36,6 +35,7 @@ class SimpCity(BaseApiDownloader):
         self.adapter = SimpCityAdapter(
             log_callback=self.log_callback,
             tr=self.tr,
+            should_cancel=self.cancel_requested.is_set,
         )
         self.domain_name = "simpcity"
 
@@ -43,40 +43,28 @@ class SimpCity(BaseApiDownloader):
         try:
             self.log("SIMPCITY_PROCESSING_THREAD", url=url)
 
-            resolved = self.adapter.resolve_thread(url, paginate=paginate)
-            folder_name = resolved["folder_name"]
-            media_entries = resolved["media"]
+            def resolve():
+                resolved = self.adapter.resolve_thread(url, paginate=paginate)
+                target_folder = os.path.join(self.download_folder, resolved["folder_name"])
+                os.makedirs(target_folder, exist_ok=True)
 
-            target_folder = os.path.join(self.download_folder, folder_name)
-            os.makedirs(target_folder, exist_ok=True)
+                return [
+                    {
+                        "media_url": entry["media_url"],
+                        "user_id": None,
+                        "post_id": entry.get("post_id"),
+                        "post_name": entry.get("title"),
+                        "post_time": entry.get("published"),
+                        "download_id": entry["media_url"],
+                        "target_folder": target_folder,
+                        "forced_filename": entry.get("filename"),
+                    }
+                    for entry in resolved["media"]
+                ]
 
-            self.total_files = len(media_entries)
-            self.completed_files = 0
-            futures = []
-
-            for entry in media_entries:
-                media_url = entry["media_url"]
-
-                future = self.executor.submit(
-                    self.process_media_element,
-                    media_url,
-                    user_id=None,
-                    post_id=entry.get("post_id"),
-                    post_name=entry.get("title"),
-                    post_time=entry.get("published"),
-                    download_id=media_url,
-                    target_folder=target_folder,
-                    forced_filename=entry.get("filename"),
-                )
-                futures.append(future)
-
-            self.futures = futures
-
-            for future in as_completed(futures):
-                if self.cancel_requested.is_set():
-                    self.log("SIMPCITY_DOWNLOAD_CANCELLED")
-                    break
-                future.result()
+            source = url if paginate else url + "#this-page"
+            if self._run_journaled(source, resolve) is False:
+                self.log("SIMPCITY_DOWNLOAD_CANCELLED")
 
             self.log("SIMPCITY_DOWNLOAD_COMPLETED")
         except Exception as e:
@@ -0,0 +1,115 @@
+"""
+Time from request_cancel() to an idle downloader, with every worker held
+up by a slow host. A cancel must hand the UI its buttons back within
+IDLE_LIMIT seconds, whatever the hosts are doing:
+
+  headers   accepts the request and never answers (a read blocked on
+            the response headers)
+  trickle   answers, then sends a few bytes every half second (a body
+            read that stays just alive)
+  backoff   answers 503 with a long Retry-After (retries waiting in
+            the backoff heap)
+  mixed     all of the above at once
+
+benchmarks/cancel_latency.py measures the same over several rounds.
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader.core.http_transport import available_backends  # noqa: E402
+from downloader.downloader import Downloader  # noqa: E402
+
+IDLE_LIMIT = 1.0
+FILES = 12
+WORKERS = 6
+SCENARIOS = ("headers", "trickle", "backoff", "mixed")
+
+
+class SlowHostHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stop = threading.Event()
+
+    def do_GET(self):
+        kind = self.path.strip("/").split("/", 1)[0]
+        try:
+            if kind == "headers":
+                while not self.stop.wait(0.1):
+                    pass
+            elif kind == "trickle":
+                self.send_response(200)
+                self.send_header("Content-Length", str(512 * 1024 * 1024))
+                self.send_header("Content-Type", "video/mp4")
+                self.end_headers()
+                while not self.stop.wait(0.5):
+                    self.wfile.write(b"\0" * 1024)
+                    self.wfile.flush()
+            else:
+                self.send_response(503)
+                self.send_header("Retry-After", "120")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def port():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHostHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    SlowHostHandler.stop.set()
+    server.shutdown()
+
+
+def jobs_for(scenario, port):
+    kinds = SCENARIOS[:3] if scenario == "mixed" else (scenario,)
+    return [
+        {
+            "media_url": f"http://127.0.0.1:{port}/{kinds[i % len(kinds)]}/{scenario}_{i}.mp4",
+            "user_id": "test",
+            "post_id": str(i),
+        }
+        for i in range(FILES)
+    ]
+
+
+@pytest.mark.parametrize("backend", ["requests", "http2"])
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_cancel_reaches_idle_within_limit(scenario, backend, port, tmp_path, monkeypatch):
+    if backend not in available_backends():
+        pytest.skip(f"{backend} backend not installed")
+    # The downloader keeps its database under the working directory
+    monkeypatch.chdir(tmp_path)
+
+    downloader = Downloader(str(tmp_path / "downloads"), max_workers=WORKERS, rate_limit_interval=0)
+    downloader.set_http_backend(backend)
+    # Every job's host is 127.0.0.1; let them all run at once
+    downloader.per_domain_limit = WORKERS
+
+    runner = threading.Thread(
+        target=lambda: (downloader._run_media_jobs(jobs_for(scenario, port)), downloader.shutdown_executor()),
+        daemon=True,
+    )
+    runner.start()
+    time.sleep(1.5)
+    assert runner.is_alive(), "the run ended before it could be cancelled"
+
+    started = time.perf_counter()
+    downloader.request_cancel()
+    runner.join(timeout=30)
+    idle_after = time.perf_counter() - started
+
+    assert not runner.is_alive(), "the run did not stop after a cancel"
+    assert idle_after <= IDLE_LIMIT, f"idle {idle_after:.2f}s after cancel, over the {IDLE_LIMIT:.1f}s limit"